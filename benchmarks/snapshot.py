@@ -0,0 +1,72 @@
+"""
+Замер времени снимка и загрузки MemoryRepository с расходами:
+pickle объектов целиком и снимок по столбцам (MemoryRepository.snapshot).
+Для restore отдельно показано чтение столбцов из файла: остальное время
+уходит на создание объектов и словаря записей.
+
+На 1 000 000 расходов restore занимает около 1.5-2 с: примерно половина -
+чтение столбцов (в основном создание 2 000 000 объектов datetime),
+остальное - создание объектов Expense и словаря записей. Это в 2-3 раза
+быстрее загрузки pickle объектов целиком, но не меньше секунды: каждая
+запись - это объект Python, и создавать их все приходится при загрузке.
+
+Запуск из корня репозитория: python -m benchmarks.snapshot [число расходов]
+"""
+import os
+import pickle
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+
+def filled_repo(size: int) -> MemoryRepository[Expense]:
+    repo = MemoryRepository[Expense]()
+    start = datetime(2023, 3, 1)
+    repo.add_many(Expense(amount=i % 500, category=i % 30,
+                          expense_date=start + timedelta(minutes=7 * i),
+                          added_date=start + timedelta(minutes=7 * i))
+                  for i in range(size))
+    return repo
+
+
+def timed(name: str, func: Callable[..., Any], *args: Any) -> None:
+    begin = time.perf_counter()
+    func(*args)
+    print(f'{name:>16}: {time.perf_counter() - begin:6.2f} s')
+
+
+def main(size: int = 1_000_000) -> None:
+    repo = filled_repo(size)
+    print(f'{size} expenses')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'expenses.snapshot')
+        container = repo.get_all()
+
+        def dump_objects() -> None:
+            with open(path, 'wb') as file:
+                pickle.dump(container, file, pickle.HIGHEST_PROTOCOL)
+
+        def load_objects() -> None:
+            with open(path, 'rb') as file:
+                pickle.load(file)
+
+        timed('pickle dump', dump_objects)
+        timed('pickle load', load_objects)
+        timed('snapshot', repo.snapshot, path)
+
+        def load_columns() -> None:
+            with open(path, 'rb') as file:
+                pickle.load(file)
+
+        timed('snapshot load', load_columns)
+        restored = MemoryRepository[Expense]()
+        timed('restore', restored.restore, path)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
@@ -0,0 +1,72 @@
+"""
+Замер стоимости обновления сумм бюджета и строк таблицы расходов
+при разборе даты расхода на каждом обновлении и при разборе один раз
+
+Каждый замер начинается с новых строк, ещё не разобранных, как после
+чтения из репозитория, и обновляет каждую строку updates раз: при разборе
+один раз дата разбирается только при первом обновлении.
+
+Запуск из корня репозитория:
+python -m benchmarks.timestamps [число строк] [число обновлений строки]
+"""
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable
+
+from bookkeeper.budget_totals import BudgetTotals
+from bookkeeper.repository.abstract_repository import RepositoryEvent
+from bookkeeper.repository.sqlite_repository import DATE_FORMAT, DataExpenseRow
+
+
+def loaded_rows(size: int) -> list[DataExpenseRow]:
+    """ Строки расходов в том виде, в котором их создаёт SQLiteRepository """
+    start = datetime(2023, 3, 1)
+    rows = []
+    for i in range(size):
+        row = DataExpenseRow()
+        row.pk = i + 1
+        row.expense_date = (start + timedelta(minutes=7 * i)).strftime(DATE_FORMAT)
+        row.amount = i % 100
+        rows.append(row)
+    return rows
+
+
+def parse_each_time(totals: BudgetTotals, rows: list[DataExpenseRow]) -> None:
+    """ Как раньше: дата разбирается из строки при каждом обновлении """
+    for row in rows:
+        expense_date = datetime.strptime(row.expense_date, DATE_FORMAT)
+        totals.update(expense_date, row.amount, expense_date, row.amount)
+        expense_date.strftime('%d-%m-%Y %H:%M')
+
+
+def parse_once(totals: BudgetTotals, rows: list[DataExpenseRow]) -> None:
+    """ Сейчас: используется разобранная один раз дата timestamp """
+    for row in rows:
+        totals.handle(RepositoryEvent('updated', row.pk, row, row))
+        row.timestamp.strftime('%d-%m-%Y %H:%M')
+
+
+def timed(refresh: Callable[[BudgetTotals, list[DataExpenseRow]], None],
+          totals: BudgetTotals,
+          size: int,
+          updates: int) -> float:
+    """ Время updates обновлений новых строк, создание строк не замеряется """
+    rows = loaded_rows(size)
+    begin = time.perf_counter()
+    for _ in range(updates):
+        refresh(totals, rows)
+    return time.perf_counter() - begin
+
+
+def main(size: int = 10000, updates: int = 3, repeat: int = 5) -> None:
+    totals = BudgetTotals(lambda start, end: 0.0, lambda: date(2023, 3, 15))
+    for name, refresh in (('parse each time', parse_each_time),
+                          ('parse once', parse_once)):
+        best = min(timed(refresh, totals, size, updates) for _ in range(repeat))
+        print(f'{name:>16}: {best * 1000:8.1f} ms per {size} rows '
+              f'updated {updates} times')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]))
@@ -0,0 +1,146 @@
+"""
+Модуль описывает суммы расходов за текущие периоды бюджета
+"""
+from datetime import date, datetime
+from typing import Any, Callable
+
+from bookkeeper.repository.abstract_repository import RepositoryEvent
+from bookkeeper.repository.sqlite_repository import DATE_FORMAT
+from bookkeeper.utils import period_bounds
+
+
+class BudgetTotals:
+    """
+    Суммы расходов за текущие день, неделю и месяц.
+    Суммы считаются один раз функцией load, затем изменяются на величину
+    каждого добавленного, изменённого или удалённого расхода.
+    Когда наступает новый день (неделя, месяц), сумма за этот период
+    считается заново функцией load.
+    Метод handle можно подписать на изменения репозитория расходов
+    (AbstractRepository.subscribe), тогда суммы обновляются сами.
+    add, remove, update и handle вызываются, когда изменение уже записано
+    и видно load: сумма за наступивший период загружается вместе с ним.
+    Входные параметры:
+        load - функция load(start, end), возвращающая сумму расходов
+               за период [start, end)
+        today - функция, возвращающая текущую дату (для тестов)
+    """
+    periods = ('day', 'week', 'month')
+
+    def __init__(self,
+                 load: Callable[[datetime, datetime], float],
+                 today: Callable[[], date] = date.today) -> None:
+        self._load = load
+        self._today = today
+        self._bounds: dict[str, tuple[datetime, datetime]] = {}
+        self._totals: dict[str, float] = {}
+        self.refresh()
+
+    def refresh(self) -> None:
+        """
+        Пересчитать суммы за все периоды заново
+        """
+        self._bounds.clear()
+        self._roll_over()
+
+    def _roll_over(self) -> set[str]:
+        """
+        Пересчитать суммы за периоды, которые закончились,
+        вернуть названия пересчитанных периодов
+        """
+        today = datetime.combine(self._today(), datetime.min.time())
+        reloaded = set()
+        for period in self.periods:
+            bounds = self._bounds.get(period)
+            if bounds is None or not bounds[0] <= today < bounds[1]:
+                self._bounds[period] = period_bounds(period, today.date())
+                self._totals[period] = self._load(*self._bounds[period])
+                reloaded.add(period)
+        return reloaded
+
+    def _apply(self, changes: list[tuple[datetime, float]]) -> None:
+        """
+        Изменить суммы на величины changes - пары (дата расхода, величина).
+        Суммы за периоды, пересчитанные при этом заново (_roll_over),
+        уже содержат записанное изменение и не меняются
+        """
+        reloaded = self._roll_over()
+        for period in self.periods:
+            if period in reloaded:
+                continue
+            start, end = self._bounds[period]
+            for expense_date, amount in changes:
+                if start <= expense_date < end:
+                    self._totals[period] += amount
+
+    def add(self, expense_date: datetime, amount: float) -> None:
+        """
+        Учесть новый расход
+        """
+        self._apply([(expense_date, amount)])
+
+    def remove(self, expense_date: datetime, amount: float) -> None:
+        """
+        Учесть удаление расхода
+        """
+        self._apply([(expense_date, -amount)])
+
+    def update(self,
+               old_date: datetime, old_amount: float,
+               new_date: datetime, new_amount: float) -> None:
+        """
+        Учесть изменение даты и/или суммы расхода
+        """
+        self._apply([(old_date, -old_amount), (new_date, new_amount)])
+
+    def handle(self, event: RepositoryEvent[Any]) -> None:
+        """
+        Учесть событие репозитория расходов: убрать старую версию расхода
+        и добавить новую (см. _expense_date). После массового изменения
+        ('reset') суммы считаются заново
+        """
+        if event.kind == 'reset':
+            self.refresh()
+            return
+        changes = []
+        if event.old is not None:
+            changes.append((_expense_date(event.old), -event.old.amount))
+        if event.new is not None:
+            changes.append((_expense_date(event.new), event.new.amount))
+        self._apply(changes)
+
+    def get(self, period: str) -> float:
+        """
+        Сумма расходов за текущий период period: 'day', 'week' или 'month'
+        """
+        self._roll_over()
+        return self._totals[period]
+
+    @property
+    def day(self) -> float:
+        """ Расходы за текущий день """
+        return self.get('day')
+
+    @property
+    def week(self) -> float:
+        """ Расходы за текущую неделю """
+        return self.get('week')
+
+    @property
+    def month(self) -> float:
+        """ Расходы за текущий месяц """
+        return self.get('month')
+
+
+def _expense_date(row: Any) -> datetime:
+    """
+    Дата расхода row как datetime: уже разобранная дата timestamp
+    (DataExpenseRow), дата Expense или разобранная строка в DATE_FORMAT
+    """
+    timestamp: datetime | None = getattr(row, 'timestamp', None)
+    if timestamp is not None:
+        return timestamp
+    if isinstance(row.expense_date, str):
+        return datetime.strptime(row.expense_date, DATE_FORMAT)
+    value: datetime = row.expense_date
+    return value
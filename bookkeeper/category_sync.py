@@ -0,0 +1,114 @@
+"""
+Модуль описывает синхронизацию списка категорий с репозиторием,
+а также слияние и разделение категорий
+"""
+from typing import Any, Iterable
+
+from bookkeeper.models.category import Category, CategoryTree
+from bookkeeper.repository.abstract_repository import AbstractRepository
+
+
+def sync_categories(tree: list[tuple[str, str | None]],
+                    repo_categories: AbstractRepository[Category],
+                    repo_expense: AbstractRepository[Any],
+                    default: str = 'Not stated') -> list[int]:
+    """
+    Привести категории в репозитории к дереву tree - списку пар
+    "потомок-родитель" в порядке топологической сортировки (см. read_tree).
+    Старое и новое дерево сравниваются по названиям:
+        категории с теми же названиями сохраняют свои pk,
+        у них меняется только родитель, если он изменился;
+        новые категории добавляются пакетами по уровням дерева;
+        категории, которых нет в tree, удаляются, а их расходы одним
+        запросом (repo_expense.update_field) переносятся
+        в категорию default, которая создаётся при необходимости.
+    Всё выполняется одной транзакцией repo_categories.transaction(),
+    репозиторий расходов должен разделять с ним пул соединений,
+    чтобы участвовать в той же транзакции.
+    Returns
+    -------
+    Список pk удалённых категорий
+    """
+    old = CategoryTree(repo_categories.get_all())
+    depth: dict[str, int] = {}
+    levels: list[list[tuple[str, str | None]]] = []
+    for child, parent in tree:
+        depth[child] = depth[parent] + 1 if parent is not None else 0
+        if depth[child] == len(levels):
+            levels.append([])
+        levels[depth[child]].append((child, parent))
+
+    with repo_categories.transaction():
+        pks = dict(old.pk_by_name)
+        for level in levels:
+            added: list[Category] = []
+            moved: list[Category] = []
+            for name, parent in level:
+                parent_pk = pks[parent] if parent is not None else None
+                cat = old.get_by_name(name)
+                if cat is None:
+                    added.append(Category(name, parent_pk))
+                elif cat.parent != parent_pk:
+                    moved.append(Category(name, parent_pk, cat.pk))
+            repo_categories.add_many(added)
+            repo_categories.update_many(moved)
+            pks.update((cat.name, cat.pk) for cat in added)
+        if default not in pks:
+            pks[default] = repo_categories.add(Category(default))
+        kept = set(depth) | {default}
+        deleted = [cat.pk for cat in old
+                   if cat.name not in kept or pks[cat.name] != cat.pk]
+        if deleted:
+            repo_expense.update_field('category', deleted, pks[default])
+            repo_categories.delete_many(deleted)
+    return deleted
+
+
+def merge_categories(old_pks: Iterable[int],
+                     new_pk: int,
+                     repo_categories: AbstractRepository[Category],
+                     repo_expense: AbstractRepository[Any]) -> int:
+    """
+    Слить категории old_pks в категорию new_pk одной транзакцией:
+    расходы и подкатегории old_pks переносятся в new_pk, сами категории
+    old_pks удаляются. Если new_pk была подкатегорией одной из old_pks,
+    она поднимается к ближайшему предку, который не удаляется.
+    Returns
+    -------
+    Число перенесённых расходов
+    """
+    old_pks = [pk for pk in dict.fromkeys(old_pks) if pk != new_pk]
+    target = repo_categories.get_by_pk(new_pk)
+    if target is None:
+        raise KeyError(new_pk)
+    parent = target.parent
+    for _ in old_pks:
+        if parent not in old_pks:
+            break
+        parent_cat = repo_categories.get_by_pk(parent)
+        parent = parent_cat.parent if parent_cat is not None else None
+    with repo_categories.transaction():
+        moved = repo_expense.update_field('category', old_pks, new_pk)
+        repo_categories.update_field('parent', old_pks, new_pk)
+        if parent != target.parent:
+            target.parent = parent
+            repo_categories.update_by_pk(target)
+        repo_categories.delete_many(old_pks)
+    return moved
+
+
+def split_category(pk: int,
+                   parts: dict[int, dict[str, Any]],
+                   repo_expense: AbstractRepository[Any]) -> int:
+    """
+    Разделить расходы категории pk между категориями одной транзакцией.
+    parts - словарь {pk новой категории: условие}, условие - словарь
+    {'название_поля': значение} как в get_all. Расходы, не подходящие
+    ни под одно условие, остаются в категории pk.
+    Returns
+    -------
+    Число перенесённых расходов
+    """
+    with repo_expense.transaction():
+        return sum(repo_expense.update_field('category', [pk], new_pk, where)
+                   for new_pk, where in parts.items())
@@ -8,30 +8,57 @@ from bookkeeper.presenter import Presenter
 from bookkeeper.repository.sqlite_repository import DataExpenseRow
 from bookkeeper.models.category import Category
 from bookkeeper.models.budget import Budget
+from bookkeeper.money import Money
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.connection_pool import ConnectionPool
+from bookkeeper.repository.migrations import migrate, check_money
+from bookkeeper.repository.migrations import BOOKKEEPER_MIGRATIONS
+
+# Представление сумм: Money(cents=True) - целые копейки, суммы считаются точно.
+# Выбирается при создании БД, суммы в уже созданной БД не пересчитываются:
+# если БД создана с другим представлением, приложение не запускается
+MONEY = Money()
 
 repo_expense_columns = ('pk', 'added_date', 'expense_date',
                         'category', 'amount', 'comment')
 repo_expense_types = ('INTEGER PRIMARY KEY', 'TIMESTAMP',
-                      'TIMESTAMP', 'TEXT', 'REAL', 'TEXT')
+                      'TIMESTAMP', 'TEXT', MONEY.sql_type, 'TEXT')
 
 repo_cat_columns = ("pk", "name", "parent")
 repo_cat_types = ("INTEGER PRIMARY KEY", "TEXT", "INTEGER")
 
 repo_budget_columns = ("pk", "period", "budget", "amount")
-repo_budget_types = ("INTEGER PRIMARY KEY", "TEXT", "REAL", "REAL")
+repo_budget_types = ("INTEGER PRIMARY KEY", "TEXT", MONEY.sql_type, MONEY.sql_type)
+
+DB_FILE = "test_presenter_db.db"
 
-repo_expense = SQLiteRepository("test_presenter_db.db", "expense_table",
-                                repo_expense_columns, repo_expense_types, DataExpenseRow)
-repo_categories = SQLiteRepository("test_presenter_db.db", "categories_table",
-                                   repo_cat_columns, repo_cat_types, Category)
-repo_budget = SQLiteRepository("test_presenter_db.db", "budget_table",
-                               repo_budget_columns, repo_budget_types, Budget)
+pool = ConnectionPool(DB_FILE)
+# миграции обновляют существующую БД, в новой БД таблицы итогов и связей
+# создаются ниже (create_daily_summary, create_closure)
+migrate(pool, BOOKKEEPER_MIGRATIONS)
+check_money(pool, MONEY, {'expense_table': ('amount',),
+                          'budget_table': ('budget', 'amount')})
+repo_expense = SQLiteRepository(DB_FILE, "expense_table",
+                                repo_expense_columns, repo_expense_types, DataExpenseRow,
+                                pool=pool,
+                                indexes=(('expense_date',), ('category',)))
+repo_expense.create_daily_summary()
+repo_categories = SQLiteRepository(DB_FILE, "categories_table",
+                                   repo_cat_columns, repo_cat_types, Category,
+                                   pool=pool,
+                                   indexes=(('parent',),))
+repo_categories.create_closure()
+repo_budget = SQLiteRepository(DB_FILE, "budget_table",
+                               repo_budget_columns, repo_budget_types, Budget,
+                               pool=pool)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    presenter: Presenter = Presenter(repo_expense, repo_categories, repo_budget)
-    presenter.main_window.show()
-    app.exec()
+    with pool:
+        presenter: Presenter = Presenter(repo_expense, repo_categories, repo_budget,
+                                         MONEY)
+        presenter.main_window.show()
+        app.exec()
+        presenter.close()
 else:
     pass
@@ -10,6 +10,8 @@ class Budget:
     Запланированный Бюджет на период
     period - период
     budget - сумма
+    amount - расходы за период
+    (в режиме копеек обе суммы - целые числа копеек, см. money)
     pk - id записи в БД
     """
     period: str = 'day'
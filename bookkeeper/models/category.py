@@ -3,7 +3,7 @@
 """
 from collections import defaultdict
 from dataclasses import dataclass
-from typing import Iterator
+from typing import Iterable, Iterator
 from bookkeeper.repository.abstract_repository import Model
 from ..repository.abstract_repository import AbstractRepository
 
@@ -20,7 +20,8 @@ class Category(Model):
     pk: int = 0
 
     def get_parent(self,
-                   repo: AbstractRepository['Category']) -> 'Category | None':
+                   repo: 'AbstractRepository[Category] | CategoryTree'
+                   ) -> 'Category | None':
         """
         Получить родительскую категорию в виде объекта Category
         Если метод вызван у категории верхнего уровня, возвращает None
@@ -36,7 +37,7 @@ class Category(Model):
         return repo.get_by_pk(self.parent)
 
     def get_all_parents(self,
-                        repo: AbstractRepository['Category']
+                        repo: 'AbstractRepository[Category] | CategoryTree'
                         ) -> Iterator['Category']:
         """
         Получить все категории верхнего уровня в иерархии.
@@ -46,7 +47,15 @@ class Category(Model):
         Yields
         -------
         Объекты Category от родителя и выше до категории верхнего уровня
+        Если репозиторий умеет получать предков одним запросом (get_ancestors),
+        например SQLiteRepository или CategoryTree, используется он,
+        иначе родители запрашиваются по одному.
         """
+        get_ancestors = getattr(repo, 'get_ancestors', None)
+        if get_ancestors is not None:
+            if self.parent is not None:
+                yield from get_ancestors(self.parent, include_self=True)
+            return
         parent = self.get_parent(repo)
         if parent is None:
             return
@@ -54,7 +63,7 @@ class Category(Model):
         yield from parent.get_all_parents(repo)
 
     def get_subcategories(self,
-                          repo: AbstractRepository['Category']
+                          repo: 'AbstractRepository[Category] | CategoryTree'
                           ) -> Iterator['Category']:
         """
         Получить все подкатегории из иерархии, т.е. непосредственные
@@ -64,20 +73,16 @@ class Category(Model):
         repo - репозиторий для получения объектов
         Yields
         -------
-        Объекты Category, являющиеся подкатегориями разного уровня ниже данной.
+        Объекты Category, являющиеся подкатегориями разного уровня ниже данной,
+        по уровням, а внутри уровня по pk.
+        Если репозиторий умеет получать потомков одним запросом (get_descendants),
+        например SQLiteRepository или CategoryTree, используется он, иначе
+        по всем категориям репозитория строится CategoryTree.
         """
-
-        def get_children(graph: dict[int | None, list['Category']],
-                         root: int) -> Iterator['Category']:
-            """ dfs in graph from root """
-            for x in graph[root]:
-                yield x
-                yield from get_children(graph, x.pk)
-
-        subcats = defaultdict(list)
-        for cat in repo.get_all():
-            subcats[cat.parent].append(cat)
-        return get_children(subcats, self.pk)
+        get_descendants = getattr(repo, 'get_descendants', None)
+        if get_descendants is None:
+            get_descendants = CategoryTree(repo.get_all()).get_descendants
+        return (cat for cat in get_descendants(self.pk))
 
     @classmethod
     def create_from_tree(
@@ -98,21 +103,129 @@ class Category(Model):
         ----------
         tree - список пар "потомок-родитель"
         repo - репозиторий для сохранения объектов
+        Категории добавляются пакетами (repo.add_many) по уровням дерева,
+        так что число обращений к репозиторию равно глубине дерева.
         Returns
         -------
         Список созданных объектов Category
         """
         created: dict[str, Category] = {}
+        levels: list[list[tuple[Category, str | None]]] = []
+        depth: dict[str, int] = {}
         for child, parent in tree:
-            cat = cls(child, created[parent].pk if parent is not None else None)
-            repo.add(cat)
+            depth[child] = depth[parent] + 1 if parent is not None else 0
+            if depth[child] == len(levels):
+                levels.append([])
+            cat = cls(child)
+            levels[depth[child]].append((cat, parent))
             created[child] = cat
+        for level in levels:
+            for cat, parent in level:
+                cat.parent = created[parent].pk if parent is not None else None
+            repo.add_many(cat for cat, _ in level)
         return list(created.values())
 
 
-def get_category_pk_by_name(cat_name: str, category_data: list[Category]) -> int:
+class CategoryTree:
     """
-    Возвращает pk категории по её названию
+    Индекс дерева категорий в памяти. Строится один раз по списку категорий
+    (например, repo.get_all()) и должен строиться заново при их изменении.
+    Атрибуты:
+        nodes - словарь pk -> категория
+        pk_by_name - словарь название -> pk
+        children - словарь pk родителя -> список непосредственных подкатегорий,
+                   категории верхнего уровня хранятся под ключом None
+    Поиск категории, её родителя и подкатегорий выполняется за O(1),
+    предков и потомков - за время, пропорциональное их числу.
+    Поддерживает get_by_pk, get_all, get_ancestors и get_descendants
+    как репозиторий, поэтому его можно передавать в методы Category.
     """
-    cat: list[int] = [x.pk for x in category_data if cat_name == x.name]
-    return cat[0]
+
+    def __init__(self, categories: Iterable[Category]) -> None:
+        self.nodes: dict[int, Category] = {}
+        self.pk_by_name: dict[str, int] = {}
+        self.children: defaultdict[int | None, list[Category]] = defaultdict(list)
+        for cat in categories:
+            self.nodes[cat.pk] = cat
+            self.pk_by_name[cat.name] = cat.pk
+            self.children[cat.parent].append(cat)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __iter__(self) -> Iterator[Category]:
+        return iter(self.nodes.values())
+
+    def get_by_pk(self, pk: int) -> Category | None:
+        """ Получить категорию по pk """
+        return self.nodes.get(pk)
+
+    def get_by_name(self, name: str) -> Category | None:
+        """ Получить категорию по названию """
+        pk = self.pk_by_name.get(name)
+        return None if pk is None else self.nodes[pk]
+
+    def get_all(self) -> list[Category]:
+        """ Все категории в порядке, в котором они были переданы """
+        return list(self.nodes.values())
+
+    def get_ancestors(self, pk: int, include_self: bool = False) -> list[Category]:
+        """
+        Предки категории pk от родителя до категории верхнего уровня.
+        include_self - включить в начало саму категорию
+        """
+        result: list[Category] = []
+        cat = self.nodes.get(pk)
+        if cat is not None and not include_self:
+            cat = self.nodes.get(cat.parent) if cat.parent is not None else None
+        while cat is not None and len(result) < len(self.nodes):
+            result.append(cat)
+            cat = self.nodes.get(cat.parent) if cat.parent is not None else None
+        return result
+
+    def get_descendants(self, pk: int, include_self: bool = False) -> list[Category]:
+        """
+        Потомки категории pk по уровням, а внутри уровня по pk -
+        в том же порядке, что и SQLiteRepository.get_descendants.
+        include_self - включить в начало саму категорию
+        """
+        return [cat for cat, _ in sorted(self._walk(pk, include_self),
+                                         key=lambda item: (item[1], item[0].pk))]
+
+    def _walk(self,
+              pk: int | None,
+              include_self: bool = False) -> Iterator[tuple[Category, int]]:
+        """
+        Обход поддерева pk в глубину без рекурсии: пары (категория, уровень),
+        уровень непосредственных подкатегорий pk равен 0.
+        pk = None - обход всех деревьев от категорий верхнего уровня
+        """
+        if include_self and pk is not None and pk in self.nodes:
+            yield self.nodes[pk], -1
+        stack = [(cat, 0) for cat in reversed(self.children.get(pk, []))]
+        seen: set[int | None] = {pk}
+        while stack:
+            cat, level = stack.pop()
+            if cat.pk in seen:
+                continue
+            seen.add(cat.pk)
+            yield cat, level
+            stack.extend((child, level + 1)
+                         for child in reversed(self.children.get(cat.pk, [])))
+
+    def render(self, indent: str = '\t', skip: Iterable[str] = ()) -> str:
+        """
+        Дерево категорий в виде текста: по строке на категорию,
+        подкатегории сдвинуты на indent относительно родителя.
+        skip - названия категорий верхнего уровня, которые не выводятся
+        (вместе с подкатегориями). Время работы линейно по числу категорий
+        """
+        skip = set(skip)
+        lines = []
+        for root in self.children.get(None, []):
+            if root.name in skip:
+                continue
+            lines.append(f'{root.name} \n')
+            lines.extend(f'{indent * (level + 1)}{cat.name} \n'
+                         for cat, level in self._walk(root.pk))
+        return ''.join(lines)
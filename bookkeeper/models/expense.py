@@ -10,7 +10,7 @@ from datetime import datetime
 class Expense:
     """
     Расходная операция.
-    amount - сумма
+    amount - сумма (в режиме копеек - целое число копеек, см. money)
     category - id категории расходов
     expense_date - дата расхода
     added_date - дата добавления в бд
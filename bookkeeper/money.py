@@ -0,0 +1,55 @@
+"""
+Модуль описывает представление денежных сумм
+
+Суммы хранятся в рублях числом с плавающей точкой (REAL) или, в режиме
+копеек, целым числом копеек (INTEGER). В режиме копеек суммы в моделях,
+в БД и в агрегатах - целые числа и складываются точно, а в рубли
+они переводятся только при показе.
+"""
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Any
+
+# Число копеек в рубле
+MINOR_UNITS = 100
+
+
+@dataclass(frozen=True)
+class Money:
+    """
+    Представление денежных сумм.
+    cents - хранить суммы целым числом копеек
+    """
+    cents: bool = False
+
+    @property
+    def sql_type(self) -> str:
+        """ Тип колонки БД для сумм """
+        return 'INTEGER' if self.cents else 'REAL'
+
+    def parse(self, text: str) -> float | int:
+        """
+        Сумма из введённой строки в рублях. В режиме копеек - целое число
+        копеек, доли копейки округляются. Если строка не число - ValueError
+        """
+        if not self.cents:
+            return float(text)
+        try:
+            value = Decimal(text.strip())
+        except InvalidOperation as error:
+            raise ValueError(f"could not convert string to amount: {text!r}") from error
+        if not value.is_finite():
+            raise ValueError(f"could not convert string to amount: {text!r}")
+        return int((value * MINOR_UNITS).to_integral_value(ROUND_HALF_UP))
+
+    def display(self, value: Any) -> Any:
+        """
+        Значение суммы для показа. В режиме копеек целое число копеек
+        показывается строкой в рублях ('12.50'), остальные значения
+        (и все суммы в обычном режиме) возвращаются без изменений
+        """
+        if not self.cents or not isinstance(value, int):
+            return value
+        sign = '-' if value < 0 else ''
+        units, minor = divmod(abs(value), MINOR_UNITS)
+        return f'{sign}{units}.{minor:02d}'
@@ -10,18 +10,27 @@ import datetime
 import typing
 
 from PySide6.QtWidgets import QMenu, QMessageBox, QHeaderView
-from PySide6.QtCore import Qt, QModelIndex, QPersistentModelIndex
+from PySide6.QtCore import Qt, QModelIndex, QPersistentModelIndex, QTimer
 from PySide6.QtGui import QCursor
 
 from bookkeeper.view.app_interface import MainWindow, ExpenseTableModel
-from bookkeeper.view.app_interface import BudgetModel, CatExpenseModel
+from bookkeeper.view.app_interface import BudgetModel, CatExpenseModel, Dispatcher
 from bookkeeper.repository.sqlite_repository import SQLiteRepository, DataExpenseRow
-from bookkeeper.models.category import Category
-from bookkeeper.repository.abstract_repository import T
-from bookkeeper.utils import read_tree
+from bookkeeper.models.category import Category, CategoryTree
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.buffered_repository import BufferedRepository
+from bookkeeper.repository.async_repository import AsyncRepository
+from bookkeeper.utils import read_tree, period_bounds
+from bookkeeper.budget_totals import BudgetTotals
+from bookkeeper.category_sync import sync_categories
 from bookkeeper.models.expense import Expense
 from bookkeeper.models.budget import Budget
-from bookkeeper.models.category import get_category_pk_by_name
+from bookkeeper.money import Money
+
+EXPENSE_PAGE_SIZE = 200
+# Сколько изменений расходов и сколько секунд они могут ждать записи в БД
+EXPENSE_BUFFER_SIZE = 50
+EXPENSE_FLUSH_DELAY = 2.0
 
 
 class Presenter:
@@ -31,10 +40,22 @@ class Presenter:
         repo_expense - репозиторий расходов
         repo_categories - репозиторий категорий
         repo_budget - репозиторий бюджета
+        money - представление сумм: в рублях или в целых копейках (см. Money).
+                Должно совпадать с типом колонок сумм в репозиториях
     Атрибуты:
-        repo_expenses - репозиторий для хранения расходов
+        repo_expenses - репозиторий для хранения расходов, изменения
+                   записываются в него отложенно (BufferedRepository)
         repo_categories - репозиторий для хранения категорий
         repo_budget - репозиторий для хранения бюджета
+                   (оба читаются через кэш CachedRepository)
+        async_expense - тот же репозиторий расходов для запросов, которые
+                   выполняются в рабочем потоке (AsyncRepository), результаты
+                   передаются в поток GUI через dispatcher. В этом же потоке
+                   записываются отложенные изменения расходов и изменения
+                   категорий, поэтому репозитории должны разделять пул
+                   соединений (его события тоже передаются через dispatcher)
+        category_tree - индекс категорий (CategoryTree), строится заново
+                   только при изменении категорий
         expense_data - данные в таблице на листе Expenses.
                    Сюда записываются отредактированные пользователем ячейки
                    Затем строки расходов сохранятся в репозиторий
@@ -44,23 +65,36 @@ class Presenter:
     """
 
     def __init__(self,
-                 repo_expense: SQLiteRepository[T],
-                 repo_categories: SQLiteRepository[T],
-                 repo_budget: SQLiteRepository[T],
+                 repo_expense: SQLiteRepository[DataExpenseRow],
+                 repo_categories: SQLiteRepository[Category],
+                 repo_budget: SQLiteRepository[Budget],
+                 money: Money = Money()
                  ) -> None:
-        self.repo_expense = repo_expense
-        self.repo_budget = repo_budget
-        self.repo_categories = repo_categories
-
-        self.expense_data = self.expense_data_init()
+        self.money = money
+        self.dispatcher = Dispatcher()
+        # события репозиториев, изменённых в рабочем потоке, приходят в поток GUI
+        repo_expense.pool.dispatch = self.dispatcher
+        self.async_expense = AsyncRepository(repo_expense, self.dispatcher)
+        self.repo_expense = BufferedRepository(repo_expense,
+                                               max_pending=EXPENSE_BUFFER_SIZE,
+                                               max_delay=EXPENSE_FLUSH_DELAY,
+                                               on_flush=self.expenses_flushed,
+                                               writer=self.async_expense,
+                                               on_error=self.show_error)
+        self._by_cat_request = 0
+        self.repo_budget = CachedRepository(repo_budget)
+        self.repo_categories = CachedRepository(repo_categories)
+        self.category_tree = self.category_data_init()
+
+        expense_model = self.expense_model_init()
+        self.budget_totals = BudgetTotals(self.repo_expense.get_period_sum)
+        self.repo_expense.subscribe(self.budget_totals.handle)
         budget_data = self.budget_data_init()
         data = [Budget.make_table_row(row) for row in budget_data]
-        self.main_window = MainWindow(self.expense_data, data)
-        self.main_window.category.text_box.setText(
-            read_categories(self.category_data_init())
-        )
+        self.main_window = MainWindow(expense_model, data, money)
+        self.main_window.category.text_box.setText(read_categories(self.category_tree))
 
-        self.main_window.set_line_category(self.category_data_init())
+        self.main_window.set_line_category(self.category_tree)
         self.day_expense_by_cat()
         self.main_window.budget.table_cat_expenses.horizontalHeader(). \
             setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
@@ -86,23 +120,55 @@ class Presenter:
 
         self.main_window.budget.cat_day_expense_button. \
             clicked.connect(self.day_expense_by_cat)  # type: ignore[attr-defined]
+        self.main_window.budget.cat_week_expense_button. \
+            clicked.connect(self.week_expense_by_cat)  # type: ignore[attr-defined]
         self.main_window.budget.cat_month_expense_button. \
             clicked.connect(self.month_expense_by_cat)  # type: ignore[attr-defined]
 
+        self.flush_timer = QTimer()
+        self.flush_timer.timeout.connect(  # type: ignore[attr-defined]
+            self.repo_expense.flush_if_due)
+        self.flush_timer.start(int(EXPENSE_FLUSH_DELAY * 500))
+
+    def close(self) -> None:
+        """
+        Записать отложенные изменения расходов. Вызывается при выходе из приложения
+        """
+        self.flush_timer.stop()
+        self.repo_expense.close()
+        self.async_expense.close()
+
+    def expenses_flushed(self, new_pks: dict[int, int]) -> None:
+        """
+        Вызывается после записи отложенных изменений расходов в репозиторий:
+        заменяет временные pk добавленных строк таблицы расходов на pk из
+        репозитория и обновляет таблицу расходов по категориям
+        """
+        for row_num, row in enumerate(self.expense_data):
+            pk = int(row[0])
+            if pk in new_pks:
+                new_row: list[typing.Any] = [new_pks[pk], *row[1:]]
+                self.expense_model.replace_row(row_num, new_row)
+        self.day_expense_by_cat()
+
+    def expense_model_init(self) -> ExpenseTableModel:
+        """
+        Создаёт модель таблицы расходов(вкладка Expenses).
+        В модель загружается только первая страница расходов,
+        остальные подгружаются по мере прокрутки таблицы
+        """
+        self.expense_data = self.expense_data_init()
+        fetch = self.fetch_expense_page if self.expense_data[0][0] != '0' else None
+        self.expense_model = ExpenseTableModel(self.expense_data, fetch,
+                                               EXPENSE_PAGE_SIZE, self.money)
+        return self.expense_model
+
     def expense_data_init(self) -> list[list[str]]:
         """
         Метод для инициализации данных таблицы расходов(вкладка Expenses)
+        Возвращает первую страницу расходов, начиная с самых новых
         """
-        table_name = self.repo_expense.table_name
-        columns = (f'{table_name}.pk', 'expense_date', 'amount', 'name', 'comment')
-        data_from_repo = self.repo_expense.get_join(
-            self.repo_expense.table_name,
-            self.repo_categories.table_name,
-            field_table_1="category",
-            field_table_2="pk",
-            columns=columns
-        )
-        data_to_expense_table = [list(x) for x in data_from_repo]
+        data_to_expense_table = self.get_expense_page(None, EXPENSE_PAGE_SIZE)
         now = datetime.datetime.now().strftime('%d-%m-%Y %H:%M')
         if len(data_to_expense_table) == 0:
             data_to_expense_table = [
@@ -110,144 +176,182 @@ class Presenter:
             ]
         return data_to_expense_table
 
-    def budget_data_init(self) -> list[Budget]:
+    def get_expense_page(self, last_row: list[str] | None,
+                         limit: int) -> list[list[str]]:
         """
-        Метод для инициализации данных таблицы бюджета (вкладка Budget)
-        Обновляет поле amount
-        """
-        day_expense = self.get_day_expense()
-        if (self.repo_budget.get_by_pk(1)) is None:
-            self.repo_budget.add(Budget(period="day", budget=0, amount=day_expense))
-        day_budget = (self.repo_budget.get_by_pk(1))
-        self.repo_budget.update_by_pk(
-            Budget(pk=1, budget=day_budget.budget, amount=day_expense, period="day")
-        )
-
-        week_expense = self.get_week_expense()
-        if (self.repo_budget.get_by_pk(2)) is None:
-            self.repo_budget.add(Budget(period="week", budget=0, amount=week_expense))
-        week_budget = (self.repo_budget.get_by_pk(2))
-        self.repo_budget.update_by_pk(
-            Budget(pk=2, budget=week_budget.budget, amount=week_expense, period="week")
-        )
+        Получить limit строк таблицы расходов, следующих за строкой last_row
+        (по убыванию даты расхода). Если last_row не задана - первые limit строк.
+        Последняя колонка строки - дата в формате БД, по ней и pk ищется
+        продолжение (выборка по ключу)
+        """
+        data_from_repo = self.repo_expense.get_join(
+            **self._expense_page_query(last_row, limit))
+        return [list(x) for x in data_from_repo]
 
-        month_expense = self.get_month_expense()
-        if (self.repo_budget.get_by_pk(3)) is None:
-            self.repo_budget.add(
-                Budget(period="month", budget=0, amount=month_expense)
-            )
-        month_budget = (self.repo_budget.get_by_pk(3))
-        self.repo_budget.update_by_pk(
-            Budget(pk=3, budget=month_budget.budget, amount=month_expense, period="month")
+    def fetch_expense_page(self, last_row: list[str] | None, limit: int,
+                           done: typing.Callable[[list[list[str]] | None], None]
+                           ) -> None:
+        """
+        Получить в рабочем потоке строки таблицы расходов, как get_expense_page,
+        и передать их в done (при ошибке - None). Отложенные изменения расходов
+        записываются до запроса, чтобы он их видел
+        """
+        def failed(error: BaseException) -> None:
+            done(None)
+            self.show_error(error)
+
+        self.repo_expense.flush()
+        self.async_expense.submit(
+            'get_join', **self._expense_page_query(last_row, limit),
+            on_result=lambda rows: done([list(x) for x in rows]),
+            on_error=failed
         )
 
-        day_budget = (self.repo_budget.get_by_pk(1))
-        week_budget = (self.repo_budget.get_by_pk(2))
-        month_budget = (self.repo_budget.get_by_pk(3))
-        return [
-            day_budget,
-            week_budget,
-            month_budget
-        ]
+    def _expense_page_query(self, last_row: list[str] | None,
+                            limit: int) -> dict[str, typing.Any]:
+        """ Аргументы get_join для страницы таблицы расходов (см. get_expense_page) """
+        table_name = self.repo_expense.table_name
+        columns = (f'{table_name}.pk', "strftime('%d-%m-%Y %H:%M', expense_date)",
+                   'amount', 'name', 'comment', f'{table_name}.expense_date')
+        after = None if last_row is None else (last_row[5], int(last_row[0]))
+        return {
+            'table_1': table_name,
+            'table_2': self.repo_categories.table_name,
+            'field_table_1': 'category',
+            'field_table_2': 'pk',
+            'columns': columns,
+            'order_by': (f'{table_name}.expense_date', f'{table_name}.pk'),
+            'desc': True,
+            'limit': limit,
+            'after': after,
+        }
 
-    def category_data_init(self) -> list[Category]:
+    def budget_data_init(self) -> list[Budget]:
+        """
+        Метод для инициализации данных таблицы бюджета (вкладка Budget)
+        Обновляет поле amount, если расходы за период изменились
         """
-        Метод для инициализации списка категорий
+        budgets = []
+        for pk, period in enumerate(BudgetTotals.periods, 1):
+            amount = self.budget_totals.get(period)
+            budget = self.repo_budget.get_by_pk(pk)
+            if budget is None:
+                budget = Budget(period=period, budget=0, amount=amount)
+                self.repo_budget.add(budget)
+            if budget.amount != amount:
+                budget = Budget(pk=pk, budget=budget.budget, amount=amount, period=period)
+                self.repo_budget.update_by_pk(budget)
+            budgets.append(budget)
+        return budgets
+
+    def category_data_init(self) -> CategoryTree:
+        """
+        Метод для инициализации индекса категорий.
+        Читает все категории из репозитория, поэтому вызывается только
+        при создании Presenter и после изменения списка категорий
         """
         not_stated = 'Not stated'
-        if len(self.repo_categories.get_all()) == 0:
+        if self.repo_categories.count() == 0:
             self.repo_categories.add(Category(
                 name=not_stated,
                 parent=None
             ))
-        return [
-            Category(pk=cat.pk, name=cat.name, parent=cat.parent)
-            for cat in self.repo_categories.get_all()
-        ]
+        self.category_tree = CategoryTree(self.repo_categories.get_all())
+        return self.category_tree
 
-    def day_expense_by_cat(self) -> None:
+    def expense_by_cat(self, period: str) -> None:
         """
-        Передача данных о расходах за день в таблицу расходы по категориям(вкладка Budget)
-        Активируется при запуске приложения, изменении таблицы расходов и
-        при нажатии кнопки day во вкладке(Budget)
+        Передача данных о расходах за текущий период period ('day', 'week', 'month')
+        в таблицу расходы по категориям(вкладка Budget).
+        Сумма категории включает расходы всех её подкатегорий,
+        суммы по всем категориям считаются одним запросом в рабочем потоке,
+        таблица заполняется, когда он выполнится (см. show_expense_by_cat).
+        Отложенные изменения расходов записываются до запроса, чтобы он их видел
         """
-        data = self.repo_expense.get_cat_expense_data_day()
-        if len(data) == 0:
-            data = [
-                ['food ', '1500']
-            ]
-        model = CatExpenseModel(data)
-        self.main_window.budget.table_cat_expenses.setModel(model)
-
-        self.main_window.budget.cat_day_expense_button.setStyleSheet(
-            'QPushButton {background-color: darkGray; color: black;}'
-        )
-        self.main_window.budget.cat_month_expense_button.setStyleSheet(
-            'QPushButton {background-color: white; color: black;}'
+        self.repo_expense.flush()
+        self._by_cat_request += 1
+        request = self._by_cat_request
+        self.async_expense.submit(
+            'rollup', self.repo_categories.table_name, *period_bounds(period),
+            closure_table=self.repo_categories.closure_table,
+            on_result=lambda rows: self.show_expense_by_cat(request, rows),
+            on_error=self.show_error
         )
+
+        buttons = {
+            'day': self.main_window.budget.cat_day_expense_button,
+            'week': self.main_window.budget.cat_week_expense_button,
+            'month': self.main_window.budget.cat_month_expense_button,
+        }
+        for button_period, button in buttons.items():
+            color = 'darkGray' if button_period == period else 'white'
+            button.setStyleSheet(
+                f'QPushButton {{background-color: {color}; color: black;}}'
+            )
         return None
 
-    def month_expense_by_cat(self) -> None:
+    def show_expense_by_cat(self, request: int,
+                            rows: list[tuple[int, str, float]]) -> None:
         """
-        Передача данных о расходах за день в таблицу расходы по категориям(вкладка Budget)
-        Активируется при нажатии кнопки month во вкладке Budget
+        Заполнить таблицу расходы по категориям(вкладка Budget) результатом
+        запроса request. Результаты устаревших запросов пропускаются
         """
-        data = self.repo_expense.get_cat_expense_data_month()
+        if request != self._by_cat_request:
+            return
+        data: list[list[str | float]] = [[name, total] for _, name, total in rows
+                                         if total]
         if len(data) == 0:
             data = [
                 ['food', '1500']
             ]
-        model = CatExpenseModel(data)
+        model = CatExpenseModel(data, self.money)
         self.main_window.budget.table_cat_expenses.setModel(model)
 
-        self.main_window.budget.cat_month_expense_button.setStyleSheet(
-            'QPushButton {background-color: darkGray; color: black;}'
-        )
-        self.main_window.budget.cat_day_expense_button.setStyleSheet(
-            'QPushButton {background-color white: green; color: black;}'
-        )
-        return None
+    def show_error(self, error: BaseException) -> None:
+        """
+        Показать ошибку запроса, выполненного в рабочем потоке
+        """
+        QMessageBox.critical(self.main_window, 'Error', str(error))
+
+    def day_expense_by_cat(self) -> None:
+        """
+        Передача данных о расходах за день в таблицу расходы по категориям(вкладка Budget)
+        Активируется при запуске приложения, изменении таблицы расходов и
+        при нажатии кнопки day во вкладке(Budget)
+        """
+        self.expense_by_cat('day')
+
+    def week_expense_by_cat(self) -> None:
+        """
+        Передача данных о расходах за неделю в таблицу расходы по категориям
+        (вкладка Budget). Активируется при нажатии кнопки week во вкладке Budget
+        """
+        self.expense_by_cat('week')
+
+    def month_expense_by_cat(self) -> None:
+        """
+        Передача данных о расходах за месяц в таблицу расходы по категориям
+        (вкладка Budget). Активируется при нажатии кнопки month во вкладке Budget
+        """
+        self.expense_by_cat('month')
 
     def get_day_expense(self) -> float:
         """
         Возвращает расходы за текущий день
         """
-        today = datetime.datetime.today().date()
-        day_expense = sum(
-            (float(row[2]) for row in self.expense_data
-             if datetime.datetime.strptime(row[1], '%d-%m-%Y %H:%M').date() == today
-             ))
-        return day_expense
+        return self.budget_totals.day
 
     def get_week_expense(self) -> float:
         """
         Возвращает расходы за текущую неделю
         """
-        today = datetime.datetime.today().date()
-        week_expense = 0
-        for row in self.expense_data:
-            row_date = datetime.datetime.strptime(row[1], '%d-%m-%Y %H:%M')
-            row_year = row_date.date().year
-            row_week = row_date.date().isocalendar().week
-            today_week = today.isocalendar().week
-            if row_year == today.year \
-                    and today_week == row_week:
-                week_expense += float(row[2])
-
-        return week_expense
+        return self.budget_totals.week
 
     def get_month_expense(self) -> float:
         """
         Возвращает расходы за текущий месяц
         """
-        today = datetime.datetime.today().date()
-        month_expense = 0
-        for row in self.expense_data:
-            row_date = datetime.datetime.strptime(row[1], '%d-%m-%Y %H:%M')
-            if today.year == row_date.date().year \
-                    and today.month == row_date.date().month:
-                month_expense += float(row[2])
-        return month_expense
+        return self.budget_totals.month
 
     def change_budget(self) -> None:
         """
@@ -263,45 +367,26 @@ class Presenter:
         month_budget = self.main_window.budget.line_month_budget.text()
         if not amount_right_input(self.main_window, month_budget):
             return None
-        self.repo_budget.delete_all()
-        self.repo_budget.next_id = 1
-        self.repo_budget.add(
-            Budget(period="day", budget=float(day_budget)
-                   ))
-        self.repo_budget.add(
-            Budget(period="week", budget=float(week_budget))
-        )
-        self.repo_budget.add(
-            Budget(period="month", budget=float(month_budget))
+        self.repo_budget.update_many(
+            Budget(pk=budget.pk, period=budget.period, budget=self.money.parse(value),
+                   amount=budget.amount)
+            for budget, value in zip(self.budget_data_init(),
+                                     (day_budget, week_budget, month_budget))
         )
         budget_data = self.budget_data_init()
         data = [Budget.make_table_row(row) for row in budget_data]
-        budget_model = BudgetModel(data)
+        budget_model = BudgetModel(data, self.money)
         self.main_window.budget.table_budget.setModel(budget_model)
         return None
 
-    def update_expense_cat(self, new_cat_pk: int, old_cat_pk: int) -> None:
-        """
-        Обновляет id категории в репозитории расходов:
-        У всех расходов с category == old_cat_pk, category меняется на new_cat_pk
-        """
-        for row in self.repo_expense.get_all():
-            expense_date = datetime.datetime.strptime(row.expense_date, '%d-%m-%Y %H:%M')
-            if float(row.category) == old_cat_pk:
-                self.repo_expense.update_by_pk(DataExpenseRow(
-                    (Expense(
-                        pk=row.pk,
-                        expense_date=expense_date,
-                        category=new_cat_pk,
-                        amount=row.amount,
-                        comment=row.comment
-                    ))))
-        return None
-
     def commit_categories(self) -> None:
         """
         Меняет список категорий:
         Активируется при нажатии кнопки "commit changes" во вкладке Category list
+        Категории с прежними названиями сохраняются, изменения выполняются
+        одной транзакцией (см. sync_categories) в рабочем потоке.
+        Пока категории и расходы меняются, окно не принимает новые изменения,
+        после этого таблицы обновляются в categories_committed
         """
         not_stated = 'Not stated'
         cat_text = self.main_window.category.text_box.toPlainText()
@@ -310,43 +395,39 @@ class Presenter:
         have_same_categories = same_categories_check(self.main_window, data)
         if not have_same_categories:
             self.main_window.category.text_box.setText(
-                read_categories(self.category_data_init())
+                read_categories(self.category_tree)
             )
             return None
 
-        old_data = self.category_data_init()
-        self.repo_categories.delete_all()
-        self.repo_categories.add(
-            Category(name=not_stated, parent=None)
-        )
+        def failed(error: BaseException) -> None:
+            self.main_window.setEnabled(True)
+            self.main_window.category.text_box.setText(
+                read_categories(self.category_tree)
+            )
+            self.show_error(error)
+
+        self.main_window.setEnabled(False)
+        # расходы записываются в той же очереди до изменения категорий
+        self.repo_expense.flush()
+        self.async_expense.run(sync_categories, read_tree(data),
+                               self.repo_categories.repo, self.async_expense.repo,
+                               not_stated,
+                               on_result=self.categories_committed, on_error=failed)
+        return None
 
-        Category.create_from_tree(read_tree(data), self.repo_categories)
-        update_data: list[Category] = self.category_data_init()
-        for old_cat_row in old_data:
-            has_same_name = False
-            for new_cat_row in update_data:
-                if new_cat_row.name == 'Not stated':
-                    continue
-                if old_cat_row.name == new_cat_row.name:
-                    has_same_name = True
-                    self.update_expense_cat(
-                        new_cat_pk=new_cat_row.pk,
-                        old_cat_pk=old_cat_row.pk
-                    )
-            if not has_same_name:
-                category_data = self.category_data_init()
-                pk = get_category_pk_by_name(not_stated, category_data)
-                self.update_expense_cat(new_cat_pk=pk, old_cat_pk=old_cat_row.pk)
-        self.main_window.set_line_category(self.category_data_init())
+    def categories_committed(self, _: list[int]) -> None:
+        """
+        Обновляет окно после изменения категорий в рабочем потоке
+        (см. commit_categories)
+        """
+        self.main_window.setEnabled(True)
+        update_data = self.category_data_init()
+        self.main_window.set_line_category(update_data)
 
-        self.expense_data = self.expense_data_init()
-        expense_model = ExpenseTableModel(self.expense_data)
-        self.main_window.expense.expense_table.setModel(expense_model)
+        self.main_window.expense.expense_table.setModel(self.expense_model_init())
 
         self.day_expense_by_cat()
 
-        return None
-
     def table_menu(self) -> None:
         """
         Меню Delete row|Update cell строки расходов.
@@ -366,65 +447,97 @@ class Presenter:
         menu.exec_(QCursor.pos())
 
     def remove_row(self,
-                   indexes: list[typing.Union[QModelIndex, QPersistentModelIndex]]
+                   indexes: typing.Sequence[QModelIndex | QPersistentModelIndex]
                    ) -> None:
         """
         Удаление сроки таблицы расходов.
         Срабатывае при нажатии кнопки "Delete row". См table_menu
+        Из модели таблицы удаляются только эти строки, таблица не перезагружается.
+        Если удалены все загруженные строки, таблица загружается заново
         """
         rows = set(index.row() for index in indexes)
-        for row in rows:
-            self.repo_expense.delete_by_pk(int(self.expense_data[row][0]))
-
-        self.expense_data = self.expense_data_init()
-        expense_model = ExpenseTableModel(self.expense_data)
-        self.main_window.expense.expense_table.setModel(expense_model)
-
-        budget_data = self.budget_data_init()
-        data = [Budget.make_table_row(row) for row in budget_data]
-        budget_model = BudgetModel(data)
-        self.main_window.budget.table_budget.setModel(budget_model)
-
-        self.day_expense_by_cat()
+        pks = [int(self.expense_data[row][0]) for row in rows]
+        self.repo_expense.delete_many(pks)
+        self.expense_model.remove_rows(rows)
+        if not self.expense_data:
+            self.main_window.expense.expense_table.setModel(self.expense_model_init())
+        self.budget_update()
 
     def update_cell(self,
-                    indexes: list[typing.Union[QModelIndex, QPersistentModelIndex]]
+                    indexes: typing.Sequence[QModelIndex | QPersistentModelIndex]
                     ) -> None:
         """
         Обновление выделенных ячеек.
         Срабатывае при нажатии кнопки "Update cell". См table_menu
+        В модели таблицы обновляются только эти строки. Строки с неверно
+        заполненными ячейками возвращаются к данным из репозитория.
+        Строка с изменённой датой переставляется на своё место по дате
         """
         rows = list(index.row() for index in indexes)
         columns = list(index.column() for index in indexes)
+        category_data = self.category_tree
+        updated_rows: dict[int, DataExpenseRow] = {}
         for row, col in zip(rows, columns):
             if check_correct_update(
                     self.main_window,
                     row, col,
                     self.expense_data,
-                    self.category_data_init()
+                    category_data
             ):
-                new_expense_row = get_expense_row_by_row_number(
+                updated_rows[row] = get_expense_row_by_row_number(
                     row,
-                    self.category_data_init(),
-                    self.expense_data
+                    category_data,
+                    self.expense_data,
+                    self.money
                 )
-                self.repo_expense.update_by_pk(new_expense_row)
-
-        self.expense_data = self.expense_data_init()
-        expense_model = ExpenseTableModel(self.expense_data)
-        self.main_window.expense.expense_table.setModel(expense_model)
-
-        budget_data = self.budget_data_init()
-        data = [Budget.make_table_row(row) for row in budget_data]
-        budget_model = BudgetModel(data)
-        self.main_window.budget.table_budget.setModel(budget_model)
-
-        self.day_expense_by_cat()
+        self.repo_expense.update_many(updated_rows.values())
+
+        moved: list[list[typing.Any]] = []
+        removed: list[int] = []
+        for row in sorted(set(rows)):
+            if self.expense_data[row][0] == '0':
+                continue
+            expense_row = updated_rows.get(row)
+            if expense_row is None:
+                expense_row = self.repo_expense.get_by_pk(int(self.expense_data[row][0]))
+            if expense_row is None:
+                removed.append(row)
+                continue
+            table_row = expense_table_row(
+                expense_row, category_data.nodes[int(expense_row.category)].name
+            )
+            if table_row[5] == self.expense_data[row][5]:
+                self.expense_model.replace_row(row, table_row)
+            else:
+                removed.append(row)
+                moved.append(table_row)
+        self.expense_model.remove_rows(removed)
+        for table_row in moved:
+            self._place_expense_row(table_row)
+
+        self.budget_update()
+
+    def _place_expense_row(self, table_row: list[typing.Any]) -> None:
+        """
+        Вставить строку table_row в загруженные строки таблицы расходов
+        на её место по (дата, pk). Строка старше последней загруженной
+        не вставляется: она придёт со следующими порциями
+        """
+        cursor = self.expense_model.cursor
+        if self.expense_model.exhausted or cursor is None \
+                or (table_row[5], int(table_row[0])) > (cursor[5], int(cursor[0])):
+            position = desc_insert_position(self.expense_data, table_row)
+            self.expense_model.insert_row(position, table_row)
+        else:
+            # запрошенная порция могла быть прочитана до изменения
+            self.expense_model.discard_fetch()
 
     def add_expense_row(self) -> None:
         """
         Добавляет в репозиторий новую запись, обновляет таблицу во вкладке(Expense)
         Активируется при нажатии кнопки "Add expense" во вкладке Categories
+        Новая строка вставляется в уже загруженные строки таблицы на своё место
+        по дате. Если она старше всех загруженных, она будет загружена при прокрутке
         """
         text_date = self.main_window.expense.line_date.text()
         amount = self.main_window.expense.line_amount.text()
@@ -435,83 +548,89 @@ class Presenter:
         if not date_right_input(self.main_window, text_date):
             return None
         date = datetime.datetime.strptime(text_date, '%d-%m-%Y %H:%M')
-        category_data = self.category_data_init()
-        pk = [x for i, x in enumerate(category_data) if x.name == category]
-        row = Expense(amount=float(amount), category=pk[0].pk,
+        row = Expense(amount=self.money.parse(amount),
+                      category=self.category_tree.pk_by_name[category],
                       expense_date=date, comment=comment)
-        self.repo_expense.add(DataExpenseRow(row))
-        self.expense_data = self.expense_data_init()
-        expense_model = ExpenseTableModel(self.expense_data)
-        self.main_window.expense.expense_table.setModel(expense_model)
+        expense_row = DataExpenseRow(row)
+        self.repo_expense.add(expense_row)
+
+        if not self.expense_data or self.expense_data[0][0] == '0':
+            self.main_window.expense.expense_table.setModel(self.expense_model_init())
+        else:
+            self._place_expense_row(expense_table_row(expense_row, category))
 
+        self.budget_update()
+
+        return None
+
+    def budget_update(self) -> None:
+        """
+        Обновляет таблицу бюджета после изменения расходов.
+        Таблица расходов по категориям(вкладка Budget) обновляется
+        после записи изменений в репозиторий, см. expenses_flushed
+        """
         budget_data = self.budget_data_init()
         data = [Budget.make_table_row(row) for row in budget_data]
-        budget_model = BudgetModel(data)
+        budget_model = BudgetModel(data, self.money)
         self.main_window.budget.table_budget.setModel(budget_model)
 
-        self.day_expense_by_cat()
+        self.repo_expense.flush_if_due()
 
-        return None
+
+def expense_table_row(expense_row: DataExpenseRow,
+                      cat_name: str) -> list[typing.Any]:
+    """
+    Строка таблицы расходов на вкладке Expenses для строки репозитория.
+    Формат совпадает со строками Presenter.get_expense_page
+    """
+    display_date = expense_row.timestamp.strftime('%d-%m-%Y %H:%M')
+    return [expense_row.pk, display_date, expense_row.amount, cat_name,
+            expense_row.comment, expense_row.expense_date]
+
+
+def desc_insert_position(expense_data: list[list[str]], table_row: list[str]) -> int:
+    """
+    Номер, под которым строку table_row нужно вставить в строки таблицы расходов,
+    отсортированные по убыванию (дата, pk). Двоичный поиск по загруженным строкам
+    """
+    key = (table_row[5], int(table_row[0]))
+    low, high = 0, len(expense_data)
+    while low < high:
+        middle = (low + high) // 2
+        if (expense_data[middle][5], int(expense_data[middle][0])) > key:
+            low = middle + 1
+        else:
+            high = middle
+    return low
 
 
 def get_expense_row_by_row_number(
         row_num: int,
-        category_data: list[Category],
-        expense_data: list[list[str]]) -> DataExpenseRow:
+        category_data: CategoryTree,
+        expense_data: list[list[str]],
+        money: Money = Money()) -> DataExpenseRow:
     """
-    Получить строку расходов по номеру в таблице расходов на вкладке Expenses
+    Получить строку расходов по номеру в таблице расходов на вкладке Expenses.
+    Отредактированная сумма - строка в рублях, она переводится в представление money
     """
     date = expense_data[row_num][1]
     date_expense = datetime.datetime.strptime(date, '%d-%m-%Y %H:%M')
+    amount: typing.Any = expense_data[row_num][2]
     expense = Expense(
         pk=int(expense_data[row_num][0]),
         expense_date=date_expense,
-        amount=float(expense_data[row_num][2]),
-        category=get_category_pk_by_name(expense_data[row_num][3], category_data),
+        amount=money.parse(amount) if isinstance(amount, str) else amount,
+        category=category_data.pk_by_name[expense_data[row_num][3]],
         comment=expense_data[row_num][4]
     )
     return DataExpenseRow(expense)
 
 
-def get_subcategories(cat: Category, category_data: list[Category]) -> list[Category]:
-    """
-    Получить список подкатегорий
-    """
-    sub_cat_pk = [data.pk for data in category_data if cat.pk == data.parent]
-    sub_cat = [x for x in category_data if x.pk in sub_cat_pk]
-    return sub_cat
-
-
-def print_sub_cat(sub_cat: Category,
-                  space_num: int,
-                  category_data: list[Category]) -> str:
-    """
-    формирует строку в виде дерева из подкатегорий
-    """
-    cat_string = space_num * '\t' + f'{sub_cat.name} \n'
-    sub_sub_cat = get_subcategories(sub_cat, category_data)
-    for sub in sub_sub_cat:
-        cat_string += print_sub_cat(sub, space_num + 1, category_data)
-    return cat_string
-
-
-def read_categories(category_data: list[Category]) -> str:
+def read_categories(category_data: CategoryTree) -> str:
     """
-    Формирует строку в виде дерева из списка категорий
+    Формирует строку в виде дерева из индекса категорий
     """
-    cat_string = ''
-    not_stated = 'Not stated'
-    for cat in category_data:
-        if cat.name == not_stated:
-            continue
-        if cat.parent is None:
-            cat_string += f'{cat.name} \n'
-            space_num = 1
-            for sub_cat in get_subcategories(cat, category_data):
-                cat_string += print_sub_cat(sub_cat, space_num, category_data)
-        else:
-            continue
-    return cat_string
+    return category_data.render(skip=('Not stated',))
 
 
 def date_right_input(main_window: MainWindow, date: str) -> bool:
@@ -567,12 +686,11 @@ def same_categories_check(main_window: MainWindow, categories: list[str]) -> boo
 def category_right_input(
         main_window: MainWindow,
         new_cat_name: str,
-        category_data: list[Category]) -> bool:
+        category_data: CategoryTree) -> bool:
     """
     Проверка на правильное заполнение списка категорий
     """
-    cat_data = [category.name for category in category_data]
-    if new_cat_name in cat_data:
+    if new_cat_name in category_data.pk_by_name:
         return True
     error_message = f"Category {new_cat_name} is not in category list"
     QMessageBox.critical(main_window, 'Error', error_message)
@@ -582,7 +700,7 @@ def category_right_input(
 def check_correct_update(main_window: MainWindow,
                          row: int, col: int,
                          expense_data: list[list[str]],
-                         category_data: list[Category]) -> bool:
+                         category_data: CategoryTree) -> bool:
     """
     Проверка на правильное обновление ячеек в таблице расходов:
         правильное заполнение поля date,
@@ -8,7 +8,10 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar, Protocol, Any
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import wraps
+from typing import Generic, TypeVar, Protocol, Any, Callable, Iterable, Iterator, Literal
 
 
 class Model(Protocol):  # pylint: disable=too-few-public-methods
@@ -21,6 +24,29 @@ class Model(Protocol):  # pylint: disable=too-few-public-methods
 T = TypeVar('T', bound=Model)
 
 
+EventKind = Literal['added', 'updated', 'deleted', 'reset']
+
+
+@dataclass(frozen=True)
+class RepositoryEvent(Generic[T]):
+    """
+    Изменение записи репозитория, которое получают подписчики (см. subscribe)
+    kind - 'added', 'updated', 'deleted' или 'reset' - массовое изменение
+           записей, которые репозиторий не читал (pk = 0, old и new - None):
+           подписчик должен заново прочитать нужные ему данные
+    pk - id записи
+    old - запись до изменения (None для 'added')
+    new - запись после изменения (None для 'deleted')
+    """
+    kind: EventKind
+    pk: int
+    old: T | None = None
+    new: T | None = None
+
+
+Subscriber = Callable[[RepositoryEvent[Any]], None]
+
+
 class AbstractRepository(ABC, Generic[T]):
     """
     Абстрактный репозиторий.
@@ -30,6 +56,15 @@ class AbstractRepository(ABC, Generic[T]):
     get_all
     update
     delete
+    Пакетные методы add_many, update_many, delete_many по умолчанию
+    вызывают одиночные методы, iter_all и count - get_all,
+    update_field - get_all и update_many.
+    Наследники могут переопределить их, например, чтобы выполнять пакет
+    за одну транзакцию.
+    transaction по умолчанию ничего не делает, хранилища с транзакциями
+    переопределяют его.
+    Наследники сообщают подписчикам (subscribe) о каждой добавленной,
+    изменённой и удалённой записи методом _notify.
     """
 
     @abstractmethod
@@ -51,6 +86,27 @@ class AbstractRepository(ABC, Generic[T]):
         если условие не задано (по умолчанию), вернуть все записи
         """
 
+    def count(self, where: dict[str, Any] | None = None) -> int:
+        """
+        Количество записей по условию where (как в get_all)
+        """
+        return len(self.get_all(where))
+
+    def iter_all(self,
+                 where: dict[str, Any] | None = None,
+                 batch_size: int = 1000
+                 ) -> Iterator[T]:
+        """
+        Перебрать все записи по некоторому условию (как в get_all).
+        batch_size - сколько записей читать из хранилища за раз.
+        Реализация по умолчанию не читает записи частями: get_all не умеет
+        постраничную выборку, поэтому она получает список всех записей
+        и не использует batch_size. Репозитории, которые могут читать
+        частями (SQLiteRepository) или перебирать записи без копирования
+        (MemoryRepository), переопределяют этот метод
+        """
+        yield from self.get_all(where)
+
     @abstractmethod
     def update_by_pk(self, obj: T) -> None:
         """ Обновить данные об объекте. Объект должен содержать поле pk. """
@@ -58,3 +114,125 @@ class AbstractRepository(ABC, Generic[T]):
     @abstractmethod
     def delete_by_pk(self, pk: int) -> None:
         """ Удалить запись """
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Добавить несколько объектов, вернуть список их id.
+        id также записываются в атрибут pk каждого объекта.
+        """
+        return [self.add(obj) for obj in objs]
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """ Обновить данные о нескольких объектах. Объекты должны содержать поле pk. """
+        for obj in objs:
+            self.update_by_pk(obj)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """ Удалить несколько записей """
+        for pk in pks:
+            self.delete_by_pk(pk)
+
+    def update_field(self,
+                     field: str,
+                     old_values: Iterable[Any],
+                     new_value: Any,
+                     where: dict[str, Any] | None = None) -> int:
+        """
+        Присвоить полю field значение new_value во всех записях, где оно
+        равно одному из old_values, например перенести расходы из одних
+        категорий в другую. where - дополнительное условие (как в get_all),
+        чтобы изменить только часть записей. Вернуть число изменённых записей
+        """
+        old_values = set(old_values)
+        objs = [obj for obj in self.get_all(where)
+                if getattr(obj, field) in old_values]
+        for obj in objs:
+            setattr(obj, field, new_value)
+        self.update_many(objs)
+        return len(objs)
+
+    def reassign_category(self,
+                          old_pks: Iterable[int],
+                          new_pk: int,
+                          where: dict[str, Any] | None = None) -> int:
+        """
+        Перенести записи из категорий old_pks в категорию new_pk:
+        update_field для поля category. Вернуть число перенесённых записей
+        """
+        return self.update_field('category', old_pks, new_pk, where)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Выполнить несколько операций с репозиторием как одну транзакцию:
+        with repo.transaction(): ...
+        По умолчанию операции выполняются сразу и не откатываются при ошибке
+        """
+        yield
+
+    @property
+    def _subscribers(self) -> list[Subscriber]:
+        """ Подписчики на изменения, список создаётся при первом обращении """
+        subscribers: list[Subscriber] = vars(self).setdefault('_subscriber_list', [])
+        return subscribers
+
+    def subscribe(self, callback: Subscriber) -> None:
+        """
+        Подписать callback на изменения: после каждого добавления, изменения
+        и удаления записи он вызывается с RepositoryEvent.
+        События пакетных операций приходят по одному на запись.
+        Событие приходит сразу после изменения, даже если оно выполнено
+        внутри транзакции, которая потом будет отменена
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Subscriber) -> None:
+        """ Отписать callback от изменений """
+        self._subscribers.remove(callback)
+
+    def _notify(self,
+                kind: EventKind,
+                pk: int,
+                old: T | None = None,
+                new: T | None = None) -> None:
+        """ Сообщить подписчикам об изменении записи pk """
+        for callback in list(self._subscribers):
+            callback(RepositoryEvent(kind, pk, old, new))
+
+
+class RepositoryWrapper(AbstractRepository[T]):  # pylint: disable=abstract-method
+    """
+    Обёртка над репозиторием repo. Атрибуты и методы, которых нет
+    у обёртки, берутся у repo, перед вызовом такого метода вызывается
+    _before_delegate. count и iter_all после _before_delegate передаются
+    repo, а не перебирают get_all
+    """
+    repo: AbstractRepository[T]
+
+    def _before_delegate(self) -> None:
+        """ Подготовить обёртку к вызову метода repo """
+
+    def __getattr__(self, name: str) -> Any:
+        if name == 'repo':
+            raise AttributeError(name)
+        attr = getattr(self.repo, name)
+        if not callable(attr):
+            return attr
+
+        @wraps(attr)
+        def call(*args: Any, **kwargs: Any) -> Any:
+            self._before_delegate()
+            return attr(*args, **kwargs)
+
+        return call
+
+    def count(self, where: dict[str, Any] | None = None) -> int:
+        self._before_delegate()
+        return self.repo.count(where)
+
+    def iter_all(self,
+                 where: dict[str, Any] | None = None,
+                 batch_size: int = 1000
+                 ) -> Iterator[T]:
+        self._before_delegate()
+        return self.repo.iter_all(where, batch_size)
@@ -0,0 +1,103 @@
+"""
+Модуль описывает асинхронный фасад над репозиторием
+
+Запросы выполняются в рабочем потоке, а результаты передаются вызывающему
+функцией dispatch, например в поток GUI сигналом Qt (см. view.Dispatcher).
+SQLiteRepository можно использовать из рабочего потока: пул соединений
+открывает для него отдельное соединение.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from types import TracebackType
+from typing import Any, Callable, Generic
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+
+
+def _call(func: Callable[[], None]) -> None:
+    func()
+
+
+class AsyncRepository(Generic[T]):
+    """
+    Асинхронный фасад над репозиторием: методы repo выполняются по очереди
+    в одном рабочем потоке, поэтому запрос видит все изменения, отправленные
+    до него.
+    Входные параметры:
+        repo - репозиторий, методы которого вызываются в рабочем потоке
+        dispatch - функция, которой передаётся функция без аргументов,
+                   вызывающая on_result или on_error. dispatch должна
+                   вызвать её в нужном потоке. По умолчанию она вызывается
+                   сразу в рабочем потоке
+    Обёртки CachedRepository и BufferedRepository, а также подписчики
+    на изменения repo не рассчитаны на работу из нескольких потоков,
+    поэтому repo - это сам репозиторий, а не обёртка над ним.
+    """
+
+    def __init__(self,
+                 repo: AbstractRepository[T],
+                 dispatch: Callable[[Callable[[], None]], None] = _call) -> None:
+        self.repo = repo
+        self.dispatch = dispatch
+        self._executor = ThreadPoolExecutor(max_workers=1,
+                                            thread_name_prefix='repository')
+
+    def submit(self,
+               method: str,
+               *args: Any,
+               on_result: Callable[[Any], None] | None = None,
+               on_error: Callable[[BaseException], None] | None = None,
+               **kwargs: Any) -> 'Future[Any]':
+        """
+        Выполнить repo.method(*args, **kwargs) в рабочем потоке.
+        После выполнения через dispatch вызывается on_result(результат)
+        или on_error(исключение). Результат или исключение можно получить
+        и из возвращаемого Future
+        """
+        return self.run(getattr(self.repo, method), *args,
+                        on_result=on_result, on_error=on_error, **kwargs)
+
+    def run(self,
+            func: Callable[..., Any],
+            *args: Any,
+            on_result: Callable[[Any], None] | None = None,
+            on_error: Callable[[BaseException], None] | None = None,
+            **kwargs: Any) -> 'Future[Any]':
+        """
+        Выполнить func(*args, **kwargs) в рабочем потоке в общей очереди
+        с методами repo, как submit. Так выполняются операции над несколькими
+        репозиториями, например над repo и другим репозиторием с тем же пулом
+        """
+        return self._executor.submit(self._run, partial(func, *args, **kwargs),
+                                     on_result, on_error)
+
+    def _run(self,
+             func: Callable[[], Any],
+             on_result: Callable[[Any], None] | None,
+             on_error: Callable[[BaseException], None] | None) -> Any:
+        """ Выполнить запрос в рабочем потоке и передать результат через dispatch """
+        try:
+            result = func()
+        except BaseException as error:
+            if on_error is not None:
+                self.dispatch(partial(on_error, error))
+            raise
+        if on_result is not None:
+            self.dispatch(partial(on_result, result))
+        return result
+
+    def close(self) -> None:
+        """
+        Дождаться выполняемого запроса и отменить остальные.
+        Сам repo не закрывается
+        """
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> 'AsyncRepository[T]':
+        return self
+
+    def __exit__(self,
+                 exc_type: type[BaseException] | None,
+                 exc_val: BaseException | None,
+                 exc_tb: TracebackType | None) -> None:
+        self.close()
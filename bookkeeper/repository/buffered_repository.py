@@ -0,0 +1,368 @@
+"""
+Модуль описывает репозиторий-обёртку с отложенной записью
+
+Добавления, изменения и удаления накапливаются в памяти и записываются
+в репозиторий одной транзакцией, когда их становится много, когда
+с первой незаписанной операции прошло заданное время, или при закрытии.
+Пока операции не записаны, они будут потеряны при аварийном завершении,
+поэтому max_delay задаёт окно, в котором данные могут быть потеряны.
+Запись может выполняться в рабочем потоке AsyncRepository, тогда flush
+не ждёт её окончания.
+"""
+# pylint: disable=too-many-instance-attributes
+
+import time
+from concurrent.futures import Future
+from types import TracebackType
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, EventKind, T
+from bookkeeper.repository.abstract_repository import RepositoryEvent, Subscriber
+from bookkeeper.repository.abstract_repository import RepositoryWrapper
+from bookkeeper.repository.async_repository import AsyncRepository
+
+
+class BufferedRepository(RepositoryWrapper[T]):
+    """
+    Обёртка над репозиторием с отложенной записью.
+    Входные параметры:
+        repo - репозиторий, в который записываются операции
+        max_pending - при таком числе незаписанных операций они записываются сразу
+        max_delay - через сколько секунд после первой незаписанной операции
+                    их нужно записать (проверяется при каждой операции
+                    и в flush_if_due, который можно вызывать по таймеру)
+        on_flush - функция, вызываемая после записи с словарём
+                   {временный pk: pk в репозитории} добавленных объектов
+        clock - источник времени (для тестов)
+        writer - AsyncRepository над тем же repo: если задан, flush записывает
+                 операции в его рабочем потоке. on_flush вызывается через его
+                 dispatch, поэтому dispatch должна вызывать функции в потоке,
+                 где используется обёртка
+        on_error - функция, вызываемая с исключением, если запись в рабочем
+                   потоке не удалась (операции остаются незаписанными)
+    Атрибуты:
+        pk_map - временные pk всех записанных объектов и их pk в репозитории
+
+    Добавленный объект сразу получает временный отрицательный pk, при записи
+    он заменяется на pk из repo. Методы обёртки принимают и временные pk.
+    get_by_pk и get_all(where) учитывают незаписанные операции, остальные
+    методы (в том числе count и iter_all) и атрибуты берутся у repo,
+    перед вызовом метода операции записываются. Ошибки repo (например,
+    удаление несуществующей записи) возникают только при записи.
+    Подписчики обёртки получают события сразу при выполнении операции,
+    а не при записи (внутри transaction - после её завершения), а также
+    события repo, вызванные не записью операций. На события repo обёртка
+    подписывается, только пока у неё самой есть подписчики.
+    Пока операции записываются в рабочем потоке, методы обёртки, кроме add
+    и flush_if_due, ждут окончания записи, а методы repo вызываются
+    с записью в текущем потоке: обёртка не видит операций, которые
+    записываются, и не рассчитана на работу из нескольких потоков.
+    """
+
+    def __init__(self,
+                 repo: AbstractRepository[T],
+                 max_pending: int = 100,
+                 max_delay: float = 5.0,
+                 on_flush: Callable[[dict[int, int]], None] | None = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 writer: AsyncRepository[T] | None = None,
+                 on_error: Callable[[BaseException], None] | None = None) -> None:
+        if max_pending <= 0:
+            raise ValueError("max_pending must be positive")
+        self.repo = repo
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self.on_flush = on_flush
+        self._clock = clock
+        self.writer = writer
+        self.on_error = on_error
+        self.pk_map: dict[int, int] = {}
+        self._added: dict[int, T] = {}
+        self._updated: dict[int, T] = {}
+        self._deleted: set[int] = set()
+        self._next_pk = -1
+        self._first_pending: float | None = None
+        self._deferred: list[tuple[EventKind, int, T | None, T | None]] | None = None
+        self._writing: Future[list[int]] | None = None
+        self._written: tuple[list[tuple[int, T]], set[int], dict[int, T]] = [], set(), {}
+
+    def _before_delegate(self) -> None:
+        self._flush(wait=True)
+
+    def _forward(self, event: RepositoryEvent[T]) -> None:
+        """ Передать подписчикам событие repo (на время записи обёртка отписана) """
+        self._notify(event.kind, event.pk, event.old, event.new)
+
+    def subscribe(self, callback: Subscriber) -> None:
+        self._wait()
+        if not self._subscribers:
+            self.repo.subscribe(self._forward)
+        super().subscribe(callback)
+
+    def unsubscribe(self, callback: Subscriber) -> None:
+        self._wait()
+        super().unsubscribe(callback)
+        if not self._subscribers:
+            self.repo.unsubscribe(self._forward)
+
+    def _notify(self,
+                kind: EventKind,
+                pk: int,
+                old: T | None = None,
+                new: T | None = None) -> None:
+        """ Сообщить подписчикам об изменении, внутри transaction - отложить """
+        if self._deferred is not None:
+            self._deferred.append((kind, pk, old, new))
+        else:
+            super()._notify(kind, pk, old, new)
+
+    @property
+    def pending(self) -> int:
+        """ Число незаписанных операций """
+        return len(self._added) + len(self._updated) + len(self._deleted)
+
+    def _resolve(self, pk: int) -> int:
+        """ pk в repo для временного pk уже записанного объекта """
+        return self.pk_map.get(pk, pk)
+
+    def _queued(self) -> None:
+        """ Учесть новую операцию и записать операции, если пора """
+        if self._first_pending is None:
+            self._first_pending = self._clock()
+        if self.pending >= self.max_pending:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self) -> bool:
+        """
+        Записать операции, если с первой из них прошло max_delay секунд.
+        Вернуть True, если операции были записаны
+        """
+        if self._first_pending is None \
+                or self._clock() - self._first_pending < self.max_delay:
+            return False
+        self.flush()
+        return True
+
+    def flush(self) -> None:
+        """
+        Записать все незаписанные операции одной транзакцией repo:
+        удаления, изменения, затем добавления в порядке их выполнения.
+        С writer операции записываются в его рабочем потоке, и flush
+        ждёт только окончания предыдущей записи.
+        При ошибке операции остаются незаписанными
+        """
+        self._flush(wait=self.writer is None)
+
+    def _flush(self, wait: bool) -> None:
+        """ Записать операции, в рабочем потоке writer - если не нужно ждать записи """
+        self._wait()
+        if not self.pending:
+            self._first_pending = None
+            return
+        added = list(self._added.items())
+        self._written = added, set(self._deleted), dict(self._updated)
+        self._added.clear()
+        self._updated.clear()
+        self._deleted.clear()
+        self._first_pending = None
+        objs = [obj for _, obj in added]
+        if wait or self.writer is None:
+            future: Future[list[int]] = Future()
+            try:
+                future.set_result(self._write(objs, *self._written[1:]))
+            except BaseException as error:  # pylint: disable=broad-exception-caught
+                future.set_exception(error)
+            self._writing = future
+            self._wait()
+        else:
+            self._writing = self.writer.run(self._write, objs, *self._written[1:],
+                                            on_result=self._done, on_error=self._done)
+
+    def _write(self,
+               objs: list[T],
+               deleted: set[int],
+               updated: dict[int, T]) -> list[int]:
+        """ Записать операции в repo, вернуть pk добавленных объектов """
+        # события записи подписчики уже получили при выполнении операций,
+        # а без подписчиков repo не читает прежние версии строк
+        attached = bool(self._subscribers)
+        if attached:
+            self.repo.unsubscribe(self._forward)
+        try:
+            with self.repo.transaction():
+                if deleted:
+                    self.repo.delete_many(deleted)
+                if updated:
+                    self.repo.update_many(updated.values())
+                for obj in objs:
+                    obj.pk = 0
+                return self.repo.add_many(objs) if objs else []
+        finally:
+            if attached:
+                self.repo.subscribe(self._forward)
+
+    def _done(self, _: Any) -> None:
+        """ Вызывается через dispatch writer, когда запись в рабочем потоке окончена """
+        if self._writing is not None and self._writing.done():
+            try:
+                self._wait()
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                if self.on_error is not None:
+                    self.on_error(error)
+
+    def _wait(self) -> None:
+        """
+        Дождаться окончания записи и учесть её результат: заменить временные pk
+        или при ошибке вернуть операции в незаписанные и передать исключение
+        """
+        if self._writing is None:
+            return
+        writing, self._writing = self._writing, None
+        added, deleted, updated = self._written
+        self._written = [], set(), {}
+        error = writing.exception()
+        if error is not None:
+            for pk, obj in added:
+                obj.pk = pk
+            self._added = dict(added) | self._added
+            self._deleted |= deleted
+            self._updated = updated | self._updated
+            if self._first_pending is None:
+                self._first_pending = self._clock()
+            raise error
+        new_pks = {pk: new_pk for (pk, _), new_pk in zip(added, writing.result())}
+        self.pk_map.update(new_pks)
+        if self.on_flush is not None:
+            self.on_flush(new_pks)
+
+    def close(self) -> None:
+        """ Записать незаписанные операции. Сам repo не закрывается """
+        self._flush(wait=True)
+
+    def __enter__(self) -> 'BufferedRepository[T]':
+        return self
+
+    def __exit__(self,
+                 exc_type: type[BaseException] | None,
+                 exc_val: BaseException | None,
+                 exc_tb: TracebackType | None) -> None:
+        self.close()
+
+    def add(self, obj: T) -> int:
+        pk = self._next_pk
+        self._next_pk -= 1
+        obj.pk = pk
+        self._added[pk] = obj
+        self._notify('added', pk, new=obj)
+        self._queued()
+        return pk
+
+    def get_by_pk(self, pk: int) -> T | None:
+        self._wait()
+        pk = self._resolve(pk)
+        if pk in self._deleted:
+            return None
+        if pk in self._updated:
+            return self._updated[pk]
+        if pk < 0:
+            return self._added.get(pk)
+        return self.repo.get_by_pk(pk)
+
+    def get_all(self, where: dict[str, Any] | None = None, **kwargs: Any) -> list[T]:
+        """
+        Получить записи по условию where с учётом незаписанных операций:
+        записи из repo в порядке pk, затем добавленные в порядке добавления.
+        Дополнительные аргументы (сортировка, постраничная выборка)
+        передаются repo.get_all после записи операций
+        """
+        self._wait()
+        if kwargs:
+            self._flush(wait=True)
+            return self.repo.get_all(where, **kwargs)
+
+        def matches(obj: T) -> bool:
+            return all(getattr(obj, attr) == value
+                       for attr, value in (where or {}).items())
+
+        rows = {obj.pk: obj for obj in self.repo.get_all(where)
+                if obj.pk not in self._deleted and obj.pk not in self._updated}
+        rows.update((pk, obj) for pk, obj in self._updated.items() if matches(obj))
+        result = [rows[pk] for pk in sorted(rows)]
+        return result + [obj for obj in self._added.values() if matches(obj)]
+
+    def update_by_pk(self, obj: T) -> None:
+        self._wait()
+        obj.pk = self._resolve(obj.pk)
+        if obj.pk == 0:
+            raise ValueError('attempt to update object with unknown primary key')
+        if obj.pk in self._deleted:
+            raise KeyError(obj.pk)
+        old = self.get_by_pk(obj.pk) if self._subscribers else None
+        if obj.pk < 0:
+            if obj.pk not in self._added:
+                raise KeyError(obj.pk)
+            self._added[obj.pk] = obj
+        else:
+            self._updated[obj.pk] = obj
+        self._notify('updated', obj.pk, old, obj)
+        self._queued()
+
+    def delete_by_pk(self, pk: int) -> None:
+        self._wait()
+        pk = self._resolve(pk)
+        old = self.get_by_pk(pk) if self._subscribers else None
+        if pk < 0:
+            self._added.pop(pk)
+        else:
+            self._updated.pop(pk, None)
+            self._deleted.add(pk)
+        self._notify('deleted', pk, old)
+        self._queued()
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        for obj in objs:
+            self.update_by_pk(obj)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        for pk in pks:
+            self.delete_by_pk(pk)
+
+    def update_field(self,
+                     field: str,
+                     old_values: Iterable[Any],
+                     new_value: Any,
+                     where: dict[str, Any] | None = None) -> int:
+        self._flush(wait=True)
+        return self.repo.update_field(field, old_values, new_value, where)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Транзакция repo, операции внутри неё записываются при выходе
+        в той же транзакции. При ошибке они отменяются.
+        События операций внутри транзакции приходят после её завершения,
+        при ошибке не приходят
+        """
+        self._flush(wait=True)
+        outer = self._deferred is None
+        if outer:
+            self._deferred = []
+        try:
+            with self.repo.transaction():
+                yield
+                self._flush(wait=True)
+        except BaseException:
+            self._added.clear()
+            self._updated.clear()
+            self._deleted.clear()
+            self._first_pending = None
+            if outer:
+                self._deferred = None
+            raise
+        if outer:
+            events, self._deferred = self._deferred or [], None
+            for event in events:
+                self._notify(*event)
@@ -0,0 +1,172 @@
+"""
+Модуль описывает репозиторий-обёртку с кэшем чтения
+
+Кэш видит изменения, сделанные через обёртку или через сам репозиторий
+(по его событиям, см. AbstractRepository.subscribe). Если данные меняются
+в обход них (другим репозиторием или процессом), кэш нужно сбросить (clear).
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.abstract_repository import RepositoryEvent, Subscriber
+from bookkeeper.repository.abstract_repository import RepositoryWrapper
+
+
+class CachedRepository(RepositoryWrapper[T]):
+    """
+    Обёртка над репозиторием, которая отдаёт результаты get_by_pk и get_all
+    из LRU-кэша, ключ которого - pk или аргументы запроса.
+    Входные параметры:
+        repo - репозиторий, к которому обращается обёртка
+        maxsize - максимальное число записей в кэше
+    Атрибуты:
+        hits, misses - число попаданий и промахов кэша
+    Изменения через обёртку сбрасывают затронутые записи кэша и все
+    закэшированные запросы. Объекты из кэша разделяются между вызовами,
+    изменять их можно только вместе с update_by_pk.
+    Остальные атрибуты и методы берутся у repo, вызов такого метода
+    сбрасывает весь кэш, так как он может изменить данные.
+    count кэшируется как запрос, iter_all читает repo без кэша.
+    Подписка на изменения (subscribe) передаётся repo.
+    """
+
+    def __init__(self, repo: AbstractRepository[T], maxsize: int = 128) -> None:
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.repo = repo
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[tuple[Any, ...], Any] = OrderedDict()
+        repo.subscribe(self._changed)
+
+    def _before_delegate(self) -> None:
+        self.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def clear(self) -> None:
+        """ Сбросить кэш """
+        self._cache.clear()
+
+    def _lookup(self, key: tuple[Any, ...], load: Callable[[], Any]) -> Any:
+        """
+        Получить значение по ключу из кэша или загрузить его функцией load
+        """
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        self.misses += 1
+        value = load()
+        self._cache[key] = value
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return value
+
+    def _invalidate(self, pks: Iterable[int] = ()) -> None:
+        """ Сбросить записи с pk из pks и все закэшированные запросы """
+        for pk in pks:
+            self._cache.pop(('pk', pk), None)
+        for key in [key for key in self._cache if key[0] == 'query']:
+            del self._cache[key]
+
+    def _changed(self, event: RepositoryEvent[T]) -> None:
+        """ Сбросить записи кэша, затронутые изменением в repo """
+        if event.kind == 'reset':
+            self.clear()
+        else:
+            self._invalidate([event.pk])
+
+    def subscribe(self, callback: Subscriber) -> None:
+        self.repo.subscribe(callback)
+
+    def unsubscribe(self, callback: Subscriber) -> None:
+        self.repo.unsubscribe(callback)
+
+    def get_by_pk(self, pk: int) -> T | None:
+        result: T | None = self._lookup(('pk', pk), lambda: self.repo.get_by_pk(pk))
+        return result
+
+    def get_all(self, where: dict[str, Any] | None = None, **kwargs: Any) -> list[T]:
+        """
+        Получить записи по условию where, дополнительные аргументы (сортировка,
+        постраничная выборка) передаются repo.get_all и входят в ключ кэша.
+        Запросы с нехэшируемыми значениями не кэшируются
+        """
+        key = ('query', tuple((where or {}).items()), tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            self.misses += 1
+            return self.repo.get_all(where, **kwargs)
+        return list(self._lookup(key, lambda: self.repo.get_all(where, **kwargs)))
+
+    def count(self, where: dict[str, Any] | None = None) -> int:
+        key = ('query', 'count', tuple((where or {}).items()))
+        try:
+            hash(key)
+        except TypeError:
+            self.misses += 1
+            return self.repo.count(where)
+        result: int = self._lookup(key, lambda: self.repo.count(where))
+        return result
+
+    def iter_all(self,
+                 where: dict[str, Any] | None = None,
+                 batch_size: int = 1000
+                 ) -> Iterator[T]:
+        return self.repo.iter_all(where, batch_size)
+
+    def add(self, obj: T) -> int:
+        pk = self.repo.add(obj)
+        self._invalidate([pk])
+        return pk
+
+    def update_by_pk(self, obj: T) -> None:
+        self._invalidate([obj.pk])
+        self.repo.update_by_pk(obj)
+
+    def delete_by_pk(self, pk: int) -> None:
+        self._invalidate([pk])
+        self.repo.delete_by_pk(pk)
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        pks = self.repo.add_many(objs)
+        self._invalidate(pks)
+        return pks
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        self._invalidate(obj.pk for obj in objs)
+        self.repo.update_many(objs)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(pks)
+        self._invalidate(pks)
+        self.repo.delete_many(pks)
+
+    def update_field(self,
+                     field: str,
+                     old_values: Iterable[Any],
+                     new_value: Any,
+                     where: dict[str, Any] | None = None) -> int:
+        self.clear()
+        return self.repo.update_field(field, old_values, new_value, where)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Транзакция repo. Если она откатывается, кэш сбрасывается,
+        так как мог запомнить неподтверждённые данные
+        """
+        try:
+            with self.repo.transaction():
+                yield
+        except BaseException:
+            self.clear()
+            raise
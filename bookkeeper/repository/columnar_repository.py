@@ -0,0 +1,357 @@
+"""
+Модуль описывает репозиторий расходов в оперативной памяти,
+хранящий расходы по столбцам
+
+Каждое поле расхода хранится в своём массиве array: даты - числом микросекунд
+от 1970-01-01 (int64), категории - int32, суммы - float64 или, в режиме
+копеек, int64 (см. money), комментарии -
+номером строки в общем списке строк. Расход занимает около 41 байта вместо
+примерно 270 у объекта Expense с датами в MemoryRepository (в 6-7 раз
+меньше; сильнее сжать можно только ценой точности дат или отказа от pk),
+а суммы за период и по категориям считаются одним проходом по массивам.
+Если установлен numpy (он не обязателен, но нужен тестам), суммы
+считаются векторно.
+"""
+# pylint: disable=too-many-instance-attributes
+
+import importlib
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from operator import attrgetter
+from typing import Any, Iterable, Iterator
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+
+try:
+    numpy: Any = importlib.import_module('numpy')
+except ImportError:
+    numpy = None  # pylint: disable=invalid-name
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _encode_date(value: datetime) -> int:
+    """ Дата как число микросекунд от _EPOCH """
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def _decode_date(value: int) -> datetime:
+    return _EPOCH + value * _MICROSECOND
+
+
+class ColumnarExpenseRepository(AbstractRepository[Expense]):
+    """
+    Репозиторий расходов (Expense), хранящий их по столбцам.
+    Входные параметры:
+        cents - суммы расходов - целые числа копеек, они хранятся
+                и складываются как целые числа
+    get_by_pk и get_all каждый раз создают новые объекты Expense, поэтому
+    изменения полученного объекта сохраняются только через update_by_pk.
+    Записи хранятся в порядке pk, запись по pk ищется двоичным поиском.
+    Удалённые записи только помечаются и вычищаются, когда их становится
+    больше половины.
+    Атрибуты:
+        nbytes - сколько байт занимают массивы столбцов
+    """
+
+    def __init__(self, cents: bool = False) -> None:
+        self._pks = array('q')
+        self._expense_dates = array('q')
+        self._added_dates = array('q')
+        self._categories = array('i')
+        self._amounts: 'array[Any]' = array('q' if cents else 'd')
+        self._comments = array('i')
+        self._alive = bytearray()
+        self._dead = 0
+        self._last_pk = 0
+        self._strings: list[str] = []
+        self._string_ids: dict[str, int] = {}
+
+    @property
+    def nbytes(self) -> int:
+        """ Размер массивов столбцов в байтах (без списка строк) """
+        columns = (self._pks, self._expense_dates, self._added_dates,
+                   self._categories, self._amounts, self._comments)
+        return sum(column.itemsize * len(column) for column in columns) \
+            + len(self._alive)
+
+    def _string_id(self, value: str) -> int:
+        """ Номер строки в общем списке строк, строка добавляется при необходимости """
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self._strings)
+            self._strings.append(value)
+        return string_id
+
+    def _slot(self, pk: int) -> int | None:
+        """ Номер записи pk в массивах или None, если записи нет """
+        slot = bisect_left(self._pks, pk)
+        if slot < len(self._pks) and self._pks[slot] == pk and self._alive[slot]:
+            return slot
+        return None
+
+    def _row(self, slot: int) -> Expense:
+        return Expense(amount=self._amounts[slot],
+                       category=self._categories[slot],
+                       expense_date=_decode_date(self._expense_dates[slot]),
+                       added_date=_decode_date(self._added_dates[slot]),
+                       comment=self._strings[self._comments[slot]],
+                       pk=self._pks[slot])
+
+    def _column(self, name: str) -> 'array[Any]':
+        """ Массив поля name """
+        columns: dict[str, 'array[Any]'] = {
+            'pk': self._pks, 'expense_date': self._expense_dates,
+            'added_date': self._added_dates, 'category': self._categories,
+            'amount': self._amounts, 'comment': self._comments}
+        if name not in columns:
+            raise ValueError(f"unknown field {name}")
+        return columns[name]
+
+    def _stored(self, name: str, value: Any) -> Any:
+        """
+        Значение value поля name в том виде, в котором оно хранится
+        (комментарий - строкой, номер ей выделяет _string_id).
+        Если значение не подходит полю - TypeError или OverflowError
+        """
+        if name in ('expense_date', 'added_date'):
+            if not isinstance(value, datetime):
+                raise TypeError(f"{name} must be datetime, not {type(value).__name__}")
+            return _encode_date(value)
+        if name == 'comment':
+            if not isinstance(value, str):
+                raise TypeError(f"comment must be str, not {type(value).__name__}")
+            return value
+        return array(self._column(name).typecode, [value])[0]
+
+    def _stored_row(self, obj: Expense) -> tuple[Any, ...]:
+        """ Хранимые значения полей obj (см. _stored) в порядке _write """
+        return tuple(self._stored(name, getattr(obj, name)) for name in
+                     ('amount', 'category', 'expense_date', 'added_date', 'comment'))
+
+    def _write(self, slot: int, values: tuple[Any, ...]) -> None:
+        """ Записать в запись slot значения, уже проверенные _stored_row """
+        amount, category, expense_date, added_date, comment = values
+        self._amounts[slot], self._categories[slot] = amount, category
+        self._expense_dates[slot], self._added_dates[slot] = expense_date, added_date
+        self._comments[slot] = self._string_id(comment)
+
+    def _encoded(self, name: str, value: Any) -> tuple['array[Any]', Any]:
+        """
+        Массив поля name и значение value в том виде, в котором оно хранится.
+        Вместо значения None, если такое значение не может храниться в поле
+        """
+        column = self._column(name)
+        if name == 'comment':
+            return column, self._string_ids.get(value)
+        try:
+            return column, self._stored(name, value)
+        except (TypeError, OverflowError):
+            return column, None
+
+    def _matching(self, where: dict[str, Any] | None = None) -> list[int]:
+        """ Номера записей, подходящих под условие where """
+        slots = [slot for slot, alive in enumerate(self._alive) if alive]
+        for name, value in (where or {}).items():
+            column, encoded = self._encoded(name, value)
+            if encoded is None:
+                return []
+            slots = [slot for slot in slots if column[slot] == encoded]
+        return slots
+
+    def _compact(self) -> None:
+        """ Вычистить удалённые записи из массивов """
+        alive = [slot for slot, flag in enumerate(self._alive) if flag]
+        for name in ('_pks', '_expense_dates', '_added_dates', '_categories',
+                     '_amounts', '_comments'):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, (column[slot] for slot in alive)))
+        self._alive = bytearray(b'\x01') * len(alive)
+        self._dead = 0
+
+    def add(self, obj: Expense) -> int:
+        if getattr(obj, 'pk', None) != 0:
+            raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        values = self._stored_row(obj)
+        for column in (self._expense_dates, self._added_dates, self._categories,
+                       self._amounts, self._comments):
+            column.append(0)
+        self._write(len(self._pks), values)
+        self._last_pk += 1
+        obj.pk = self._last_pk
+        self._pks.append(obj.pk)
+        self._alive.append(1)
+        self._notify('added', obj.pk, new=obj)
+        return obj.pk
+
+    def get_by_pk(self, pk: int) -> Expense | None:
+        slot = self._slot(pk)
+        return None if slot is None else self._row(slot)
+
+    def get_all(self,
+                where: dict[str, Any] | None = None,
+                order_by: tuple[str, ...] = (),
+                desc: bool = False,
+                limit: int | None = None,
+                offset: int = 0
+                ) -> list[Expense]:
+        """
+        Получить записи по условию where (в порядке pk).
+        order_by - поля сортировки, desc - сортировать по убыванию,
+        limit и offset - ограничить выборку limit записями, пропустив первые offset
+        """
+        slots = self._matching(where)
+        if not order_by:
+            slots = slots[offset:None if limit is None else offset + limit]
+        result = [self._row(slot) for slot in slots]
+        if order_by:
+            result.sort(key=attrgetter(*order_by), reverse=desc)
+            result = result[offset:None if limit is None else offset + limit]
+        return result
+
+    def count(self, where: dict[str, Any] | None = None) -> int:
+        if where is None:
+            return len(self._alive) - self._dead
+        return len(self._matching(where))
+
+    def iter_all(self,
+                 where: dict[str, Any] | None = None,
+                 batch_size: int = 1000
+                 ) -> Iterator[Expense]:
+        """
+        Перебрать записи, создавая объекты по одному.
+        Изменять репозиторий во время перебора нельзя.
+        batch_size не используется: данные уже находятся в памяти
+        """
+        for slot in self._matching(where):
+            yield self._row(slot)
+
+    def update_by_pk(self, obj: Expense) -> None:
+        if obj.pk == 0:
+            raise ValueError('attempt to update object with unknown primary key')
+        slot = self._slot(obj.pk)
+        if slot is None:
+            raise KeyError(obj.pk)
+        values = self._stored_row(obj)
+        old = self._row(slot) if self._subscribers else None
+        self._write(slot, values)
+        self._notify('updated', obj.pk, old, obj)
+
+    def update_many(self, objs: Iterable[Expense]) -> None:
+        """
+        Изменить несколько записей. Все записи и значения проверяются
+        до изменения массивов: при ошибке ни одна запись не меняется
+        """
+        objs = list(objs)
+        rows = []
+        for obj in objs:
+            if obj.pk == 0:
+                raise ValueError('attempt to update object with unknown primary key')
+            slot = self._slot(obj.pk)
+            if slot is None:
+                raise KeyError(obj.pk)
+            rows.append((slot, self._stored_row(obj)))
+        for obj, (slot, values) in zip(objs, rows):
+            old = self._row(slot) if self._subscribers else None
+            self._write(slot, values)
+            self._notify('updated', obj.pk, old, obj)
+
+    def delete_by_pk(self, pk: int) -> None:
+        slot = self._slot(pk)
+        if slot is None:
+            raise KeyError(pk)
+        old = self._row(slot) if self._subscribers else None
+        self._alive[slot] = 0
+        self._dead += 1
+        if self._dead * 2 > len(self._alive):
+            self._compact()
+        self._notify('deleted', pk, old=old)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(dict.fromkeys(pks))
+        for pk in pks:
+            if self._slot(pk) is None:
+                raise KeyError(pk)
+        for pk in pks:
+            self.delete_by_pk(pk)
+
+    def update_field(self,
+                     field: str,
+                     old_values: Iterable[Any],
+                     new_value: Any,
+                     where: dict[str, Any] | None = None) -> int:
+        """
+        Присвоить полю field значение new_value во всех записях, где оно
+        равно одному из old_values, одним проходом по массиву поля.
+        new_value проверяется до изменения массива: если оно не подходит
+        полю - TypeError или OverflowError, и ни одна запись не меняется
+        """
+        if field == 'pk':
+            raise ValueError("pk can not be updated")
+        column = self._column(field)
+        stored = self._stored(field, new_value)
+        encoded = {self._encoded(field, value)[1] for value in old_values} - {None}
+        slots = [slot for slot in self._matching(where) if column[slot] in encoded]
+        if field == 'comment':
+            stored = self._string_id(stored)
+        for slot in slots:
+            old = self._row(slot) if self._subscribers else None
+            column[slot] = stored
+            if old is not None:
+                self._notify('updated', old.pk, old, self._row(slot))
+        return len(slots)
+
+    def _bounds(self, start: datetime | None, end: datetime | None) -> tuple[int, int]:
+        """ Период [start, end) в виде хранимых дат, None - без ограничения """
+        return (-2 ** 63 if start is None else _encode_date(start),
+                2 ** 63 - 1 if end is None else _encode_date(end))
+
+    def _mask(self, start: datetime | None, end: datetime | None) -> Any:
+        """ Маска numpy неудалённых записей с датой в периоде [start, end) """
+        low, high = self._bounds(start, end)
+        dates = numpy.frombuffer(self._expense_dates, dtype=numpy.int64)
+        return numpy.frombuffer(self._alive, dtype=numpy.bool_) \
+            & (dates >= low) & (dates < high)
+
+    def get_period_sum(self, start: datetime, end: datetime) -> float:
+        """
+        Получить сумму расходов, у которых дата расхода попадает в период [start, end)
+        """
+        if numpy is not None and self._alive:
+            amounts = numpy.frombuffer(self._amounts, dtype=self._amounts.typecode)
+            result: float = amounts[self._mask(start, end)].sum().item()
+            return result
+        low, high = self._bounds(start, end)
+        return sum(amount for alive, date, amount
+                   in zip(self._alive, self._expense_dates, self._amounts)
+                   if alive and low <= date < high)
+
+    def get_category_sums(self,
+                          start: datetime | None = None,
+                          end: datetime | None = None) -> dict[int, float]:
+        """
+        Получить суммы расходов за период [start, end) по категориям
+        (без подкатегорий): {pk категории: сумма} в порядке pk.
+        Категории без расходов за период не входят в результат
+        """
+        if numpy is not None and self._alive:
+            mask = self._mask(start, end)
+            categories = numpy.frombuffer(self._categories, dtype=numpy.intc)[mask]
+            amounts = numpy.frombuffer(self._amounts, dtype=self._amounts.typecode)[mask]
+            if amounts.dtype.kind == 'f':
+                totals = numpy.bincount(categories, weights=amounts)
+            else:
+                # bincount складывает в float64, целые суммы складываются точно
+                totals = numpy.zeros(categories.max(initial=-1) + 1, dtype=amounts.dtype)
+                numpy.add.at(totals, categories, amounts)
+            return {int(pk): totals[pk].item() for pk in numpy.unique(categories)}
+        low, high = self._bounds(start, end)
+        sums: dict[int, float] = {}
+        for alive, date, category, amount in zip(self._alive, self._expense_dates,
+                                                 self._categories, self._amounts):
+            if alive and low <= date < high:
+                sums[category] = sums.get(category, 0) + amount
+        return dict(sorted(sums.items()))
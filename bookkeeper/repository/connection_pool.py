@@ -0,0 +1,129 @@
+"""
+Модуль описывает пул соединений с файлом БД SQLite
+
+Соединение открывается один раз на поток и переиспользуется всеми
+репозиториями, которые работают с этим пулом. Один пул может разделяться
+несколькими репозиториями, указывающими на один и тот же файл.
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+from types import TracebackType
+from typing import Callable, Iterator
+
+
+class ConnectionPool:
+    """
+    Пул долгоживущих соединений с файлом БД: по одному соединению на поток.
+    Атрибуты:
+        db_file - путь к файлу БД
+        dispatch - функция, которой передаются функции after_commit потоков,
+                   кроме создавшего пул. dispatch должна вызвать их в нужном
+                   потоке, например события репозиториев, изменённых в рабочем
+                   потоке AsyncRepository, - в потоке GUI (см. view.Dispatcher).
+                   Если не задана, функции вызываются в том же потоке
+    Соединение создаётся при первом обращении из потока
+    и закрывается методом close (или при выходе из блока with).
+    """
+
+    def __init__(self,
+                 db_file: str,
+                 dispatch: Callable[[Callable[[], None]], None] | None = None) -> None:
+        self.db_file: str = db_file
+        self.dispatch = dispatch
+        self._owner = threading.get_ident()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: list[sqlite3.Connection] = []
+        self._closed = False
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Получить соединение текущего потока.
+        При первом обращении из потока соединение создаётся
+        """
+        if self._closed:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed pool")
+        con: sqlite3.Connection | None = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.db_file, check_same_thread=False)
+            con.execute('PRAGMA foreign_keys = ON')
+            self._local.con = con
+            self._local.depth = 0
+            self._local.after_commit = []
+            with self._lock:
+                self._connections.append(con)
+        return con
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Выполнить блок в одной транзакции.
+        Вложенные блоки входят во внешнюю транзакцию:
+        фиксация (или откат при исключении) выполняется только внешним блоком.
+        После фиксации вызываются функции, переданные в after_commit
+        (см. атрибут dispatch)
+        """
+        con = self.connection()
+        if self._local.depth == 0 and not con.in_transaction:
+            # явное начало транзакции: иначе sqlite3 не включает в неё DDL и PRAGMA
+            con.execute('BEGIN')
+        self._local.depth += 1
+        try:
+            yield con
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                self._local.after_commit = []
+                con.rollback()
+            raise
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            callbacks, self._local.after_commit = self._local.after_commit, []
+            con.commit()
+            for func in callbacks:
+                self._call(func)
+
+    def after_commit(self, func: Callable[[], None]) -> None:
+        """
+        Вызвать func после фиксации транзакции текущего потока
+        (сразу, если поток не выполняет транзакцию). Если транзакция
+        откатывается, func не вызывается
+        """
+        self.connection()
+        if self._local.depth == 0:
+            self._call(func)
+        else:
+            self._local.after_commit.append(func)
+
+    def _call(self, func: Callable[[], None]) -> None:
+        """ Вызвать функцию after_commit, из чужого потока - через dispatch """
+        if self.dispatch is not None and threading.get_ident() != self._owner:
+            self.dispatch(func)
+        else:
+            func()
+
+    def close(self) -> None:
+        """
+        Закрыть все соединения пула. Повторный вызов ничего не делает
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._closed = True
+        for con in connections:
+            con.close()
+        self._local = threading.local()
+
+    @property
+    def closed(self) -> bool:
+        """ Закрыт ли пул """
+        return self._closed
+
+    def __enter__(self) -> 'ConnectionPool':
+        return self
+
+    def __exit__(self,
+                 exc_type: type[BaseException] | None,
+                 exc_val: BaseException | None,
+                 exc_tb: TracebackType | None) -> None:
+        self.close()
@@ -2,42 +2,343 @@
 Модуль описывает репозиторий, работающий в оперативной памяти
 """
 
-from itertools import count
-from typing import Any
+import copy
+import gc
+import os
+import pickle
+import sys
+from dataclasses import fields, is_dataclass
+from operator import attrgetter
+from types import TracebackType
+from typing import Any, BinaryIO, Iterable, Iterator
 
-from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.abstract_repository import AbstractRepository, EventKind, T
+
+
+def _pack(objs: list[Any]) -> tuple[type | None, list[list[Any]]]:
+    """
+    Объекты для снимка. Объекты одного класса-dataclass сохраняются
+    по столбцам значений полей (класс, [значения поля для всех объектов]),
+    так снимок в несколько раз быстрее записывается и читается.
+    Остальные - целиком: (None, [объекты])
+    """
+    classes = set(map(type, objs))
+    cls = classes.pop() if len(classes) == 1 else None
+    if cls is None or not is_dataclass(cls):
+        return None, [objs]
+    params = fields(cls)
+    if any(not param.init or param.kw_only for param in params) \
+            or 'pk' not in {param.name for param in params}:
+        return None, [objs]
+    return cls, [[getattr(obj, param.name) for obj in objs] for param in params]
+
+
+def _unpack(cls: type | None, columns: list[list[Any]]) -> list[Any]:
+    """ Объекты из снимка, обратное к _pack """
+    if cls is None:
+        return columns[0]
+    return list(map(cls, *columns))
 
 
 class MemoryRepository(AbstractRepository[T]):
     """
     Репозиторий, работающий в оперативной памяти. Хранит данные в словаре.
+    Входные параметры:
+        indexed_fields - атрибуты, по которым строятся хэш-индексы
+                         (значение -> pk записей). get_all, iter_all и count
+                         с условием на равенство такого атрибута перебирают
+                         только подходящие записи, а не все.
+        journal - файл журнала: каждое изменение дописывается в него,
+                  restore применяет журнал к снимку (см. snapshot),
+                  None - без журнала
+    Индексы и журнал обновляются методами репозитория, поэтому
+    сохранённые объекты нужно изменять только через update_by_pk.
+    Снимок и журнал записываются pickle, загружать можно только свои файлы.
     """
 
-    def __init__(self) -> None:
+    def __init__(self,
+                 indexed_fields: Iterable[str] = (),
+                 journal: str | None = None) -> None:
         self._container: dict[int, T] = {}
-        self._counter = count(1)
+        self._last_pk = 0
+        self._indexes: dict[str, dict[Any, dict[int, None]]] = {
+            field: {} for field in indexed_fields}
+        # значения индексированных атрибутов, с которыми записи внесены в индексы:
+        # объект могут изменить до update_by_pk, и его атрибуты уже другие
+        self._indexed: dict[int, tuple[Any, ...]] = {}
+        self._journal: BinaryIO | None = None
+        if journal is not None:
+            self._journal = open(journal, 'ab')  # pylint: disable=consider-using-with
+
+    def close(self) -> None:
+        """ Закрыть файл журнала """
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def __enter__(self) -> 'MemoryRepository[T]':
+        return self
+
+    def __exit__(self,
+                 exc_type: type[BaseException] | None,
+                 exc_val: BaseException | None,
+                 exc_tb: TracebackType | None) -> None:
+        self.close()
+
+    def snapshot(self, path: str) -> None:
+        """
+        Сохранить записи и счётчик pk в файл path и очистить журнал.
+        Файл заменяется только после того, как снимок полностью записан
+        """
+        cls, columns = _pack(list(self._container.values()))
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as file:
+            pickle.dump((self._last_pk, cls, columns), file, pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+        if self._journal is not None:
+            self._journal.truncate(0)
+
+    def restore(self, path: str) -> None:
+        """
+        Заменить записи записями из снимка path и применить к ним журнал.
+        Если снимка нет, применяется только журнал.
+        Подписчики о загруженных записях не уведомляются
+        """
+        gc_enabled = gc.isenabled()
+        gc.disable()  # сборка мусора в разы замедляет создание множества объектов
+        try:
+            try:
+                with open(path, 'rb') as file:
+                    self._last_pk, cls, columns = pickle.load(file)
+                objs = _unpack(cls, columns)
+            except FileNotFoundError:
+                self._last_pk, objs = 0, []
+            self._container = {obj.pk: obj for obj in objs}
+            self._replay()
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self._indexed.clear()
+        for index in self._indexes.values():
+            index.clear()
+        if self._indexes:
+            for pk, obj in self._container.items():
+                self._index(pk, self._index_values(obj))
+
+    def _replay(self) -> None:
+        """
+        Применить журнал к записям. Повторное применение ничего не меняет,
+        поэтому журнал, не очищенный после снимка, не портит записи.
+        Недописанная последняя запись журнала отбрасывается
+        """
+        if self._journal is None:
+            return
+        with open(self._journal.name, 'rb') as file:
+            end = 0
+            while True:
+                try:
+                    kind, pk, obj = pickle.load(file)
+                except (EOFError, pickle.UnpicklingError):
+                    break
+                end = file.tell()
+                if kind == 'deleted':
+                    self._container.pop(pk, None)
+                else:
+                    self._container[pk] = obj
+                self._last_pk = max(self._last_pk, pk)
+        self._journal.truncate(end)
+
+    def _notify(self,
+                kind: EventKind,
+                pk: int,
+                old: T | None = None,
+                new: T | None = None) -> None:
+        """ Записать изменение в журнал и сообщить подписчикам """
+        if self._journal is not None:
+            self._journal.write(pickle.dumps((kind, pk, new), pickle.HIGHEST_PROTOCOL))
+            self._journal.flush()
+        super()._notify(kind, pk, old, new)
+
+    @property
+    def index_nbytes(self) -> dict[str, int]:
+        """
+        Примерный размер индексов в байтах по атрибутам: словари индексов
+        без самих значений и pk, которые разделяются с объектами, и без
+        общего словаря pk -> проиндексированные значения
+        """
+        return {field: sys.getsizeof(index)
+                + sum(sys.getsizeof(pks) for pks in index.values())
+                for field, index in self._indexes.items()}
+
+    def _index_values(self, obj: T) -> tuple[Any, ...]:
+        """
+        Значения индексированных атрибутов obj.
+        Если значение нельзя индексировать (нехэшируемое) - TypeError
+        """
+        values = tuple(getattr(obj, field) for field in self._indexes)
+        hash(values)
+        return values
+
+    def _index(self, pk: int, values: tuple[Any, ...]) -> None:
+        if not self._indexes:
+            return
+        self._indexed[pk] = values
+        for index, value in zip(self._indexes.values(), values):
+            index.setdefault(value, {})[pk] = None
+
+    def _unindex(self, pk: int) -> None:
+        """ Убрать pk из индексов по значениям, с которыми он был внесён """
+        values = self._indexed.pop(pk, None)
+        if values is None:
+            return
+        for index, value in zip(self._indexes.values(), values):
+            pks = index.get(value)
+            if pks is not None:
+                pks.pop(pk, None)
+                if not pks:
+                    del index[value]
+
+    def _store(self, pk: int, obj: T) -> T | None:
+        """ Сохранить obj под ключом pk, вернуть прежний объект """
+        values = self._index_values(obj)
+        old = self._container.get(pk)
+        self._unindex(pk)
+        self._container[pk] = obj
+        self._index(pk, values)
+        return old
+
+    def _matching(self, where: dict[str, Any] | None = None) -> Iterator[T]:
+        """
+        Записи по условию where. Если в условии есть индексированные
+        атрибуты, перебираются записи из наименьшей подходящей корзины индекса
+        """
+        if not where:
+            yield from self._container.values()
+            return
+        bucket: dict[int, None] | None = None
+        for field, value in where.items():
+            try:
+                pks = self._indexes[field].get(value, {})
+            except (KeyError, TypeError):
+                continue
+            if bucket is None or len(pks) < len(bucket):
+                bucket = pks
+        candidates: Iterable[T] = self._container.values()
+        if bucket is not None:
+            candidates = [self._container[pk] for pk in sorted(bucket)
+                          if pk in self._container]
+        for obj in candidates:
+            if all(getattr(obj, attr) == value for attr, value in where.items()):
+                yield obj
 
     def add(self, obj: T) -> int:
         if getattr(obj, 'pk', None) != 0:
             raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
-        pk = next(self._counter)
+        values = self._index_values(obj)
+        self._last_pk += 1
+        pk = self._last_pk
         self._container[pk] = obj
+        self._index(pk, values)
         obj.pk = pk
+        self._notify('added', pk, new=obj)
         return pk
 
     def get_by_pk(self, pk: int) -> T | None:
         return self._container.get(pk)
 
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+    def get_all(self,
+                where: dict[str, Any] | None = None,
+                order_by: tuple[str, ...] = (),
+                desc: bool = False,
+                limit: int | None = None,
+                offset: int = 0
+                ) -> list[T]:
+        """
+        Получить записи по условию where.
+        order_by - атрибуты сортировки, desc - сортировать по убыванию,
+        limit и offset - ограничить выборку limit записями, пропустив первые offset
+        """
+        result = list(self._matching(where))
+        if order_by:
+            result.sort(key=attrgetter(*order_by), reverse=desc)
+        if limit is not None or offset:
+            result = result[offset:None if limit is None else offset + limit]
+        return result
+
+    def count(self, where: dict[str, Any] | None = None) -> int:
         if where is None:
-            return list(self._container.values())
-        return [obj for obj in self._container.values()
-                if all(getattr(obj, attr) == value for attr, value in where.items())]
+            return len(self._container)
+        return sum(1 for _ in self.iter_all(where))
+
+    def iter_all(self,
+                 where: dict[str, Any] | None = None,
+                 batch_size: int = 1000
+                 ) -> Iterator[T]:
+        """
+        Перебрать записи без копирования контейнера.
+        Изменять репозиторий во время перебора нельзя.
+        batch_size не используется: данные уже находятся в памяти
+        """
+        yield from self._matching(where)
 
     def update_by_pk(self, obj: T) -> None:
         if obj.pk == 0:
             raise ValueError('attempt to update object with unknown primary key')
-        self._container[obj.pk] = obj
+        old = self._store(obj.pk, obj)
+        self._notify('updated', obj.pk, old, obj)
 
     def delete_by_pk(self, pk: int) -> None:
-        self._container.pop(pk)
+        old = self._container.pop(pk)
+        self._unindex(pk)
+        self._notify('deleted', pk, old=old)
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+            self._index_values(obj)
+        return [self.add(obj) for obj in objs]
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+        for obj in objs:
+            self._index_values(obj)
+        for obj in objs:
+            old = self._store(obj.pk, obj)
+            self._notify('updated', obj.pk, old, obj)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(dict.fromkeys(pks))
+        for pk in pks:
+            if pk not in self._container:
+                raise KeyError(pk)
+        for pk in pks:
+            old = self._container.pop(pk)
+            self._unindex(pk)
+            self._notify('deleted', pk, old=old)
+
+    def update_field(self,
+                     field: str,
+                     old_values: Iterable[Any],
+                     new_value: Any,
+                     where: dict[str, Any] | None = None) -> int:
+        """
+        Присвоить field значение new_value в записях, где оно равно одному
+        из old_values, за один проход по контейнеру, изменяя объекты на месте.
+        Если есть подписчики, в событиях old - копия объекта до изменения
+        """
+        old_values = set(old_values)
+        objs = [obj for obj in self.iter_all(where)
+                if getattr(obj, field) in old_values]
+        for obj in objs:
+            old = copy.copy(obj) if self._subscribers else None
+            self._unindex(obj.pk)
+            setattr(obj, field, new_value)
+            self._index(obj.pk, self._index_values(obj))
+            self._notify('updated', obj.pk, old, obj)
+        return len(objs)
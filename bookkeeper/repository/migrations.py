@@ -0,0 +1,116 @@
+"""
+Модуль описывает версионные миграции схемы БД SQLite
+
+Версия схемы хранится в заголовке файла БД (PRAGMA user_version).
+Миграция - функция, получающая соединение и изменяющая схему или данные.
+Миграция с номером i (считая с 1) переводит БД из версии i - 1 в версию i.
+Каждая миграция выполняется в отдельной транзакции вместе с записью
+новой версии, поэтому прерванное обновление не оставляет БД в промежуточном
+состоянии. Уже применённые миграции повторно не выполняются.
+"""
+import sqlite3
+from typing import Callable, Mapping, Sequence
+
+from bookkeeper.money import Money
+from bookkeeper.repository.connection_pool import ConnectionPool
+from bookkeeper.repository.sqlite_repository import migrate_dates_to_iso
+from bookkeeper.repository.sqlite_repository import create_closure_table
+from bookkeeper.repository.sqlite_repository import create_daily_summary_table
+from bookkeeper.repository.sqlite_repository import drop_daily_summary_table
+
+Migration = Callable[[sqlite3.Connection], None]
+
+
+def get_version(con: sqlite3.Connection) -> int:
+    """
+    Получить версию схемы БД
+    """
+    version: int = con.execute('PRAGMA user_version').fetchone()[0]
+    return version
+
+
+def table_exists(con: sqlite3.Connection, table_name: str) -> bool:
+    """
+    Проверить, есть ли в БД таблица table_name
+    """
+    query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+    return con.execute(query, (table_name,)).fetchone() is not None
+
+
+def column_types(con: sqlite3.Connection, table_name: str) -> dict[str, str]:
+    """
+    Получить объявленные типы колонок таблицы table_name
+    (пустой словарь, если таблицы нет)
+    """
+    rows = con.execute(f'PRAGMA table_info({table_name})').fetchall()
+    return {row[1]: row[2].upper() for row in rows}
+
+
+def check_money(pool: ConnectionPool,
+                money: Money,
+                columns: Mapping[str, Sequence[str]]) -> None:
+    """
+    Проверить, что суммы в БД хранятся в представлении money.
+    columns - колонки сумм по таблицам ({таблица: (колонка, ...)}),
+    их тип записывается в БД при создании таблицы и должен совпадать
+    с money.sql_type. Суммы в уже созданной БД не пересчитываются,
+    поэтому при несовпадении выбрасывается ValueError.
+    Таблицы, которых ещё нет, не проверяются
+    """
+    con = pool.connection()
+    for table_name, table_columns in columns.items():
+        types = column_types(con, table_name)
+        for column in table_columns:
+            if column in types and types[column] != money.sql_type:
+                raise ValueError(
+                    f"{table_name}.{column} stores amounts as {types[column]}, "
+                    f"but {money} expects {money.sql_type}")
+
+
+def migrate(pool: ConnectionPool, migrations: Sequence[Migration]) -> int:
+    """
+    Применить к БД миграции, которые ещё не были применены.
+    Возвращает итоговую версию схемы.
+    Если версия БД больше числа известных миграций (БД обновлена более новой
+    версией программы), выбрасывается ValueError
+    """
+    version = get_version(pool.connection())
+    if version > len(migrations):
+        raise ValueError(f"DB schema version {version} is newer than "
+                         f"the latest known version {len(migrations)}")
+    for number, migration in enumerate(migrations[version:], start=version + 1):
+        with pool.transaction() as con:
+            migration(con)
+            con.execute(f'PRAGMA user_version = {number}')
+    return len(migrations)
+
+
+def _expense_dates_to_iso(con: sqlite3.Connection) -> None:
+    """ Перевод дат расходов в сортируемый формат (см. DATE_FORMAT) """
+    if table_exists(con, 'expense_table'):
+        migrate_dates_to_iso(con, 'expense_table', ('expense_date', 'added_date'))
+
+
+def _expense_daily_summary(con: sqlite3.Connection) -> None:
+    """
+    Таблица дневных итогов расходов (см. create_daily_summary_table).
+    Таблица прежнего вида (без числа строк n_rows) пересоздаётся,
+    итоги заново считаются по расходам
+    """
+    if table_exists(con, 'expense_table'):
+        drop_daily_summary_table(con, 'expense_table')
+        create_daily_summary_table(con, 'expense_table')
+
+
+def _category_closure(con: sqlite3.Connection) -> None:
+    """ Таблица связей категорий (см. create_closure_table) """
+    if table_exists(con, 'categories_table'):
+        create_closure_table(con, 'categories_table')
+
+
+# Миграции БД приложения. Новые миграции добавляются только в конец списка
+BOOKKEEPER_MIGRATIONS: tuple[Migration, ...] = (
+    _expense_dates_to_iso,
+    _expense_daily_summary,
+    _category_closure,
+)
@@ -4,12 +4,46 @@
 import sqlite3
 import datetime
 import typing
-from typing import Any
-from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from contextlib import contextmanager
+from types import TracebackType
+from functools import partial
+from typing import Any, Iterable, Iterator, NamedTuple
+from bookkeeper.repository.abstract_repository import AbstractRepository, EventKind, T
+from bookkeeper.repository.abstract_repository import RepositoryEvent, Subscriber
+from bookkeeper.repository.connection_pool import ConnectionPool
 from bookkeeper.models.expense import Expense
 
 # pylint: disable=too-few-public-methods
 # pylint: disable=too-many-arguments
+# pylint: disable=too-many-public-methods
+
+# Формат хранения дат в БД. Строки в этом формате сортируются
+# в хронологическом порядке, поэтому к ним применимы индексы и BETWEEN
+DATE_FORMAT = '%Y-%m-%d %H:%M'
+
+# Агрегатные функции и интервалы группировки по дате для SQLiteRepository.aggregate
+AGGREGATE_FUNCS = ('SUM', 'COUNT', 'AVG', 'MIN', 'MAX')
+# Выражения для агрегатных функций по таблице дневных итогов. Как и в SQL,
+# пустые значения не учитываются, сумма только пустых значений - NULL
+SUMMARY_FUNCS = {
+    'SUM': 'CASE WHEN SUM(count) > 0 THEN SUM(total) END',
+    'COUNT': 'SUM(count)',
+    'AVG': 'CAST(SUM(total) AS REAL) / SUM(count)',
+}
+BUCKETS = {
+    'day': "substr({}, 1, 10)",
+    'week': "date({}, '-6 days', 'weekday 1')",
+    'month': "substr({}, 1, 7)",
+    'year': "substr({}, 1, 4)",
+}
+
+
+class _DailySummary(NamedTuple):
+    """ Описание таблицы дневных итогов (см. SQLiteRepository.create_daily_summary) """
+    table: str
+    group_by: tuple[str, ...]
+    field: str
+    date_field: str
 
 
 class SQLiteRepository(AbstractRepository[T]):
@@ -20,7 +54,17 @@ class SQLiteRepository(AbstractRepository[T]):
         название таблицы
         поля таблицы
         типы полей
+        пул соединений (необязательно)
+        индексы - кортежи колонок, по которым нужны индексы (необязательно)
     Поддерживает те же методы, что и в абстрактном репозитории
+
+    Репозиторий держит долгоживущее соединение (по одному на поток) из пула.
+    Если пул не передан, репозиторий создаёт собственный и закрывает его в close.
+    Переданный пул может разделяться несколькими репозиториями одного файла,
+    закрывать его должен тот, кто его создал.
+    События изменений (subscribe) внутри транзакции пула приходят после её
+    фиксации и не приходят при откате. Массовые изменения (update_field,
+    delete_all) не читают строки и сообщают одно событие 'reset'.
     """
 
     def __init__(self,
@@ -28,29 +72,80 @@ class SQLiteRepository(AbstractRepository[T]):
                  table_name: str,
                  fields: tuple[str, ...],
                  types: tuple[str, ...],
-                 row_type: typing.Type[T]
+                 row_type: typing.Type[T],
+                 pool: ConnectionPool | None = None,
+                 indexes: tuple[tuple[str, ...], ...] = ()
                  ) -> None:
         if not isinstance(db_file, str):
             raise TypeError("DB address should be str")
         if ".db" not in db_file:
             raise ValueError("DB should be .db file")
+        if pool is not None and pool.db_file != db_file:
+            raise ValueError("Pool should be connected to the same DB file")
         self.db_file: str = db_file
         self.table_name: str = table_name
-        self.fields: tuple[str] = fields
+        self.fields: tuple[str, ...] = fields
         self.row_type: typing.Type[T] = row_type
-        with sqlite3.connect(db_file) as con:
-            cur = con.cursor()
+        self.summary: _DailySummary | None = None
+        self.closure_table: str | None = None
+        self._own_pool = pool is None
+        self.pool: ConnectionPool = ConnectionPool(db_file) if pool is None else pool
         columns = [f"{col} {t}" for col, t in zip(fields, types)]
         names = ', '.join(columns)
         create_table = f"CREATE TABLE IF NOT EXISTS {self.table_name} ( {names} );"
-        cur.execute(create_table)
-        last_id: int = cur.execute(
+        with self.pool.transaction() as con:
+            con.execute(create_table)
+        for index_columns in indexes:
+            self.create_index(*index_columns)
+        last_id: int = self._cursor().execute(
             f"SELECT MAX({self.fields[0]}) FROM {self.table_name}"
         ).fetchone()[0]
         self.next_id: int = 1
         if last_id is not None:
             self.next_id = int(last_id) + 1
-        con.close()
+
+    def _cursor(self) -> sqlite3.Cursor:
+        """ Курсор соединения текущего потока """
+        return self.pool.connection().cursor()
+
+    def _check_fields(self, *names: str) -> None:
+        """
+        Проверить, что names - поля таблицы: они подставляются в текст запроса.
+        Иначе - ValueError
+        """
+        for name in names:
+            if name not in self.fields:
+                raise ValueError(f"unknown field {name}")
+
+    def _notify(self,
+                kind: EventKind,
+                pk: int,
+                old: T | None = None,
+                new: T | None = None) -> None:
+        """
+        Сообщить об изменении после фиксации транзакции тем, кто был
+        подписан во время изменения
+        """
+        if self._subscribers:
+            event = RepositoryEvent(kind, pk, old, new)
+            self.pool.after_commit(partial(_deliver, list(self._subscribers), event))
+
+    def close(self) -> None:
+        """
+        Закрыть репозиторий.
+        Собственный пул закрывается, разделяемый пул остаётся открытым
+        """
+        if self._own_pool:
+            self.pool.close()
+
+    def __enter__(self) -> 'SQLiteRepository[T]':
+        return self
+
+    def __exit__(self,
+                 exc_type: type[BaseException] | None,
+                 exc_val: BaseException | None,
+                 exc_tb: TracebackType | None) -> None:
+        self.close()
 
     def add(self, obj: T) -> int:
         """
@@ -62,13 +157,11 @@ class SQLiteRepository(AbstractRepository[T]):
         names = ', '.join(self.fields)
         place = ', '.join("?" * len(self.fields))
         values = [getattr(obj, x) for x in self.fields]
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-        cur.execute('PRAGMA foreign_keys = ON')
         query = f'INSERT OR IGNORE INTO {self.table_name} ({names}) VALUES ({place})'
-        cur.execute(query, values)
-        con.commit()
-        con.close()
+        with self.pool.transaction() as con:
+            inserted = con.execute(query, values).rowcount
+        if inserted:
+            self._notify('added', obj.pk, new=obj)
         return obj.pk
 
     def get_by_pk(self, pk: int) -> T | None:
@@ -78,11 +171,8 @@ class SQLiteRepository(AbstractRepository[T]):
         """
         if not isinstance(pk, int):
             raise TypeError("Can get row only by int pk")
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
         query = "SELECT * FROM " + str(self.table_name) + " WHERE pk = " + str(pk)
-        res = cursor.execute(query).fetchone()
-        conn.close()
+        res = self._cursor().execute(query).fetchone()
         obj = self.row_type()
         try:
             for name, value in zip(self.fields, res):
@@ -91,35 +181,90 @@ class SQLiteRepository(AbstractRepository[T]):
             return None
         return obj
 
+    def _make_row(self, row: typing.Sequence[Any],
+                  names: tuple[str, ...] = ()) -> T:
+        """
+        Создать объект row_type из строки таблицы.
+        names - названия колонок строки, по умолчанию - все поля репозитория
+        """
+        obj = self.row_type()
+        for name, value in zip(names or self.fields, row):
+            setattr(obj, name, value)
+        return obj
+
+    def _select_query(self,
+                      where: dict[str, Any] | None = None,
+                      columns: tuple[str, ...] = (),
+                      **paging: Any
+                      ) -> tuple[str, list[Any]]:
+        """
+        Сформировать запрос SELECT колонок columns по условию where.
+        paging - аргументы сортировки и постраничной выборки (см. get_all).
+        Возвращает текст запроса и список параметров
+        """
+        columns_names = ', '.join(columns) if columns else '*'
+        query = f"SELECT {columns_names} FROM {self.table_name}"
+        conditions = [f"{field} = ?" for field in where or {}]
+        params: list[Any] = list((where or {}).values())
+        keyset, tail, paging_params = _paging_clause(**paging)
+        if keyset:
+            conditions.append(keyset)
+        if conditions:
+            query += " WHERE " + ' AND '.join(conditions)
+        return query + tail, params + paging_params
+
     def get_all(self,
                 where: dict[str, Any] | None = None,
-                columns: tuple[str, ...] = ()
+                columns: tuple[str, ...] = (),
+                order_by: tuple[str, ...] = (),
+                desc: bool = False,
+                limit: int | None = None,
+                offset: int = 0,
+                after: tuple[Any, ...] | None = None
                 ) -> list[T]:
         """
         Получить все данные полей - columns по некоторому условию - where
+        Постраничная выборка:
+            order_by - поля сортировки, desc - сортировать по убыванию
+            limit - максимальное число строк, offset - сколько строк пропустить
+            after - значения полей order_by последней полученной строки:
+                    вернуть строки, следующие за ней (выборка по ключу)
         """
-        query = ""
-        if len(columns) == 0:
-            query += "SELECT * FROM " + str(self.table_name)
-        else:
-            columns_names = ', '.join(columns)
-            query = f"SELECT {columns_names} FROM {str(self.table_name)} "
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-        if where is not None:
-            query_cond_list = []
-            for field in where.keys():
-                query_cond_list.append(field + " = " + str(where.get(field)))
-            query += " WHERE " + ' && '.join(query_cond_list)
-        res = cursor.execute(query).fetchall()
-        conn.close()
-        data = []
-        for row in res:
-            obj = self.row_type()
-            for name, value in zip(self.fields, row):
-                setattr(obj, name, value)
-            data.append(obj)
-        return data
+        query, params = self._select_query(where, columns, order_by=order_by, desc=desc,
+                                           limit=limit, offset=offset, after=after)
+        res = self._cursor().execute(query, params).fetchall()
+        return [self._make_row(row, columns) for row in res]
+
+    def count(self, where: dict[str, Any] | None = None) -> int:
+        """
+        Количество записей по условию where
+        """
+        query, params = self._select_query(where, ('COUNT(*)',))
+        result: int = self._cursor().execute(query, params).fetchone()[0]
+        return result
+
+    def iter_all(self,
+                 where: dict[str, Any] | None = None,
+                 batch_size: int = 1000
+                 ) -> Iterator[T]:
+        """
+        Перебрать записи по условию where, не загружая всю таблицу в память.
+        Строки читаются из курсора пачками по batch_size (fetchmany)
+        """
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        query, params = self._select_query(where)
+        cur = self._cursor()
+        cur.execute(query, params)
+        try:
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield self._make_row(row)
+        finally:
+            cur.close()
 
     def update_by_pk(self, obj: T) -> None:
         """
@@ -130,13 +275,11 @@ class SQLiteRepository(AbstractRepository[T]):
             raise TypeError("Can update row only by int pk")
         names = '=? , '.join(self.fields)
         values = [getattr(obj, x) for x in self.fields]
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-        cur.execute('PRAGMA foreign_keys = ON')
         query = f'UPDATE {self.table_name} SET {names} =? WHERE pk = {obj.pk}'
-        cur.execute(query, values)
-        con.commit()
-        con.close()
+        old = self.get_by_pk(obj.pk) if self._subscribers else None
+        with self.pool.transaction() as con:
+            con.execute(query, values)
+        self._notify('updated', obj.pk, old, obj)
         return
 
     def delete_by_pk(self, pk: int) -> None:
@@ -147,40 +290,153 @@ class SQLiteRepository(AbstractRepository[T]):
             raise TypeError("Can update row only by int pk")
         if pk < 0:
             raise ValueError("pk must be positive")
-        with sqlite3.connect(self.db_file) as con:
-            if not isinstance(pk, int):
-                raise TypeError("Can get row only by int pk")
-        cur = con.cursor()
         query = "DELETE FROM " + self.table_name + " WHERE pk = " + str(pk)
-        cur.execute(query)
-        con.commit()
-        con.close()
+        old = self.get_by_pk(pk) if self._subscribers else None
+        with self.pool.transaction() as con:
+            con.execute(query)
+        if old is not None:
+            self._notify('deleted', pk, old=old)
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Добавить несколько элементов в репозиторий одной транзакцией.
+        Объекты должны иметь атрибут pk - primary key
+        """
+        objs = list(objs)
+        for obj in objs:
+            obj.pk = self.next_id
+            self.next_id += 1
+        names = ', '.join(self.fields)
+        place = ', '.join("?" * len(self.fields))
+        values = [[getattr(obj, x) for x in self.fields] for obj in objs]
+        query = f'INSERT OR IGNORE INTO {self.table_name} ({names}) VALUES ({place})'
+        with self.pool.transaction() as con:
+            if self._subscribers:
+                # executemany сообщает только общее число строк,
+                # а о пропущенных (OR IGNORE) строках сообщать нельзя
+                for obj, row in zip(objs, values):
+                    if con.execute(query, row).rowcount:
+                        self._notify('added', obj.pk, new=obj)
+            else:
+                con.executemany(query, values)
+        return [obj.pk for obj in objs]
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """
+        Обновить несколько строк репозитория одной транзакцией.
+        Строки определяются по pk объектов
+        """
+        objs = list(objs)
+        for obj in objs:
+            if not isinstance(obj.pk, int):
+                raise TypeError("Can update row only by int pk")
+        names = '=? , '.join(self.fields)
+        values = [[getattr(obj, x) for x in self.fields] + [obj.pk] for obj in objs]
+        query = f'UPDATE {self.table_name} SET {names} =? WHERE pk = ?'
+        old = self._rows_by_pk([obj.pk for obj in objs]) if self._subscribers else {}
+        with self.pool.transaction() as con:
+            con.executemany(query, values)
+        for obj in objs:
+            self._notify('updated', obj.pk, old.get(obj.pk), obj)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """
+        Удалить несколько строк одной транзакцией
+        """
+        pks = list(pks)
+        for pk in pks:
+            if not isinstance(pk, int):
+                raise TypeError("Can delete row only by int pk")
+            if pk < 0:
+                raise ValueError("pk must be positive")
+        query = f"DELETE FROM {self.table_name} WHERE pk = ?"
+        old = self._rows_by_pk(pks) if self._subscribers else {}
+        with self.pool.transaction() as con:
+            con.executemany(query, [(pk,) for pk in pks])
+        for pk, row in old.items():
+            self._notify('deleted', pk, old=row)
+
+    def _rows_by_pk(self, pks: list[int], chunk_size: int = 500) -> dict[int, T]:
+        """
+        Прочитать строки с pk из pks запросами WHERE pk IN (...)
+        по chunk_size pk за раз. Вернуть словарь pk -> объект
+        """
+        result: dict[int, T] = {}
+        cur = self._cursor()
+        for start in range(0, len(pks), chunk_size):
+            chunk = pks[start:start + chunk_size]
+            query = f"SELECT * FROM {self.table_name} " \
+                    f"WHERE pk IN ({', '.join('?' * len(chunk))})"
+            for row in cur.execute(query, chunk).fetchall():
+                obj = self._make_row(row)
+                result[obj.pk] = obj
+        return result
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Выполнить несколько операций одной транзакцией пула соединений.
+        Репозитории с общим пулом, используемые внутри, участвуют в этой же
+        транзакции, при ошибке все изменения откатываются
+        """
+        with self.pool.transaction():
+            yield
+
+    def update_field(self,
+                     field: str,
+                     old_values: Iterable[Any],
+                     new_value: Any,
+                     where: dict[str, Any] | None = None) -> int:
+        """
+        Присвоить field значение new_value во всех строках, где оно равно
+        одному из old_values, одним запросом UPDATE ... WHERE field IN (...).
+        where - дополнительное условие (как в get_all).
+        Вернуть число изменённых строк. Строки не читаются, подписчики
+        получают одно событие 'reset'
+        """
+        self._check_fields(field, *(where or {}))
+        old_values = list(old_values)
+        if not old_values:
+            return 0
+        conditions = [f"{field} IN ({', '.join('?' * len(old_values))})"]
+        conditions.extend(f"{name} = ?" for name in where or {})
+        query = f"UPDATE {self.table_name} SET {field} = ? " \
+                f"WHERE {' AND '.join(conditions)}"
+        params = [new_value, *old_values, *(where or {}).values()]
+        with self.pool.transaction() as con:
+            result: int = con.execute(query, params).rowcount
+        if result:
+            self._notify('reset', 0)
+        return result
 
     def show_all(self) -> None:
         """
         Распечатать все строки репозитория
         """
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
+        cur = self._cursor()
         cur.execute("SELECT * FROM " + self.table_name)
         for x in (cur.fetchall()):
             print(x)
-        con.close()
 
     def delete_all(self) -> None:
         """
         Удалить все элементы репозитория.
         Сама таблица не удаляется!
         """
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-        cur.execute("DELETE FROM " + self.table_name)
+        with self.pool.transaction() as con:
+            deleted = con.execute("DELETE FROM " + self.table_name).rowcount
+        if deleted:
+            self._notify('reset', 0)
         # self.next_id = 1
-        con.commit()
-        con.close()
 
     def get_join(self, table_1: str, table_2: str, columns: tuple[str, ...],
-                 field_table_1: str, field_table_2: str) -> list[list[str]]:
+                 field_table_1: str, field_table_2: str,
+                 order_by: tuple[str, ...] = (),
+                 desc: bool = False,
+                 limit: int | None = None,
+                 offset: int = 0,
+                 after: tuple[Any, ...] | None = None
+                 ) -> list[list[str]]:
         """
         Получить данные полей coloumns из таблицы 1 объединённой со 2
             при совпадающих данных в полях field_table_1 и field_table_2
@@ -189,54 +445,480 @@ class SQLiteRepository(AbstractRepository[T]):
         table1 - имя 2 таблицы
         field_table_1 - поле 1 таблицы
         field_table_2 - поле 2 таблицы
+        order_by, desc, limit, offset, after - постраничная выборка, см. get_all
         """
-        with sqlite3.connect(self.db_file) as conn:
-            cur = conn.cursor()
+        cur = self._cursor()
         names = ', '.join(columns)
         query = f"SELECT {names} " \
                 f"FROM {table_1}" \
                 f" JOIN {table_2}" \
                 f" ON {table_1}.{field_table_1} = {table_2}.{field_table_2}"
-        cur.execute(query)
+        keyset, tail, params = _paging_clause(order_by, desc, limit, offset, after)
+        if keyset:
+            query += " WHERE " + keyset
+        cur.execute(query + tail, params)
         return cur.fetchall()
 
-    def get_cat_expense_data_day(self) -> list[list[str | float]]:
+    def count_join(self, table_1: str, table_2: str,
+                   field_table_1: str, field_table_2: str) -> int:
         """
-        Получить расходы сгруппированных по категориям за день
-        Реализована ТОЛЬКО для передачи даныых в виджет table_cat_expenses!
-        table_cat_expenses - таблица расходов по категориям,
-        См MainWindow в app_interface.py
+        Количество строк в объединении таблиц (см. get_join)
         """
-        with sqlite3.connect(self.db_file) as conn:
-            cur = conn.cursor()
-        today = datetime.datetime.today().date().strftime('%d-%m-%Y')
+        result: int = self._cursor().execute(
+            f"SELECT COUNT(*) FROM {table_1} JOIN {table_2}"
+            f" ON {table_1}.{field_table_1} = {table_2}.{field_table_2}"
+        ).fetchone()[0]
+        return result
 
-        query = f"SELECT categories_table.name, SUM(expense_table.amount) " \
-                f"FROM categories_table JOIN expense_table" \
-                f" WHERE categories_table.pk = expense_table.category" \
-                f" AND expense_table.expense_date LIKE '{today}%'" \
-                f" GROUP BY categories_table.name"
-        cur.execute(query)
-        return cur.fetchall()
+    def create_index(self, *columns: str) -> None:
+        """
+        Создать индекс по колонкам columns, если его ещё нет
+        """
+        name = f"{self.table_name}_{'_'.join(columns)}_idx"
+        query = f"CREATE INDEX IF NOT EXISTS {name} " \
+                f"ON {self.table_name} ({', '.join(columns)})"
+        with self.pool.transaction() as con:
+            con.execute(query)
 
-    def get_cat_expense_data_month(self) -> list[list[str | float]]:
+    def convert_dates_to_iso(self, *columns: str) -> int:
         """
-        Получить расходы сгруппированных по категориям за месяц
-        Реализована ТОЛЬКО для передачи даныых в виджет table_cat_expenses!
-        table_cat_expenses - таблица расходов по категориям,
-        См MainWindow в app_interface.py
+        Перевести даты в колонках columns из старого формата '%d-%m-%Y %H:%M'
+        в сортируемый формат DATE_FORMAT. Строки, уже записанные в новом формате,
+        не изменяются, поэтому повторный вызов безопасен.
+        Возвращает количество изменённых значений
         """
-        with sqlite3.connect(self.db_file) as conn:
-            cur = conn.cursor()
-        today = datetime.datetime.today().date().strftime('%m-%Y')
+        with self.pool.transaction() as con:
+            return migrate_dates_to_iso(con, self.table_name, columns)
 
-        query = f"SELECT categories_table.name, SUM(expense_table.amount)" \
-                f"FROM categories_table JOIN expense_table" \
-                f" WHERE categories_table.pk = expense_table.category" \
-                f" AND expense_table.expense_date LIKE '%-{today}%'" \
-                f"GROUP BY categories_table.name"
-        cur.execute(query)
-        return cur.fetchall()
+    def aggregate(self,
+                  group_by: tuple[str, ...] = (),
+                  start: datetime.datetime | None = None,
+                  end: datetime.datetime | None = None,
+                  bucket: str | None = None,
+                  funcs: tuple[str, ...] = ('SUM',),
+                  field: str = 'amount',
+                  date_field: str = 'expense_date'
+                  ) -> list[tuple[Any, ...]]:
+        """
+        Агрегировать значения поля field одним запросом GROUP BY.
+        group_by - поля группировки, например ('category',)
+        start, end - период [start, end) по полю даты date_field (необязательно)
+        bucket - интервал группировки по дате: 'day', 'week' (с понедельника),
+                 'month' или 'year' (необязательно)
+        funcs - агрегатные функции: SUM, COUNT, AVG, MIN, MAX
+        Возвращает строки (интервал, *значения group_by, *значения funcs),
+        интервал есть только при заданном bucket и обозначается датой его начала:
+        '2023-03-13' для дня и недели, '2023-03' для месяца, '2023' для года
+        """
+        self._check_fields(*group_by, field, date_field)
+        funcs = tuple(func.upper() for func in funcs)
+        for func in funcs:
+            if func not in AGGREGATE_FUNCS:
+                raise ValueError(f"unknown aggregate function {func}")
+        if bucket is not None and bucket not in BUCKETS:
+            raise ValueError(f"unknown bucket {bucket}")
+        query, params = self._aggregate_query(group_by, start, end, bucket, funcs,
+                                              field, date_field)
+        return self._cursor().execute(query, params).fetchall()
+
+    def _aggregate_query(self,
+                         group_by: tuple[str, ...],
+                         start: datetime.datetime | None,
+                         end: datetime.datetime | None,
+                         bucket: str | None,
+                         funcs: tuple[str, ...],
+                         field: str,
+                         date_field: str) -> tuple[str, list[str]]:
+        """
+        Сформировать запрос для aggregate (аргументы уже проверены).
+        Возвращает текст запроса и параметры к нему
+        """
+        if self._summary_covers(group_by, start, end, funcs, field, date_field):
+            assert self.summary is not None
+            table, date_expr, date_format = self.summary.table, 'day', '%Y-%m-%d'
+            aggregates = [SUMMARY_FUNCS[func] for func in funcs]
+        else:
+            table, date_expr, date_format = self.table_name, date_field, DATE_FORMAT
+            aggregates = [f"{func}({field})" for func in funcs]
+        groups = list(group_by)
+        if bucket is not None:
+            groups.insert(0, BUCKETS[bucket].format(date_expr))
+        condition, params = _period_condition(date_expr, start, end, date_format)
+        query = f"SELECT {', '.join(groups + aggregates)} FROM {table}"
+        if condition:
+            query += " WHERE " + condition
+        if groups:
+            query += f" GROUP BY {', '.join(groups)} ORDER BY {', '.join(groups)}"
+        return query, params
+
+    def rollup(self,
+               tree_table: str,
+               start: datetime.datetime | None = None,
+               end: datetime.datetime | None = None,
+               group_field: str = 'category',
+               field: str = 'amount',
+               date_field: str = 'expense_date',
+               parent_field: str = 'parent',
+               closure_table: str | None = None
+               ) -> list[tuple[int, str, float]]:
+        """
+        Получить суммы значений field за период [start, end) для каждой категории
+        вместе со всеми её подкатегориями - одним запросом.
+        tree_table - таблица категорий (поля pk, name и parent_field),
+        group_field - поле этой таблицы со ссылкой на категорию.
+        Поддерево категории находится рекурсивным CTE по полю parent_field
+        или, если передана closure_table, по таблице связей предок-потомок
+        (см. create_closure).
+        Возвращает строки (pk категории, название, сумма по поддереву)
+        в порядке pk, в том числе для категорий без расходов (сумма 0)
+        """
+        self._check_fields(group_field, field, date_field)
+        totals, params = self._aggregate_query((group_field,), start, end, None,
+                                               ('SUM',), field, date_field)
+        query = f"WITH RECURSIVE " \
+                f"totals(category, total) AS ({totals}), " \
+                f"subtree(root, pk) AS ("
+        if closure_table is None:
+            query += f"SELECT pk, pk FROM {tree_table} " \
+                     f"UNION " \
+                     f"SELECT subtree.root, child.pk FROM {tree_table} AS child " \
+                     f"JOIN subtree ON child.{parent_field} = subtree.pk) "
+        else:
+            query += f"SELECT ancestor, descendant FROM {closure_table}) "
+        query += f"SELECT cat.pk, cat.name, COALESCE(SUM(totals.total), 0) " \
+                 f"FROM {tree_table} AS cat " \
+                 f"JOIN subtree ON subtree.root = cat.pk " \
+                 f"LEFT JOIN totals ON CAST(totals.category AS INTEGER) = subtree.pk " \
+                 f"GROUP BY cat.pk ORDER BY cat.pk"
+        return self._cursor().execute(query, params).fetchall()
+
+    def _summary_covers(self,
+                        group_by: tuple[str, ...],
+                        start: datetime.datetime | None,
+                        end: datetime.datetime | None,
+                        funcs: tuple[str, ...],
+                        field: str,
+                        date_field: str) -> bool:
+        """
+        Можно ли выполнить агрегацию по таблице дневных итогов:
+        те же поля, группировка по её полям, функции SUM/COUNT/AVG
+        и границы периода, совпадающие с началом суток
+        """
+        if self.summary is None:
+            return False
+        return (field == self.summary.field
+                and date_field == self.summary.date_field
+                and set(group_by) <= set(self.summary.group_by)
+                and all(func in SUMMARY_FUNCS for func in funcs)
+                and all(bound is None or bound.time() == datetime.time()
+                        for bound in (start, end)))
+
+    def create_daily_summary(self,
+                             group_by: tuple[str, ...] = ('category',),
+                             field: str = 'amount',
+                             date_field: str = 'expense_date') -> None:
+        """
+        Включить таблицу дневных итогов {table_name}_daily
+        (см. create_daily_summary_table), создав её, если её ещё нет.
+        После этого aggregate, где это возможно, читает дневные итоги
+        вместо исходных строк
+        """
+        self._check_fields(field, date_field, *group_by)
+        with self.pool.transaction() as con:
+            table = create_daily_summary_table(con, self.table_name,
+                                               group_by, field, date_field)
+        self.summary = _DailySummary(table, group_by, field, date_field)
+
+    def create_closure(self, parent_field: str = 'parent') -> None:
+        """
+        Включить таблицу связей {table_name}_closure (см. create_closure_table),
+        создав её, если её ещё нет.
+        После этого get_ancestors и get_descendants читают таблицу связей
+        """
+        self._check_fields(parent_field)
+        with self.pool.transaction() as con:
+            self.closure_table = create_closure_table(con, self.table_name,
+                                                      parent_field)
+
+    def _hierarchy(self,
+                   pk: int,
+                   up: bool,
+                   include_self: bool,
+                   parent_field: str) -> list[T]:
+        """
+        Предки (up) или потомки строки pk одним запросом
+        по таблице связей или, если она не создана, рекурсивным CTE
+        """
+        if not isinstance(pk, int):
+            raise TypeError("Can get hierarchy only by int pk")
+        query = ''
+        closure = self.closure_table
+        if closure is None:
+            query, closure = _closure_cte(self.table_name, parent_field), 'closure'
+        join, key = ('ancestor', 'descendant') if up else ('descendant', 'ancestor')
+        columns = ', '.join(f"row.{name}" for name in self.fields)
+        query += f"SELECT {columns} FROM {self.table_name} AS row " \
+                 f"JOIN {closure} ON row.pk = {closure}.{join} " \
+                 f"WHERE {closure}.{key} = ? AND {closure}.depth >= ? " \
+                 f"ORDER BY {closure}.depth, row.pk"
+        rows = self._cursor().execute(query, (pk, 0 if include_self else 1))
+        return [self._make_row(row) for row in rows.fetchall()]
+
+    def get_ancestors(self,
+                      pk: int,
+                      include_self: bool = False,
+                      parent_field: str = 'parent') -> list[T]:
+        """
+        Получить всех предков строки pk по полю parent_field - от родителя
+        до верхнего уровня. include_self - включить в начало саму строку
+        """
+        return self._hierarchy(pk, True, include_self, parent_field)
+
+    def get_descendants(self,
+                        pk: int,
+                        include_self: bool = False,
+                        parent_field: str = 'parent') -> list[T]:
+        """
+        Получить всех потомков строки pk по полю parent_field - по уровням,
+        начиная с непосредственных. include_self - включить в начало саму строку
+        """
+        return self._hierarchy(pk, False, include_self, parent_field)
+
+    def get_in_subtree(self,
+                       closure_table: str,
+                       pk: int,
+                       group_field: str = 'category') -> list[T]:
+        """
+        Получить строки, у которых group_field ссылается на категорию pk
+        или любую её подкатегорию, одним запросом по таблице связей
+        closure_table (см. create_closure) в порядке pk
+        """
+        self._check_fields(group_field)
+        columns = ', '.join(f"row.{name}" for name in self.fields)
+        query = f"SELECT {columns} FROM {self.table_name} AS row " \
+                f"JOIN {closure_table} AS tree " \
+                f"ON row.{group_field} = CAST(tree.descendant AS TEXT) " \
+                f"WHERE tree.ancestor = ? ORDER BY row.pk"
+        rows = self._cursor().execute(query, (pk,)).fetchall()
+        return [self._make_row(row) for row in rows]
+
+    def get_period_sum(self,
+                       start: datetime.datetime,
+                       end: datetime.datetime,
+                       field: str = 'amount',
+                       date_field: str = 'expense_date') -> float:
+        """
+        Получить сумму значений поля field по строкам, у которых
+        дата date_field попадает в период [start, end)
+        """
+        result: float | None = self.aggregate(start=start, end=end, field=field,
+                                              date_field=date_field)[0][0]
+        return result or 0
+
+
+def _deliver(callbacks: list[Subscriber], event: RepositoryEvent[Any]) -> None:
+    """ Передать событие подписчикам callbacks """
+    for callback in callbacks:
+        callback(event)
+
+
+def _paging_clause(order_by: tuple[str, ...] = (),
+                   desc: bool = False,
+                   limit: int | None = None,
+                   offset: int = 0,
+                   after: tuple[Any, ...] | None = None
+                   ) -> tuple[str, str, list[Any]]:
+    """
+    Сформировать части запроса для сортировки и постраничной выборки.
+    Возвращает условие выборки по ключу (after) для WHERE,
+    окончание запроса (ORDER BY, LIMIT, OFFSET) и параметры к ним
+    """
+    keyset = ''
+    tail = ''
+    params: list[Any] = []
+    if after is not None:
+        if len(after) != len(order_by):
+            raise ValueError("after should contain a value for each order_by field")
+        sign = '<' if desc else '>'
+        keyset = f"({', '.join(order_by)}) {sign} ({', '.join('?' * len(after))})"
+        params.extend(after)
+    if order_by:
+        direction = ' DESC' if desc else ''
+        tail += " ORDER BY " + ', '.join(f"{field}{direction}" for field in order_by)
+    if limit is not None or offset:
+        tail += " LIMIT ? OFFSET ?"
+        params.extend((-1 if limit is None else limit, offset))
+    return keyset, tail, params
+
+
+def _period_condition(date_field: str,
+                      start: datetime.datetime | None = None,
+                      end: datetime.datetime | None = None,
+                      date_format: str = DATE_FORMAT
+                      ) -> tuple[str, list[str]]:
+    """
+    Сформировать условие попадания даты date_field в период [start, end).
+    Границы могут быть не заданы. date_format - формат даты в колонке.
+    Возвращает условие и параметры к нему
+    """
+    conditions = []
+    params = []
+    if start is not None:
+        conditions.append(f"{date_field} >= ?")
+        params.append(start.strftime(date_format))
+    if end is not None:
+        conditions.append(f"{date_field} < ?")
+        params.append(end.strftime(date_format))
+    return ' AND '.join(conditions), params
+
+
+def migrate_dates_to_iso(con: sqlite3.Connection,
+                         table_name: str,
+                         columns: Iterable[str]) -> int:
+    """
+    Перевести даты в колонках columns таблицы table_name
+    из формата '%d-%m-%Y %H:%M' в формат DATE_FORMAT ('%Y-%m-%d %H:%M').
+    Возвращает количество изменённых значений
+    """
+    changed = 0
+    for col in columns:
+        query = f"UPDATE {table_name} SET {col} = " \
+                f"substr({col}, 7, 4) || '-' || substr({col}, 4, 2) || '-' " \
+                f"|| substr({col}, 1, 2) || substr({col}, 11) " \
+                f"WHERE {col} GLOB '[0-9][0-9]-[0-9][0-9]-[0-9][0-9][0-9][0-9]*'"
+        changed += con.execute(query).rowcount
+    return changed
+
+
+def create_daily_summary_table(con: sqlite3.Connection,
+                               table_name: str,
+                               group_by: tuple[str, ...] = ('category',),
+                               field: str = 'amount',
+                               date_field: str = 'expense_date') -> str:
+    """
+    Создать таблицу дневных итогов {table_name}_daily, если её ещё нет:
+    за каждый день по полям group_by - сумма значений поля field (total),
+    число непустых значений (count, как COUNT(field)) и число строк (n_rows).
+    Таблица поддерживается триггерами на вставку, изменение и удаление строк,
+    при создании заполняется по уже имеющимся строкам.
+    Колонка сумм не имеет типа, поэтому целые суммы (копейки, см. money)
+    складываются точно и остаются целыми.
+    Возвращает название таблицы итогов
+    """
+    summary = f"{table_name}_daily"
+    cols = ', '.join(group_by)
+    old_key = ' AND '.join(f"{col} = OLD.{col}" for col in group_by)
+    day = f"substr({{}}.{date_field}, 1, 10)"
+    insert_new = f"INSERT INTO {summary} (day, {cols}, total, count, n_rows) " \
+                 f"VALUES ({day.format('NEW')}, " \
+                 f"{', '.join('NEW.' + col for col in group_by)}, " \
+                 f"COALESCE(NEW.{field}, 0), NEW.{field} IS NOT NULL, 1) " \
+                 f"ON CONFLICT (day, {cols}) DO UPDATE " \
+                 f"SET total = total + excluded.total, " \
+                 f"count = count + excluded.count, n_rows = n_rows + 1;"
+    remove_old = f"UPDATE {summary} " \
+                 f"SET total = total - COALESCE(OLD.{field}, 0), " \
+                 f"count = count - (OLD.{field} IS NOT NULL), n_rows = n_rows - 1 " \
+                 f"WHERE day = {day.format('OLD')} AND {old_key}; " \
+                 f"DELETE FROM {summary} " \
+                 f"WHERE day = {day.format('OLD')} AND {old_key} AND n_rows <= 0;"
+    watched = ', '.join((date_field, field) + group_by)
+    exists = con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (summary,)
+    ).fetchone()
+    con.execute(f"CREATE TABLE IF NOT EXISTS {summary} "
+                f"(day TEXT, {cols}, total, count INTEGER, n_rows INTEGER, "
+                f"PRIMARY KEY (day, {cols}))")
+    if not exists:
+        con.execute(f"INSERT INTO {summary} (day, {cols}, total, count, n_rows) "
+                    f"SELECT substr({date_field}, 1, 10), {cols}, "
+                    f"COALESCE(SUM({field}), 0), COUNT({field}), COUNT(*) "
+                    f"FROM {table_name} "
+                    f"GROUP BY 1, {cols}")
+    con.execute(f"CREATE TRIGGER IF NOT EXISTS {summary}_insert "
+                f"AFTER INSERT ON {table_name} BEGIN {insert_new} END")
+    con.execute(f"CREATE TRIGGER IF NOT EXISTS {summary}_delete "
+                f"AFTER DELETE ON {table_name} BEGIN {remove_old} END")
+    con.execute(f"CREATE TRIGGER IF NOT EXISTS {summary}_update "
+                f"AFTER UPDATE OF {watched} ON {table_name} "
+                f"BEGIN {remove_old} {insert_new} END")
+    return summary
+
+
+def drop_daily_summary_table(con: sqlite3.Connection, table_name: str) -> None:
+    """
+    Удалить таблицу дневных итогов {table_name}_daily и её триггеры
+    """
+    summary = f"{table_name}_daily"
+    for action in ('insert', 'delete', 'update'):
+        con.execute(f"DROP TRIGGER IF EXISTS {summary}_{action}")
+    con.execute(f"DROP TABLE IF EXISTS {summary}")
+
+
+def _closure_cte(table_name: str, parent_field: str = 'parent') -> str:
+    """
+    Рекурсивный CTE closure(ancestor, descendant, depth): все пары
+    предок-потомок иерархии по полю parent_field, включая пары (pk, pk)
+    с глубиной 0. Глубина ограничена числом строк на случай циклов
+    """
+    return f"WITH RECURSIVE closure(ancestor, descendant, depth) AS (" \
+           f"SELECT pk, pk, 0 FROM {table_name} " \
+           f"UNION ALL " \
+           f"SELECT closure.ancestor, child.pk, closure.depth + 1 " \
+           f"FROM {table_name} AS child " \
+           f"JOIN closure ON child.{parent_field} = closure.descendant " \
+           f"WHERE closure.depth < (SELECT COUNT(*) FROM {table_name})) "
+
+
+def create_closure_table(con: sqlite3.Connection,
+                         table_name: str,
+                         parent_field: str = 'parent') -> str:
+    """
+    Создать таблицу связей {table_name}_closure (ancestor, descendant, depth),
+    если её ещё нет: для каждой строки - все её предки по полю parent_field
+    с расстоянием до них, включая саму строку с depth = 0.
+    Таблица поддерживается триггерами на добавление, удаление строк
+    и изменение parent_field (перенос поддерева), при создании
+    заполняется по уже имеющимся строкам.
+    Возвращает название таблицы связей
+    """
+    closure = f"{table_name}_closure"
+    detach = f"DELETE FROM {closure} " \
+             f"WHERE descendant IN " \
+             f"(SELECT descendant FROM {closure} WHERE ancestor = {{0}}) " \
+             f"AND ancestor NOT IN " \
+             f"(SELECT descendant FROM {closure} WHERE ancestor = {{0}});"
+    attach = f"INSERT INTO {closure} (ancestor, descendant, depth) " \
+             f"SELECT sup.ancestor, sub.descendant, sup.depth + sub.depth + 1 " \
+             f"FROM {closure} AS sup, {closure} AS sub " \
+             f"WHERE sup.descendant = NEW.{parent_field} AND sub.ancestor = NEW.pk;"
+    insert_new = f"INSERT INTO {closure} (ancestor, descendant, depth) " \
+                 f"VALUES (NEW.pk, NEW.pk, 0); " + attach
+    exists = con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (closure,)
+    ).fetchone()
+    con.execute(f"CREATE TABLE IF NOT EXISTS {closure} "
+                f"(ancestor INTEGER, descendant INTEGER, depth INTEGER, "
+                f"PRIMARY KEY (ancestor, descendant))")
+    con.execute(f"CREATE INDEX IF NOT EXISTS {closure}_descendant_idx "
+                f"ON {closure} (descendant, depth)")
+    if not exists:
+        con.execute(_closure_cte(table_name, parent_field)
+                    + f"INSERT OR IGNORE INTO {closure} "
+                      f"SELECT ancestor, descendant, MIN(depth) FROM closure "
+                      f"GROUP BY ancestor, descendant")
+    con.execute(f"CREATE TRIGGER IF NOT EXISTS {closure}_insert "
+                f"AFTER INSERT ON {table_name} BEGIN {insert_new} END")
+    con.execute(f"CREATE TRIGGER IF NOT EXISTS {closure}_delete "
+                f"AFTER DELETE ON {table_name} BEGIN "
+                f"{detach.format('OLD.pk')} "
+                f"DELETE FROM {closure} WHERE ancestor = OLD.pk; END")
+    con.execute(f"CREATE TRIGGER IF NOT EXISTS {closure}_update "
+                f"AFTER UPDATE OF {parent_field} ON {table_name} "
+                f"WHEN OLD.{parent_field} IS NOT NEW.{parent_field} "
+                f"BEGIN {detach.format('NEW.pk')} {attach} END")
+    return closure
 
 
 class DataExpenseRow:
@@ -244,11 +926,16 @@ class DataExpenseRow:
     Класс описывающий тип строки репозитория
     Проверка на правильный тип полей
     названия полей совпадают с названиями колонок репозитория
+    Дата расхода хранится строкой expense_date в формате DATE_FORMAT,
+    как datetime она доступна в timestamp
     """
 
     def __init__(self, expense: Expense = Expense()) -> None:
         self.pk = int(expense.pk)
-        self.expense_date = expense.expense_date.strftime('%d-%m-%Y %H:%M')
+        self.expense_date = expense.expense_date.strftime(DATE_FORMAT)
+        # дата уже известна, строку разбирать не нужно
+        self._timestamp = (self.expense_date,
+                           expense.expense_date.replace(second=0, microsecond=0))
 
         if not isinstance(expense.category, int):
             raise TypeError("Only int category allowed")
@@ -264,7 +951,18 @@ class DataExpenseRow:
             raise TypeError("Only str commentary allowed")
         self.comment = expense.comment
 
-        self.added_date = expense.added_date.strftime('%d-%m-%Y %H:%M')
+        self.added_date = expense.added_date.strftime(DATE_FORMAT)
+
+    @property
+    def timestamp(self) -> datetime.datetime:
+        """
+        Дата расхода как datetime. Строка expense_date (например, прочитанная
+        из репозитория) разбирается один раз, пока она не изменится
+        """
+        if self._timestamp[0] != self.expense_date:
+            self._timestamp = (self.expense_date,
+                               datetime.datetime.strptime(self.expense_date, DATE_FORMAT))
+        return self._timestamp[1]
 
     def display(self) -> None:
         """
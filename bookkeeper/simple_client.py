@@ -5,9 +5,12 @@ from bookkeeper.models.category import Category
 from bookkeeper.models.expense import Expense
 from bookkeeper.repository.memory_repository import MemoryRepository
 from bookkeeper.utils import read_tree
-from bookkeeper.repository.sqlite_repository import SQLiteRepository
 
-exp_repo = MemoryRepository[Expense]()
+EXPENSES_SNAPSHOT = 'expenses.snapshot'
+
+exp_repo = MemoryRepository[Expense](indexed_fields=('category',),
+                                     journal='expenses.journal')
+exp_repo.restore(EXPENSES_SNAPSHOT)
 
 cats = '''
 продукты
@@ -18,9 +21,7 @@ cats = '''
 книги
 одежда
 '''.splitlines()
-fields = ('pk', 'name', 'parent')
-types = ('INTEGER PRIMARY KEY', 'TEXT', 'INTEGER')
-cat_repo = SQLiteRepository("test_db.db", "TestCat", fields, types, Category)
+cat_repo = MemoryRepository[Category](indexed_fields=('name', 'parent'))
 Category.create_from_tree(read_tree(cats), cat_repo)
 
 while True:
@@ -44,3 +45,6 @@ while True:
         exp = Expense(int(amount), cat.pk)
         exp_repo.add(exp)
         print(exp)
+
+exp_repo.snapshot(EXPENSES_SNAPSHOT)
+exp_repo.close()
@@ -2,6 +2,7 @@
 Вспомогательные функции
 """
 
+from datetime import date, datetime, time, timedelta
 from typing import Iterable, Iterator
 
 
@@ -61,3 +62,28 @@ def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
         last_name = name
         last_indent = indent
     return result
+
+
+def period_bounds(period: str,
+                  day: date | None = None) -> tuple[datetime, datetime]:
+    """
+    Получить границы периода, содержащего день day: [начало, конец).
+    period - 'day', 'week' (неделя с понедельника), 'month' или 'year'.
+    По умолчанию day - сегодняшний день.
+    """
+    day = date.today() if day is None else day
+    if period == 'day':
+        start = day
+        end = day + timedelta(days=1)
+    elif period == 'week':
+        start = day - timedelta(days=day.weekday())
+        end = start + timedelta(days=7)
+    elif period == 'month':
+        start = day.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1)
+    elif period == 'year':
+        start = day.replace(month=1, day=1)
+        end = start.replace(year=start.year + 1)
+    else:
+        raise ValueError(f'unknown period {period}')
+    return datetime.combine(start, time()), datetime.combine(end, time())
@@ -5,14 +5,36 @@
 # # pylint: disable=c-extension-no-member
 # pylint: disable=too-few-public-methods
 # pylint: disable=too-many-instance-attributes
-from typing import Any, Union
-from PySide6.QtCore import QAbstractTableModel, Qt, QSize
+from functools import partial
+from typing import Any, Callable, Iterable, Union
+from PySide6.QtCore import QAbstractTableModel, Qt, QSize, QObject, Signal, Slot
 from PySide6.QtCore import QModelIndex, QPersistentModelIndex
 from PySide6.QtWidgets import QMainWindow, QTableView, QPushButton
 from PySide6.QtWidgets import QVBoxLayout, QWidget, QLineEdit
 from PySide6.QtWidgets import QHBoxLayout, QLabel, QFrame
 from PySide6.QtWidgets import QTabWidget, QHeaderView, QTextEdit, QComboBox
 from bookkeeper.models.category import Category
+from bookkeeper.money import Money
+
+
+class Dispatcher(QObject):
+    """
+    Передаёт функции из других потоков в поток, где создан Dispatcher
+    (поток GUI): dispatcher(func) вызывает func() в этом потоке через
+    сигнал Qt. Используется как dispatch в AsyncRepository
+    """
+    called = Signal(object)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.called.connect(self._call)  # type: ignore[attr-defined]
+
+    def __call__(self, func: Callable[[], None]) -> None:
+        self.called.emit(func)  # type: ignore[attr-defined]
+
+    @Slot(object)
+    def _call(self, func: Callable[[], None]) -> None:
+        func()
 
 
 class ExpenseTableModel(QAbstractTableModel):
@@ -26,12 +48,38 @@ class ExpenseTableModel(QAbstractTableModel):
         setData
     Взято из:
     https://www.pythonguis.com/faq/editing-pyqt-tableview/
+
+    Если задана функция fetch, строки подгружаются порциями по мере прокрутки
+    таблицы (canFetchMore/fetchMore). fetch(last_row, batch_size, done) должна
+    получить не более batch_size строк, следующих за last_row - последней
+    загруженной строкой (cursor, None - первые batch_size строк), и передать
+    их в done сразу или позже, например из рабочего потока через Dispatcher.
+    done(None) - загрузка не удалась, её можно повторить. Если строк меньше
+    batch_size, считается, что строк больше нет. Пока строки загружаются,
+    новые не запрашиваются. Если за это время в конец модели вставлена строка или
+    вызван discard_fetch, загруженные строки отбрасываются.
+    Строки могут содержать служебные колонки после показываемых (см. columns).
+    Суммы показываются в представлении money (см. Money.display).
     """
 
-    def __init__(self, repo: list[list[str]]) -> None:
+    def __init__(self, repo: list[list[str]],
+                 fetch: Callable[[list[str] | None, int,
+                                  Callable[[list[list[str]] | None], None]],
+                                 None] | None = None,
+                 batch_size: int = 200,
+                 money: Money = Money()) -> None:
         super().__init__()
         self._data = repo
+        self.money = money
         self.columns = ["pk", "expense_date", "amount", "category", "comment"]
+        self._fetch = fetch
+        self.batch_size = batch_size
+        self._exhausted = fetch is None or len(repo) < batch_size
+        # последняя загруженная строка: строки модели могут удаляться
+        # и переставляться, а следующая порция идёт за ней
+        self._cursor = list(repo[-1]) if repo else None
+        self._fetching = False
+        self._generation = 0
 
     def data(self, index: Union[QModelIndex, QPersistentModelIndex],
              role: int = Qt.ItemDataRole.DisplayRole) -> str | None:
@@ -42,6 +90,8 @@ class ExpenseTableModel(QAbstractTableModel):
         if index.isValid():
             if role in [Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole]:
                 value = self._data[index.row()][index.column()]
+                if self.columns[index.column()] == 'amount':
+                    value = self.money.display(value)
                 return str(value)
         return None
 
@@ -57,7 +107,91 @@ class ExpenseTableModel(QAbstractTableModel):
         Кол-во колонок
         Родительский метод, который необходимо реализовать
         """
-        return len(self._data[0])
+        return len(self.columns)
+
+    def canFetchMore(self, parent: Any = QModelIndex()) -> bool:
+        """
+        Есть ли ещё не загруженные строки
+        Родительский метод
+        """
+        if parent.isValid():
+            return False
+        return not self._exhausted and not self._fetching
+
+    @property
+    def exhausted(self) -> bool:
+        """ Загружены ли все строки """
+        return self._exhausted
+
+    @property
+    def cursor(self) -> list[str] | None:
+        """ Последняя загруженная строка, None - строки не загружались """
+        return self._cursor
+
+    def fetchMore(self, parent: Any = QModelIndex()) -> None:
+        """
+        Запросить следующую порцию строк
+        Родительский метод, вызывается таблицей при прокрутке
+        """
+        if not self.canFetchMore(parent) or self._fetch is None:
+            return
+        self._fetching = True
+        self._fetch(self._cursor, self.batch_size,
+                    partial(self._fetched, self._generation))
+
+    def _fetched(self, generation: int, rows: list[list[str]] | None) -> None:
+        """ Добавить загруженные строки, если запрос не отброшен """
+        if generation != self._generation:
+            return
+        self._fetching = False
+        if rows is None:
+            return
+        if len(rows) < self.batch_size:
+            self._exhausted = True
+        if not rows:
+            return
+        self._cursor = list(rows[-1])
+        first = len(self._data)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._data.extend(rows)
+        self.endInsertRows()
+
+    def discard_fetch(self) -> None:
+        """
+        Отбросить строки выполняемого запроса: они запрашивались
+        до изменения, которое должно в них попасть
+        """
+        self._generation += 1
+        self._fetching = False
+
+    def insert_row(self, position: int, row: list[str]) -> None:
+        """
+        Вставить строку row перед строкой с номером position
+        """
+        if position == len(self._data):
+            self.discard_fetch()
+        self.beginInsertRows(QModelIndex(), position, position)
+        self._data.insert(position, row)
+        self.endInsertRows()
+
+    def remove_rows(self, rows: Iterable[int]) -> None:
+        """
+        Удалить строки с номерами rows.
+        Подряд идущие строки удаляются одним блоком
+        """
+        for first, last in reversed(_row_ranges(rows)):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._data[first:last + 1]
+            self.endRemoveRows()
+
+    def replace_row(self, row_num: int, row: list[str]) -> None:
+        """
+        Заменить строку с номером row_num на row
+        """
+        self._data[row_num] = row
+        self.dataChanged.emit(  # type: ignore[attr-defined]
+            self.index(row_num, 0), self.index(row_num, len(self.columns) - 1)
+        )
 
     def setData(self,
                 index: Union[QModelIndex, QPersistentModelIndex],
@@ -97,6 +231,19 @@ class ExpenseTableModel(QAbstractTableModel):
         return None
 
 
+def _row_ranges(rows: Iterable[int]) -> list[tuple[int, int]]:
+    """
+    Разбить номера строк на отрезки подряд идущих: [(первая, последняя), ...]
+    """
+    ranges: list[tuple[int, int]] = []
+    for row in sorted(set(rows)):
+        if ranges and ranges[-1][1] == row - 1:
+            ranges[-1] = (ranges[-1][0], row)
+        else:
+            ranges.append((row, row))
+    return ranges
+
+
 class ExpenseWidget(QWidget):
     """
     Описывает графический интерфейс вкоадки Expense
@@ -155,6 +302,7 @@ class BudgetModel(QAbstractTableModel):
     """
     Модель таблицы бюджета.
     Данные не редактируются на прямую!
+    Суммы показываются в представлении money (см. Money.display).
     Необходимо обязательно реализовать 4 родительских метода:
         data
         rowCount
@@ -162,9 +310,10 @@ class BudgetModel(QAbstractTableModel):
         setData
     """
 
-    def __init__(self, repo: list[list[float]]) -> None:
+    def __init__(self, repo: list[list[float]], money: Money = Money()) -> None:
         super().__init__()
         self._data = repo
+        self.money = money
         self.columns = ["Budget", "Expenses", "Delta"]
         self.rows = ["day", "week", "month"]
 
@@ -183,12 +332,13 @@ class BudgetModel(QAbstractTableModel):
         return len(self._data[0])
 
     def data(self, index: Union[QModelIndex, QPersistentModelIndex],
-             role: int = Qt.ItemDataRole.DisplayRole) -> float | None:
+             role: int = Qt.ItemDataRole.DisplayRole) -> float | str | None:
         """
         Родительский метод, который необходимо реализовать
         """
         if role == Qt.ItemDataRole.DisplayRole:
-            return self._data[index.row()][index.column()]
+            value: float | str = self._data[index.row()][index.column()]
+            return self.money.display(value)
         return None
 
     def headerData(self,
@@ -213,6 +363,7 @@ class BudgetWidget(QWidget):
     table_budget - таблица бюджета
     table_cat_expenses - таблица расходов за период по категориям
     cat_day_expense_button - выставляет период == день в таблице расходов по категориям
+    cat_week_expense_button - выставляет период == неделя в таблице расходов по категориям
     month_day_expense_button - выставляет период == месяц в таблице расходов по категориям
     line_day_budget - поле ввода бюджета на день
     line_week_budget - поле ввода бюджета за неделю
@@ -237,6 +388,8 @@ class BudgetWidget(QWidget):
         label_buttons = QLabel("Expenses by categories in the period:")
         self.cat_day_expense_button = QPushButton("day")
         self.cat_day_expense_button.setCheckable(True)
+        self.cat_week_expense_button = QPushButton("week")
+        self.cat_week_expense_button.setCheckable(True)
         self.cat_month_expense_button = QPushButton("month")
         self.cat_month_expense_button.setCheckable(True)
 
@@ -254,6 +407,7 @@ class BudgetWidget(QWidget):
         cat_expense_buttons_layout.addLayout(buttons_layout)
 
         buttons_layout.addWidget(self.cat_day_expense_button)
+        buttons_layout.addWidget(self.cat_week_expense_button)
         buttons_layout.addWidget(self.cat_month_expense_button)
 
         self.page_budget_layout.addWidget(self.table_budget)
@@ -282,6 +436,7 @@ class CatExpenseModel(QAbstractTableModel):
     """
     Модель таблицы расходов по категориям за некоторый период
     Данные не редактируются на прямую!
+    Суммы показываются в представлении money (см. Money.display).
     Необходимо обязательно реализовать 4 родительских метода:
         data
         rowCount
@@ -289,9 +444,11 @@ class CatExpenseModel(QAbstractTableModel):
         setData
     """
 
-    def __init__(self, repo: list[list[Union[str, float]]]) -> None:
+    def __init__(self, repo: list[list[Union[str, float]]],
+                 money: Money = Money()) -> None:
         super().__init__()
         self._data = repo
+        self.money = money
         self.columns = ["Categories", "Expenses"]
 
     def rowCount(self, parent: Any = QModelIndex) -> int:
@@ -314,7 +471,8 @@ class CatExpenseModel(QAbstractTableModel):
         Родительский метод, который необходимо реализовать
         """
         if role == Qt.ItemDataRole.DisplayRole:
-            return self._data[index.row()][index.column()]
+            value: Union[str, float] = self._data[index.row()][index.column()]
+            return self.money.display(value) if index.column() == 1 else value
         return None
 
     def headerData(self, section: int,
@@ -354,16 +512,17 @@ class MainWindow(QMainWindow):
     """
     Интерфейс приложения
     Входные параметры:
-        repo_expense - данные для таблицы Expenses
+        repo_expense - модель таблицы Expenses
         repo_budget - данные для таблицы Budget
+        money - представление сумм в таблице Budget
     Атрибуты:
         expense - вкладка Expense
         budget - вкладка Budget
         category - вкладка Category
     """
 
-    def __init__(self, repo_expense: list[list[str]], repo_budget: list[list[float]],
-                 ) -> None:
+    def __init__(self, repo_expense: ExpenseTableModel, repo_budget: list[list[float]],
+                 money: Money = Money()) -> None:
         super().__init__()
 
         if repo_budget is None:
@@ -374,8 +533,7 @@ class MainWindow(QMainWindow):
         '''Make Expense Page Widgets'''
 
         self.expense = ExpenseWidget()
-        expense_model = ExpenseTableModel(repo_expense)
-        self.expense.expense_table.setModel(expense_model)
+        self.expense.expense_table.setModel(repo_expense)
 
         page_expense = QFrame()
         page_expense.setLayout(self.expense.page_expense_layout)
@@ -396,7 +554,7 @@ class MainWindow(QMainWindow):
         '''Make Budget page Widgets'''
 
         self.budget = BudgetWidget()
-        budget_model = BudgetModel(repo_budget)
+        budget_model = BudgetModel(repo_budget, money)
         self.budget.table_budget.setModel(budget_model)
 
         page_budget = QFrame()
@@ -419,7 +577,7 @@ class MainWindow(QMainWindow):
 
         self.setCentralWidget(pages)
 
-    def set_line_category(self, category_data: list[Category]) -> None:
+    def set_line_category(self, category_data: Iterable[Category]) -> None:
         """
         Заполняет выпадающий список категориями(вкладка Expenses)
         """
@@ -0,0 +1,148 @@
+"""
+Тесты для сумм расходов за периоды бюджета
+"""
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.budget_totals import BudgetTotals
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import RepositoryEvent
+from bookkeeper.repository.sqlite_repository import DataExpenseRow, SQLiteRepository
+
+
+class Expenses:
+    """ Расходы в виде списка (дата, сумма) и счётчик вызовов load """
+
+    def __init__(self, data):
+        self.data = data
+        self.loads = 0
+
+    def load(self, start, end):
+        self.loads += 1
+        return sum(amount for day, amount in self.data if start <= day < end)
+
+
+@pytest.fixture
+def expenses():
+    return Expenses([
+        (datetime(2023, 3, 15, 12), 10),  # среда
+        (datetime(2023, 3, 13, 9), 20),  # понедельник той же недели
+        (datetime(2023, 3, 1), 40),
+        (datetime(2023, 2, 28), 80),
+    ])
+
+
+@pytest.fixture
+def today():
+    class Today:
+        value = date(2023, 3, 15)
+
+        def __call__(self):
+            return self.value
+
+    return Today()
+
+
+def test_initial_totals(expenses, today):
+    totals = BudgetTotals(expenses.load, today)
+    assert (totals.day, totals.week, totals.month) == (10, 30, 70)
+    assert expenses.loads == 3
+
+
+def test_add_remove_update(expenses, today):
+    totals = BudgetTotals(expenses.load, today)
+    totals.add(datetime(2023, 3, 15, 20), 1)
+    totals.add(datetime(2023, 3, 2), 2)
+    totals.add(datetime(2023, 1, 2), 4)
+    assert (totals.day, totals.week, totals.month) == (11, 31, 73)
+    totals.remove(datetime(2023, 3, 13, 9), 20)
+    assert (totals.day, totals.week, totals.month) == (11, 11, 53)
+    totals.update(datetime(2023, 3, 15, 12), 10, datetime(2023, 3, 14), 100)
+    assert (totals.day, totals.week, totals.month) == (1, 101, 143)
+    assert expenses.loads == 3
+
+
+def test_roll_over_day(expenses, today):
+    totals = BudgetTotals(expenses.load, today)
+    totals.add(datetime(2023, 3, 16, 8), 5)
+    expenses.data.append((datetime(2023, 3, 16, 8), 5))
+    today.value = date(2023, 3, 16)
+    assert (totals.day, totals.week, totals.month) == (5, 35, 75)
+    # пересчитана только сумма за день
+    assert expenses.loads == 4
+
+
+def test_roll_over_month(expenses, today):
+    totals = BudgetTotals(expenses.load, today)
+    today.value = date(2023, 4, 1)
+    assert (totals.day, totals.week, totals.month) == (0, 0, 0)
+    totals.add(datetime(2023, 3, 31), 1)
+    assert totals.week == 1
+    assert totals.month == 0
+
+
+def test_refresh(expenses, today):
+    totals = BudgetTotals(expenses.load, today)
+    expenses.data.append((datetime(2023, 3, 15), 1))
+    totals.refresh()
+    assert totals.day == 11
+
+
+def test_handle(expenses, today):
+    totals = BudgetTotals(expenses.load, today)
+
+    class Row:
+        def __init__(self, expense_date, amount):
+            self.expense_date = expense_date
+            self.amount = amount
+
+    old = Row('2023-03-15 12:00', 10)
+    new = Row(datetime(2023, 3, 14), 100)
+    totals.handle(RepositoryEvent('added', 1, new=old))
+    assert (totals.day, totals.week, totals.month) == (20, 40, 80)
+    totals.handle(RepositoryEvent('updated', 1, old, new))
+    assert (totals.day, totals.week, totals.month) == (10, 130, 170)
+    totals.handle(RepositoryEvent('deleted', 1, new))
+    assert (totals.day, totals.week, totals.month) == (10, 30, 70)
+    expenses.data.append((datetime(2023, 3, 15), 1))
+    totals.handle(RepositoryEvent('reset', 0))
+    assert (totals.day, totals.week, totals.month) == (11, 31, 71)
+
+
+def test_change_on_new_day(expenses, today):
+    totals = BudgetTotals(expenses.load, today)
+    today.value = date(2023, 3, 16)
+    # изменение уже записано, когда о нём сообщают
+    expenses.data.append((datetime(2023, 3, 16, 8), 5))
+    totals.add(datetime(2023, 3, 16, 8), 5)
+    assert (totals.day, totals.week, totals.month) == (5, 35, 75)
+    assert expenses.loads == 4
+
+
+def test_change_on_new_month(expenses, today):
+    totals = BudgetTotals(expenses.load, today)
+    today.value = date(2023, 4, 1)
+    old = (datetime(2023, 3, 15, 12), 10)
+    expenses.data.remove(old)
+    expenses.data.append((datetime(2023, 4, 1, 9), 7))
+    totals.update(*old, datetime(2023, 4, 1, 9), 7)
+    assert (totals.day, totals.week, totals.month) == (7, 7, 7)
+    assert expenses.loads == 6
+
+
+def test_sqlite_events_on_new_day(tmp_path, today):
+    fields = ('pk', 'added_date', 'expense_date', 'category', 'amount', 'comment')
+    types = ('INTEGER PRIMARY KEY', 'TIMESTAMP', 'TIMESTAMP', 'TEXT', 'REAL', 'TEXT')
+    with SQLiteRepository(str(tmp_path / 'totals.db'), 'expense_table',
+                          fields, types, DataExpenseRow) as repo:
+        totals = BudgetTotals(repo.get_period_sum, today)
+        repo.subscribe(totals.handle)
+        today.value = date(2023, 3, 16)
+        repo.add(DataExpenseRow(Expense(expense_date=datetime(2023, 3, 16, 8),
+                                        category=1, amount=10)))
+        assert totals.day == 10
+        today.value = date(2023, 4, 1)
+        repo.add(DataExpenseRow(Expense(expense_date=datetime(2023, 4, 1, 8),
+                                        category=1, amount=3)))
+        assert (totals.day, totals.month) == (3, 3)
@@ -0,0 +1,162 @@
+"""
+Тесты для синхронизации списка категорий с репозиторием
+"""
+from datetime import datetime
+
+import pytest
+
+from bookkeeper.category_sync import sync_categories, merge_categories, split_category
+from bookkeeper.models.category import Category, CategoryTree
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.connection_pool import ConnectionPool
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository, DataExpenseRow
+from bookkeeper.utils import read_tree
+
+
+@pytest.fixture
+def repos(tmp_path):
+    db_file = str(tmp_path / "sync.db")
+    with ConnectionPool(db_file) as pool:
+        cat_repo = SQLiteRepository(db_file, "categories_table", ('pk', 'name', 'parent'),
+                                    ('INTEGER PRIMARY KEY', 'TEXT', 'INTEGER'), Category,
+                                    pool=pool)
+        exp_repo = SQLiteRepository(
+            db_file, "expense_table",
+            ('pk', 'added_date', 'expense_date', 'category', 'amount', 'comment'),
+            ('INTEGER PRIMARY KEY', 'TIMESTAMP', 'TIMESTAMP', 'TEXT', 'REAL', 'TEXT'),
+            DataExpenseRow, pool=pool, indexes=(('category',),))
+        yield cat_repo, exp_repo
+
+
+def tree(text):
+    return read_tree(text.splitlines())
+
+
+def expense_names(cat_repo, exp_repo):
+    names = CategoryTree(cat_repo.get_all()).nodes
+    return [names[int(row.category)].name for row in exp_repo.get_all()]
+
+
+def test_sync_keeps_pks(repos):
+    cat_repo, exp_repo = repos
+    sync_categories(tree("""
+        food
+            meat
+            sweets
+        books
+    """), cat_repo, exp_repo)
+    before = CategoryTree(cat_repo.get_all()).pk_by_name
+    assert set(before) == {'food', 'meat', 'sweets', 'books', 'Not stated'}
+    exp_repo.add_many(DataExpenseRow(Expense(expense_date=datetime(2023, 1, 1),
+                                             category=before[name], amount=1))
+                      for name in ['meat', 'sweets', 'books', 'food'])
+    deleted = sync_categories(tree("""
+        food
+            sweets
+                cakes
+        books
+            meat
+    """), cat_repo, exp_repo)
+    after = CategoryTree(cat_repo.get_all())
+    assert deleted == []
+    assert {name: after.pk_by_name[name] for name in before} == before
+    assert after.get_by_name('meat').parent == before['books']
+    assert after.get_by_name('cakes').parent == before['sweets']
+    assert expense_names(cat_repo, exp_repo) == ['meat', 'sweets', 'books', 'food']
+
+
+def test_sync_reassigns_deleted(repos):
+    cat_repo, exp_repo = repos
+    sync_categories(tree("""
+        food
+            meat
+        books
+    """), cat_repo, exp_repo)
+    pks = CategoryTree(cat_repo.get_all()).pk_by_name
+    exp_repo.add_many(DataExpenseRow(Expense(expense_date=datetime(2023, 1, 1),
+                                             category=pks[name], amount=1))
+                      for name in ['meat', 'books', 'food'])
+    deleted = sync_categories(tree("""
+        clothes
+        books
+    """), cat_repo, exp_repo)
+    assert sorted(deleted) == sorted([pks['food'], pks['meat']])
+    assert sorted(cat.name for cat in cat_repo.get_all()) \
+        == ['Not stated', 'books', 'clothes']
+    assert expense_names(cat_repo, exp_repo) == ['Not stated', 'books', 'Not stated']
+
+
+def test_sync_is_atomic(repos):
+    cat_repo, exp_repo = repos
+    sync_categories(tree("food"), cat_repo, exp_repo)
+    before = cat_repo.get_all()
+
+    def fail(*args):
+        raise RuntimeError
+
+    exp_repo.update_field = fail
+    with pytest.raises(RuntimeError):
+        sync_categories(tree("books"), cat_repo, exp_repo)
+    assert cat_repo.get_all() == before
+
+
+@pytest.fixture
+def memory_repos():
+    cat_repo = MemoryRepository()
+    exp_repo = MemoryRepository()
+    cats = {cat.name: cat.pk for cat in Category.create_from_tree(tree("""
+        food
+            meat
+                steak
+            sweets
+        books
+    """), cat_repo)}
+    exp_repo.add_many(Expense(category=cats[name], amount=1, comment=comment)
+                      for name, comment in [('meat', 'a'), ('sweets', 'b'),
+                                            ('books', 'a'), ('food', 'b')])
+    return cat_repo, exp_repo, cats
+
+
+def test_merge_categories(memory_repos):
+    cat_repo, exp_repo, cats = memory_repos
+    assert merge_categories([cats['meat'], cats['sweets']], cats['books'],
+                            cat_repo, exp_repo) == 2
+    assert [row.category for row in exp_repo.get_all()] \
+        == [cats['books'], cats['books'], cats['books'], cats['food']]
+    assert sorted(cat.name for cat in cat_repo.get_all()) == ['books', 'food', 'steak']
+    assert cat_repo.get_by_pk(cats['steak']).parent == cats['books']
+
+
+def test_merge_into_subcategory(memory_repos):
+    cat_repo, exp_repo, cats = memory_repos
+    merge_categories([cats['food'], cats['meat']], cats['steak'], cat_repo, exp_repo)
+    tree_ = CategoryTree(cat_repo.get_all())
+    assert tree_.get_by_name('steak').parent is None
+    assert tree_.get_by_name('sweets').parent == cats['steak']
+
+
+def test_split_category(memory_repos):
+    cat_repo, exp_repo, cats = memory_repos
+    exp_repo.update_field('category', [cats['sweets'], cats['books']], cats['food'])
+    assert split_category(cats['food'], {cats['sweets']: {'comment': 'b'},
+                                         cats['books']: {'comment': 'c'}},
+                          exp_repo) == 2
+    assert [row.category for row in exp_repo.get_all()] \
+        == [cats['meat'], cats['sweets'], cats['food'], cats['sweets']]
+
+
+def test_merge_categories_sqlite(repos):
+    cat_repo, exp_repo = repos
+    sync_categories(tree("""
+        food
+            meat
+        books
+    """), cat_repo, exp_repo)
+    pks = CategoryTree(cat_repo.get_all()).pk_by_name
+    exp_repo.add_many(DataExpenseRow(Expense(expense_date=datetime(2023, 1, 1),
+                                             category=pks[name], amount=1))
+                      for name in ['meat', 'books', 'food'])
+    assert merge_categories([pks['food']], pks['meat'], cat_repo, exp_repo) == 1
+    assert expense_names(cat_repo, exp_repo) == ['meat', 'books', 'meat']
+    assert cat_repo.get_by_pk(pks['meat']).parent is None
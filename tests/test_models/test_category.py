@@ -5,8 +5,9 @@ from inspect import isgenerator
 
 import pytest
 
-from bookkeeper.models.category import Category
+from bookkeeper.models.category import Category, CategoryTree
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
 
 
 @pytest.fixture
@@ -106,3 +107,86 @@ def test_create_from_tree_error(repo):
     tree = [('1', 'parent'), ('parent', None)]
     with pytest.raises(KeyError):
         Category.create_from_tree(tree, repo)
+
+
+def test_create_from_tree_batches_by_level(repo):
+    tree = [('a', None), ('b', None), ('a1', 'a'), ('a2', 'a'), ('a11', 'a1')]
+    batches = []
+    add_many = repo.add_many
+    repo.add_many = lambda objs: batches.append(list(objs)) or add_many(batches[-1])
+    cats = Category.create_from_tree(tree, repo)
+    assert [[c.name for c in batch] for batch in batches] == \
+        [['a', 'b'], ['a1', 'a2'], ['a11']]
+    by_name = {c.name: c for c in cats}
+    assert by_name['a11'].parent == by_name['a1'].pk
+    assert by_name['a2'].parent == by_name['a'].pk
+
+
+@pytest.fixture
+def tree(repo):
+    Category.create_from_tree([('a', None), ('b', 'a'), ('c', 'b'), ('d', 'b'),
+                               ('e', 'a'), ('f', None)], repo)
+    return CategoryTree(repo.get_all())
+
+
+def test_category_tree_lookups(tree):
+    assert len(tree) == 6
+    b = tree.get_by_name('b')
+    assert tree.pk_by_name['b'] == b.pk
+    assert tree.get_by_pk(b.pk) is b
+    assert tree.get_by_name('unknown') is None
+    assert [cat.name for cat in tree.children[b.pk]] == ['c', 'd']
+    assert [cat.name for cat in tree.children[None]] == ['a', 'f']
+    assert [cat.name for cat in tree] == ['a', 'f', 'b', 'e', 'c', 'd']
+
+
+def test_category_tree_hierarchy(tree):
+    c = tree.get_by_name('c')
+    assert [cat.name for cat in tree.get_ancestors(c.pk)] == ['b', 'a']
+    assert [cat.name for cat in tree.get_ancestors(c.pk, include_self=True)] \
+        == ['c', 'b', 'a']
+    a = tree.get_by_name('a')
+    assert [cat.name for cat in tree.get_descendants(a.pk)] == ['b', 'e', 'c', 'd']
+    assert [cat.name for cat in tree.get_descendants(a.pk, include_self=True)] \
+        == ['a', 'b', 'e', 'c', 'd']
+    assert [cat.name for cat in c.get_all_parents(tree)] == ['b', 'a']
+    assert [cat.name for cat in a.get_subcategories(tree)] == ['b', 'e', 'c', 'd']
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'sqlite_closure'])
+def any_repo(request, tmp_path):
+    if request.param == 'memory':
+        yield MemoryRepository()
+        return
+    with SQLiteRepository(str(tmp_path / 'tree.db'), 'categories_table',
+                          ('pk', 'name', 'parent'),
+                          ('INTEGER PRIMARY KEY', 'TEXT', 'INTEGER'),
+                          Category) as sqlite_repo:
+        if request.param == 'sqlite_closure':
+            sqlite_repo.create_closure()
+        yield sqlite_repo
+
+
+def test_get_subcategories_order(any_repo):
+    """
+    порядок подкатегорий одинаков во всех репозиториях: по уровням, затем по pk
+    """
+    cats = {cat.name: cat for cat in Category.create_from_tree(
+        [('a', None), ('b', 'a'), ('c', 'b'), ('d', 'b'), ('e', 'a'), ('f', 'e'),
+         ('g', None)], any_repo)}
+    expected = ['b', 'e', 'c', 'd', 'f']
+    assert [cat.name for cat in cats['a'].get_subcategories(any_repo)] == expected
+    tree = CategoryTree(any_repo.get_all())
+    assert [cat.name for cat in cats['a'].get_subcategories(tree)] == expected
+    assert [cat.name for cat in cats['b'].get_subcategories(any_repo)] == ['c', 'd']
+
+
+def test_category_tree_cycle():
+    tree = CategoryTree([Category('a', 2, 1), Category('b', 1, 2)])
+    assert [cat.name for cat in tree.get_ancestors(1)] == ['b', 'a']
+    assert [cat.name for cat in tree.get_descendants(1)] == ['b']
+
+
+def test_category_tree_render(tree):
+    assert tree.render() == 'a \n\tb \n\t\tc \n\t\td \n\te \nf \n'
+    assert tree.render(indent='  ', skip=('a',)) == 'f \n'
@@ -0,0 +1,35 @@
+"""
+Тесты для представления денежных сумм
+"""
+import pytest
+
+from bookkeeper.money import Money
+
+
+def test_float_mode():
+    money = Money()
+    assert money.sql_type == 'REAL'
+    assert money.parse('12.5') == 12.5
+    assert money.display(12.5) == 12.5
+    assert money.display(300) == 300
+
+
+def test_cents_mode():
+    money = Money(cents=True)
+    assert money.sql_type == 'INTEGER'
+    assert money.parse('12.5') == 1250
+    assert money.parse(' 0.1 ') == 10
+    assert money.parse('0.005') == 1
+    assert money.parse('7') == 700
+    assert money.display(1250) == '12.50'
+    assert money.display(5) == '0.05'
+    assert money.display(-105) == '-1.05'
+    # строки и нецелые значения показываются как есть
+    assert money.display('1500') == '1500'
+    assert money.display(1.5) == 1.5
+
+
+@pytest.mark.parametrize('text', ['abc', '', 'nan', 'inf'])
+def test_cents_parse_wrong(text):
+    with pytest.raises(ValueError):
+        Money(cents=True).parse(text)
@@ -0,0 +1,135 @@
+import datetime
+import os
+import threading
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtCore import Qt  # noqa: E402
+from PySide6.QtWidgets import QApplication, QMessageBox  # noqa: E402
+
+from bookkeeper.models.budget import Budget  # noqa: E402
+from bookkeeper.models.category import Category  # noqa: E402
+from bookkeeper.models.expense import Expense  # noqa: E402
+from bookkeeper import presenter as presenter_module  # noqa: E402
+from bookkeeper.presenter import Presenter, desc_insert_position  # noqa: E402
+from bookkeeper.repository.connection_pool import ConnectionPool  # noqa: E402
+from bookkeeper.repository.sqlite_repository import DataExpenseRow  # noqa: E402
+from bookkeeper.repository.sqlite_repository import SQLiteRepository  # noqa: E402
+
+
+def row(pk, date):
+    return [str(pk), '', '', '', '', date]
+
+
+def test_desc_insert_position():
+    data = [row(5, '2023-03-03'), row(4, '2023-03-02'), row(2, '2023-03-02'),
+            row(1, '2023-03-01')]
+    assert desc_insert_position(data, row(6, '2023-03-04')) == 0
+    assert desc_insert_position(data, row(3, '2023-03-02')) == 2
+    assert desc_insert_position(data, row(6, '2023-03-02')) == 1
+    assert desc_insert_position(data, row(0, '2023-02-28')) == 4
+    assert desc_insert_position([], row(1, '2023-03-01')) == 0
+
+
+BASE = datetime.datetime(2023, 3, 1)
+
+
+@pytest.fixture
+def presenter(tmp_path, monkeypatch):
+    monkeypatch.setattr('bookkeeper.presenter.EXPENSE_PAGE_SIZE', 5)
+    app = QApplication.instance() or QApplication([])
+    db_file = str(tmp_path / 'presenter.db')
+    with ConnectionPool(db_file) as pool:
+        expense = SQLiteRepository(
+            db_file, 'expense_table',
+            ('pk', 'added_date', 'expense_date', 'category', 'amount', 'comment'),
+            ('INTEGER PRIMARY KEY', 'TIMESTAMP', 'TIMESTAMP', 'TEXT', 'REAL', 'TEXT'),
+            DataExpenseRow, pool=pool)
+        categories = SQLiteRepository(db_file, 'categories_table',
+                                      ('pk', 'name', 'parent'),
+                                      ('INTEGER PRIMARY KEY', 'TEXT', 'INTEGER'),
+                                      Category, pool=pool)
+        budget = SQLiteRepository(db_file, 'budget_table',
+                                  ('pk', 'period', 'budget', 'amount'),
+                                  ('INTEGER PRIMARY KEY', 'TEXT', 'REAL', 'REAL'),
+                                  Budget, pool=pool)
+        categories.add_many([Category('Not stated'), Category('food')])
+        expense.add_many(
+            DataExpenseRow(Expense(expense_date=BASE + datetime.timedelta(hours=i),
+                                   category=2, amount=i))
+            for i in range(12))
+        presenter = Presenter(expense, categories, budget)
+        yield app, presenter
+        presenter.close()
+
+
+def settle(app, presenter):
+    """ Дождаться запросов рабочего потока и доставить их результаты """
+    presenter.async_expense.submit('count').result()
+    app.processEvents()
+
+
+def pks(presenter):
+    return [int(x[0]) for x in presenter.expense_data]
+
+
+def edit_date(presenter, row_num, date):
+    model = presenter.expense_model
+    index = model.index(row_num, 1)
+    model.setData(index, date.strftime('%d-%m-%Y %H:%M'), Qt.ItemDataRole.EditRole)
+    presenter.update_cell([index])
+
+
+def test_edit_date_then_fetch(presenter):
+    app, presenter = presenter
+    assert pks(presenter) == [12, 11, 10, 9, 8]
+    # дата стала старше загруженных строк: строка придёт со следующими порциями
+    edit_date(presenter, 0, BASE - datetime.timedelta(days=1))
+    assert pks(presenter) == [11, 10, 9, 8]
+    # дата внутри загруженных строк: строка переставляется на своё место
+    edit_date(presenter, 0, BASE + datetime.timedelta(hours=7, minutes=30))
+    assert pks(presenter) == [10, 9, 11, 8]
+    model = presenter.expense_model
+    while model.canFetchMore():
+        model.fetchMore()
+        settle(app, presenter)
+    assert pks(presenter) == [10, 9, 11, 8, 7, 6, 5, 4, 3, 2, 1, 12]
+
+
+def test_update_deleted_row(presenter, monkeypatch):
+    app, presenter = presenter
+    monkeypatch.setattr(QMessageBox, 'critical', lambda *args: None)
+    presenter.repo_expense.delete_by_pk(12)
+    model = presenter.expense_model
+    index = model.index(0, 2)
+    model.setData(index, 'wrong', Qt.ItemDataRole.EditRole)
+    presenter.update_cell([index])
+    assert pks(presenter) == [11, 10, 9, 8]
+
+
+def test_commit_categories_in_worker(presenter, monkeypatch):
+    app, presenter = presenter
+    threads = []
+    original = presenter_module.sync_categories
+
+    def sync_categories(*args):
+        threads.append(threading.current_thread())
+        return original(*args)
+
+    monkeypatch.setattr(presenter_module, 'sync_categories', sync_categories)
+    # незаписанный расход записывается до изменения категорий
+    presenter.repo_expense.add(DataExpenseRow(Expense(expense_date=BASE, category=2)))
+    presenter.main_window.category.text_box.setText('books\n')
+    presenter.commit_categories()
+    assert not presenter.main_window.isEnabled()
+    settle(app, presenter)
+    assert presenter.main_window.isEnabled()
+    assert threads and threads[0] is not threading.current_thread()
+    assert sorted(presenter.category_tree.pk_by_name) == ['Not stated', 'books']
+    not_stated = presenter.category_tree.pk_by_name['Not stated']
+    expenses = presenter.async_expense.repo.get_all()
+    assert len(expenses) == 13
+    assert {int(row.category) for row in expenses} == {not_stated}
+    assert {row[3] for row in presenter.expense_data} == {'Not stated'}
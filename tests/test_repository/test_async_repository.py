@@ -0,0 +1,89 @@
+import threading
+
+from bookkeeper.models.category import Category
+from bookkeeper.repository.async_repository import AsyncRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+import pytest
+
+
+@pytest.fixture
+def custom_class():
+    class Custom:
+        pk = 0
+
+    return Custom
+
+
+@pytest.fixture
+def inner():
+    return MemoryRepository()
+
+
+@pytest.fixture
+def repo(inner):
+    with AsyncRepository(inner) as repo:
+        yield repo
+
+
+def test_submit(repo, inner, custom_class):
+    results = []
+    obj = custom_class()
+    assert repo.submit('add', obj, on_result=results.append).result() == 1
+    assert repo.submit('get_all', on_result=results.append).result() == [obj]
+    assert results == [1, [obj]]
+    assert inner.get_all() == [obj]
+
+
+def test_runs_in_worker(repo):
+    threads = []
+    repo.submit('get_all', on_result=lambda _: threads.append(threading.get_ident()))
+    repo.close()
+    assert threads and threads[0] != threading.get_ident()
+
+
+def test_error(repo):
+    errors = []
+    repo.submit('delete_by_pk', 1, on_error=errors.append).exception()
+    future = repo.submit('delete_by_pk', 1)
+    with pytest.raises(KeyError):
+        future.result()
+    repo.close()
+    assert len(errors) == 1 and isinstance(errors[0], KeyError)
+
+
+def test_run(repo, inner, custom_class):
+    results = []
+
+    def add_two(first, second):
+        return inner.add_many([first, second]), threading.current_thread()
+
+    future = repo.run(add_two, custom_class(), second=custom_class(),
+                      on_result=results.append)
+    pks, thread = future.result()
+    assert pks == [1, 2] and results == [(pks, thread)]
+    assert thread is not threading.current_thread()
+
+
+def test_dispatch(inner, custom_class):
+    queue = []
+    results = []
+    with AsyncRepository(inner, dispatch=queue.append) as repo:
+        repo.submit('add', custom_class(), on_result=results.append).result()
+    assert results == []
+    for func in queue:
+        func()
+    assert results == [1]
+
+
+def test_sqlite_worker_connection(tmp_path):
+    with SQLiteRepository(str(tmp_path / "async.db"), "categories_table",
+                          ('pk', 'name', 'parent'),
+                          ('INTEGER PRIMARY KEY', 'TEXT', 'INTEGER'),
+                          Category) as sqlite_repo:
+        sqlite_repo.add(Category('food'))
+        with AsyncRepository(sqlite_repo) as repo:
+            assert repo.submit('add', Category('meat', 1)).result() == 2
+            assert repo.submit('count').result() == 2
+        assert [cat.name for cat in sqlite_repo.get_all()] == ['food', 'meat']
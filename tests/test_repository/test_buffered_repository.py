@@ -0,0 +1,284 @@
+import threading
+
+from bookkeeper.repository.async_repository import AsyncRepository
+from bookkeeper.repository.buffered_repository import BufferedRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+import pytest
+
+
+@pytest.fixture
+def custom_class():
+    class Custom:
+        pk = 0
+
+        def __init__(self, value=0):
+            self.value = value
+
+    return Custom
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def inner():
+    return MemoryRepository()
+
+
+@pytest.fixture
+def repo(inner, clock):
+    return BufferedRepository(inner, max_pending=5, max_delay=10, clock=clock)
+
+
+def test_add_is_buffered(repo, inner, custom_class):
+    obj = custom_class(1)
+    pk = repo.add(obj)
+    assert pk < 0 and obj.pk == pk
+    assert repo.pending == 1
+    assert inner.get_all() == []
+    assert repo.get_by_pk(pk) is obj
+    assert repo.get_all() == [obj]
+    repo.flush()
+    assert repo.pending == 0
+    assert inner.get_all() == [obj]
+    assert obj.pk > 0
+    assert repo.pk_map == {pk: obj.pk}
+    assert repo.get_by_pk(pk) is obj
+
+
+def test_reads_overlay_pending(repo, inner, custom_class):
+    objs = [custom_class(i % 2) for i in range(3)]
+    inner.add_many(objs)
+    new = custom_class(1)
+    repo.add(new)
+    changed = custom_class(1)
+    changed.pk = objs[0].pk
+    repo.update_by_pk(changed)
+    repo.delete_by_pk(objs[1].pk)
+    assert repo.get_by_pk(objs[0].pk) is changed
+    assert repo.get_by_pk(objs[1].pk) is None
+    assert repo.get_all() == [changed, objs[2], new]
+    assert repo.get_all({'value': 1}) == [changed, new]
+    assert repo.count({'value': 0}) == 1
+    repo.flush()
+    assert inner.get_all() == [changed, objs[2], new]
+
+
+def test_pending_changes_of_added(repo, inner, custom_class):
+    pk1 = repo.add(custom_class(1))
+    pk2 = repo.add(custom_class(2))
+    changed = custom_class(3)
+    changed.pk = pk1
+    repo.update_by_pk(changed)
+    repo.delete_by_pk(pk2)
+    with pytest.raises(KeyError):
+        repo.delete_by_pk(pk2)
+    repo.flush()
+    assert [obj.value for obj in inner.get_all()] == [3]
+    # после записи временный pk по-прежнему можно использовать
+    changed = custom_class(4)
+    changed.pk = pk1
+    repo.update_by_pk(changed)
+    assert changed.pk == repo.pk_map[pk1]
+    repo.delete_many([pk1])
+    repo.flush()
+    assert inner.get_all() == []
+
+
+def test_size_threshold(repo, inner, custom_class):
+    flushed = []
+    repo.on_flush = flushed.append
+    for i in range(4):
+        repo.add(custom_class(i))
+    assert inner.count() == 0
+    repo.add(custom_class(4))
+    assert inner.count() == 5
+    assert len(flushed) == 1 and len(flushed[0]) == 5
+
+
+def test_time_threshold(repo, inner, clock, custom_class):
+    repo.add(custom_class())
+    clock.now = 5
+    assert not repo.flush_if_due()
+    repo.add(custom_class())
+    assert inner.count() == 0
+    clock.now = 10
+    assert repo.flush_if_due()
+    assert inner.count() == 2
+    assert not repo.flush_if_due()
+    clock.now = 30
+    repo.add(custom_class())
+    assert inner.count() == 2
+    clock.now = 40
+    repo.add(custom_class())
+    assert inner.count() == 4
+
+
+def test_close_and_delegation(repo, inner, custom_class):
+    inner.label = 'inner'
+    with repo:
+        repo.add(custom_class())
+        assert repo.label == 'inner'
+        assert inner.count() == 0
+        assert len(list(repo.iter_all())) == 1
+        assert len(repo.get_all(order_by=('pk',))) == 1
+        assert inner.count() == 1
+        repo.add(custom_class())
+    assert inner.count() == 2
+
+
+def test_count_and_iter_all(repo, inner, custom_class):
+    inner.get_all = None  # count и iter_all не должны читать все записи
+    pk = repo.add(custom_class(1))
+    repo.add(custom_class(2))
+    assert repo.count({'value': 1}) == 1
+    assert repo.pending == 0
+    repo.delete_by_pk(pk)
+    it = repo.iter_all()
+    assert repo.pending == 0
+    assert [obj.value for obj in it] == [2]
+
+
+def test_failed_flush_keeps_pending(repo, inner, custom_class):
+    repo.delete_by_pk(100)
+    obj = custom_class()
+    pk = repo.add(obj)
+    with pytest.raises(KeyError):
+        repo.flush()
+    assert repo.pending == 2
+    assert obj.pk == pk
+
+
+def test_transaction(repo, inner, custom_class):
+    with repo.transaction():
+        repo.add(custom_class())
+    assert inner.count() == 1
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.add(custom_class())
+            raise RuntimeError
+    assert repo.pending == 0
+    assert inner.count() == 1
+
+
+def test_wrong_max_pending(inner):
+    with pytest.raises(ValueError):
+        BufferedRepository(inner, max_pending=0)
+
+
+def test_events(repo, inner, custom_class):
+    events = []
+    repo.subscribe(events.append)
+    obj = custom_class(1)
+    inner.add(obj)
+    new = custom_class(2)
+    pk = repo.add(new)
+    changed = custom_class(3)
+    changed.pk = obj.pk
+    repo.update_by_pk(changed)
+    repo.delete_by_pk(pk)
+    assert [(e.kind, e.pk, e.old, e.new) for e in events] == [
+        ('added', obj.pk, None, obj), ('added', pk, None, new),
+        ('updated', obj.pk, obj, changed), ('deleted', pk, new, None)]
+    # при записи события не повторяются
+    repo.flush()
+    assert len(events) == 4
+    # события операций, переданных repo, передаются подписчикам
+    assert repo.update_field('value', [3], 4) == 1
+    assert [(e.kind, e.pk, e.new.value) for e in events[4:]] == [('updated', obj.pk, 4)]
+
+
+def test_events_subscription(repo, inner, custom_class):
+    assert inner._subscribers == []
+    events = []
+    repo.subscribe(events.append)
+    assert inner._subscribers == [repo._forward]
+    repo.add(custom_class())
+    repo.flush()
+    assert inner._subscribers == [repo._forward]
+    repo.unsubscribe(events.append)
+    assert inner._subscribers == []
+
+
+def test_events_in_transaction(repo, custom_class):
+    events = []
+    repo.subscribe(events.append)
+    with repo.transaction():
+        pk = repo.add(custom_class())
+        assert events == []
+    assert [(e.kind, e.pk) for e in events] == [('added', pk)]
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.add(custom_class())
+            raise RuntimeError
+    assert len(events) == 1
+
+
+class ThreadRecorder(MemoryRepository):
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def add_many(self, objs):
+        self.threads.append(threading.current_thread())
+        return super().add_many(objs)
+
+
+def test_writer(custom_class):
+    inner = ThreadRecorder()
+    queue = []
+    flushed = []
+    with AsyncRepository(inner, dispatch=queue.append) as writer:
+        repo = BufferedRepository(inner, writer=writer, on_flush=flushed.append)
+        obj = custom_class(1)
+        pk = repo.add(obj)
+        repo.flush()
+        writer.submit('count').result()
+        assert inner.count() == 1 and repo.pending == 0
+        assert inner.threads[0] is not threading.current_thread()
+        # результат записи учитывается в потоке, который вызывает dispatch
+        assert flushed == []
+        queue.pop(0)()
+        assert flushed == [{pk: obj.pk}]
+        # чтение ждёт окончания записи, не дожидаясь dispatch
+        pk = repo.add(custom_class(2))
+        repo.flush()
+        assert repo.get_by_pk(pk).value == 2
+        assert flushed[-1] == {pk: 2}
+        for func in queue:
+            func()
+        assert len(flushed) == 2
+        # close записывает операции в текущем потоке
+        repo.add(custom_class(3))
+        repo.close()
+        assert inner.count() == 3
+        assert inner.threads[-1] is threading.current_thread()
+
+
+def test_writer_error(custom_class):
+    inner = MemoryRepository()
+    queue = []
+    errors = []
+    with AsyncRepository(inner, dispatch=queue.append) as writer:
+        repo = BufferedRepository(inner, writer=writer, on_error=errors.append)
+        repo.delete_by_pk(100)
+        obj = custom_class()
+        pk = repo.add(obj)
+        repo.flush()
+        writer.submit('count').result()
+        for func in queue:
+            func()
+    assert len(errors) == 1 and isinstance(errors[0], KeyError)
+    assert repo.pending == 2
+    assert obj.pk == pk and repo.get_by_pk(pk) is obj
@@ -0,0 +1,150 @@
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+import pytest
+
+
+@pytest.fixture
+def custom_class():
+    class Custom:
+        pk = 0
+
+        def __init__(self, value=0):
+            self.value = value
+
+    return Custom
+
+
+@pytest.fixture
+def inner():
+    return MemoryRepository()
+
+
+@pytest.fixture
+def repo(inner):
+    return CachedRepository(inner, maxsize=3)
+
+
+def test_get_by_pk_cached(repo, inner, custom_class):
+    obj = custom_class()
+    pk = repo.add(obj)
+    assert repo.get_by_pk(pk) is obj
+    assert repo.get_by_pk(pk) is obj
+    assert (repo.hits, repo.misses) == (1, 1)
+    assert repo.get_by_pk(pk + 1) is None
+    assert repo.get_by_pk(pk + 1) is None
+    assert (repo.hits, repo.misses) == (2, 2)
+    # добавление мимо обёртки сбрасывает кэш по событию repo
+    inner.add(custom_class())
+    assert repo.get_by_pk(pk + 1) is not None
+
+
+def test_get_all_cached(repo, custom_class):
+    repo.add_many([custom_class(i % 2) for i in range(4)])
+    assert len(repo.get_all({'value': 1})) == 2
+    assert len(repo.get_all({'value': 1})) == 2
+    assert len(repo.get_all(order_by=('value',), limit=3)) == 3
+    assert repo.count() == 4
+    assert (repo.hits, repo.misses) == (1, 3)
+    result = repo.get_all()
+    result.clear()
+    assert len(repo.get_all()) == 4
+
+
+def test_unhashable_query(repo, custom_class):
+    obj = custom_class([1])
+    repo.add(obj)
+    assert repo.get_all({'value': [1]}) == [obj]
+    assert repo.get_all({'value': [1]}) == [obj]
+    assert (repo.hits, repo.misses) == (0, 2)
+    assert len(repo) == 0
+
+
+def test_lru_eviction(repo, custom_class):
+    pks = repo.add_many([custom_class() for _ in range(4)])
+    for pk in pks[:3]:
+        repo.get_by_pk(pk)
+    repo.get_by_pk(pks[0])
+    repo.get_by_pk(pks[3])
+    assert len(repo) == 3
+    misses = repo.misses
+    repo.get_by_pk(pks[0])
+    repo.get_by_pk(pks[1])
+    assert repo.misses == misses + 1
+
+
+def test_invalidation(repo, custom_class):
+    pks = repo.add_many([custom_class(i) for i in range(3)])
+    assert len(repo.get_all()) == 3
+    repo.get_by_pk(pks[0])
+    repo.get_by_pk(pks[1])
+    new = custom_class(10)
+    new.pk = pks[0]
+    repo.update_by_pk(new)
+    assert repo.get_by_pk(pks[0]).value == 10
+    assert repo.get_by_pk(pks[1]).value == 1
+    assert [obj.value for obj in repo.get_all()] == [10, 1, 2]
+    repo.delete_many(pks[1:])
+    assert repo.get_by_pk(pks[1]) is None
+    assert [obj.value for obj in repo.get_all()] == [10]
+    repo.add(custom_class(5))
+    assert [obj.value for obj in repo.get_all()] == [10, 5]
+    assert repo.update_field('value', [10], 7) == 1
+    assert [obj.value for obj in repo.get_all()] == [7, 5]
+
+
+def test_events(repo, inner, custom_class):
+    events = []
+    repo.subscribe(events.append)
+    pk = repo.add(custom_class())
+    assert [(e.kind, e.pk) for e in events] == [('added', pk)]
+    assert len(repo.get_all()) == 1
+    new = custom_class(1)
+    new.pk = pk
+    inner.update_by_pk(new)
+    assert repo.get_all() == [new]
+    assert repo.get_by_pk(pk) is new
+    repo.unsubscribe(events.append)
+    assert inner._subscribers == [repo._changed]
+    repo.get_by_pk(pk)
+    inner._notify('reset', 0)
+    assert len(repo) == 0
+
+
+def test_delegation(repo, inner, custom_class):
+    inner.label = 'inner'
+    assert repo.label == 'inner'
+    repo.add(custom_class())
+    repo.get_all()
+    assert len(repo) == 1
+    assert len(list(repo.iter_all())) == 1
+    with pytest.raises(AttributeError):
+        repo.unknown
+
+
+def test_count_and_iter_all(repo, inner, custom_class):
+    inner.get_all = None  # count и iter_all не должны читать все записи
+    repo.add(custom_class(1))
+    repo.add(custom_class(2))
+    assert repo.count() == 2
+    assert repo.count({'value': 1}) == 1
+    assert repo.count() == 2
+    assert (repo.hits, repo.misses) == (1, 2)
+    assert [obj.value for obj in repo.iter_all({'value': 2})] == [2]
+    repo.add(custom_class(1))
+    assert repo.count({'value': 1}) == 2
+    assert repo.count({'value': []}) == 0
+
+
+def test_wrong_maxsize(inner):
+    with pytest.raises(ValueError):
+        CachedRepository(inner, maxsize=0)
+
+
+def test_transaction_rollback_clears(repo, custom_class):
+    repo.add(custom_class())
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.get_all()
+            raise RuntimeError
+    assert len(repo) == 0
@@ -0,0 +1,150 @@
+from datetime import datetime
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository import columnar_repository
+from bookkeeper.repository.columnar_repository import ColumnarExpenseRepository
+
+import pytest
+
+
+@pytest.fixture
+def repo():
+    return ColumnarExpenseRepository()
+
+
+@pytest.fixture(params=['python', 'numpy'])
+def summing(request, monkeypatch):
+    """ Суммы считаются без numpy и, если он установлен, с ним """
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(columnar_repository, 'numpy', None)
+
+
+def expense(amount=0, category=1, day=1, comment=''):
+    return Expense(amount=amount, category=category,
+                   expense_date=datetime(2023, 3, day, 12, 30, 15, 123),
+                   added_date=datetime(2023, 4, 1), comment=comment)
+
+
+def test_crud(repo):
+    obj = expense(10, comment='lunch')
+    pk = repo.add(obj)
+    assert obj.pk == pk == 1
+    assert repo.get_by_pk(pk) == obj
+    assert repo.get_by_pk(pk) is not obj
+    new = expense(20, 2, comment='bus')
+    new.pk = pk
+    repo.update_by_pk(new)
+    assert repo.get_by_pk(pk) == new
+    repo.delete_by_pk(pk)
+    assert repo.get_by_pk(pk) is None
+    with pytest.raises(KeyError):
+        repo.delete_by_pk(pk)
+    with pytest.raises(KeyError):
+        repo.update_by_pk(new)
+    with pytest.raises(ValueError):
+        repo.add(new)
+
+
+def test_get_all(repo):
+    objs = [expense(i, i % 2 + 1, i + 1, 'x' if i < 2 else '') for i in range(5)]
+    repo.add_many(objs)
+    assert repo.get_all() == objs
+    assert repo.get_all({'category': 1}) == objs[::2]
+    assert repo.get_all({'comment': 'x', 'category': 2}) == [objs[1]]
+    assert repo.get_all({'comment': 'missing'}) == []
+    assert repo.get_all({'expense_date': objs[3].expense_date}) == [objs[3]]
+    assert repo.get_all(order_by=('amount',), desc=True, limit=2) == objs[:2:-1]
+    assert repo.get_all(limit=2, offset=1) == objs[1:3]
+    assert list(repo.iter_all({'category': 2})) == objs[1::2]
+    assert repo.count() == 5 and repo.count({'category': 1}) == 3
+    with pytest.raises(ValueError):
+        repo.get_all({'wrong': 1})
+
+
+def test_compaction(repo):
+    objs = [expense(i) for i in range(10)]
+    pks = repo.add_many(objs)
+    repo.delete_many(pks[:6])
+    assert repo.count() == 4
+    assert repo.get_all() == objs[6:]
+    assert repo.nbytes < 10 * 41
+    assert repo.add(expense(100)) == 11
+    assert repo.get_by_pk(11).amount == 100
+    with pytest.raises(KeyError):
+        repo.delete_many([pks[7], pks[0]])
+    assert repo.count() == 5
+
+
+def test_update_field(repo):
+    repo.add_many(expense(i, cat) for i, cat in enumerate([1, 2, 3, 2, 4]))
+    events = []
+    repo.subscribe(events.append)
+    assert repo.update_field('category', [2, 3], 5) == 3
+    assert [obj.category for obj in repo.get_all()] == [1, 5, 5, 5, 4]
+    assert [(e.old.category, e.new.category) for e in events] == [(2, 5), (3, 5), (2, 5)]
+    assert repo.update_field('category', [5], 6, where={'amount': 2}) == 1
+    assert [obj.category for obj in repo.get_all()] == [1, 5, 6, 5, 4]
+
+
+def test_update_other_fields(repo):
+    repo.add_many(expense(i % 2, comment='x') for i in range(4))
+    assert repo.update_field('comment', ['x'], 'y', where={'amount': 1}) == 2
+    assert [obj.comment for obj in repo.get_all()] == ['x', 'y', 'x', 'y']
+    assert repo.update_field('amount', [0], 5) == 2
+    assert [obj.amount for obj in repo.get_all()] == [5, 1, 5, 1]
+    assert repo.update_field('comment', ['missing'], 'z') == 0
+    with pytest.raises(ValueError):
+        repo.update_field('pk', [1], 10)
+    with pytest.raises(ValueError):
+        repo.update_field('wrong', [1], 10)
+
+
+def test_failed_updates_change_nothing(repo):
+    objs = [expense(i, 1, comment='a') for i in range(3)]
+    repo.add_many(objs)
+    with pytest.raises(TypeError):
+        repo.update_field('category', [1], 'food', where={'comment': 'a'})
+    with pytest.raises(OverflowError):
+        repo.update_field('category', [1], 2 ** 40)
+    with pytest.raises(TypeError):
+        repo.update_field('expense_date', [objs[0].expense_date], '2023-03-01')
+    # значения проверяются до записи: сумма не меняется без категории
+    wrong = expense(100, 'food')
+    wrong.pk = 2
+    with pytest.raises(TypeError):
+        repo.update_by_pk(wrong)
+    changed = expense(50, 2)
+    changed.pk = 1
+    with pytest.raises(TypeError):
+        repo.update_many([changed, wrong])
+    with pytest.raises(TypeError):
+        repo.add(expense(comment=None))
+    assert repo.get_all() == objs
+    assert repo.count() == 3 and repo.add(expense()) == 4
+
+
+def test_sums(repo, summing):
+    repo.add_many([expense(10, 1, 1), expense(20, 2, 2), expense(40, 1, 3),
+                   expense(80, 3, 4), expense(0, 4, 2)])
+    repo.delete_by_pk(4)
+    assert repo.get_period_sum(datetime(2023, 3, 2), datetime(2023, 3, 3)) == 20
+    assert repo.get_period_sum(datetime(2023, 3, 5), datetime(2023, 3, 6)) == 0
+    assert repo.get_category_sums() == {1: 50, 2: 20, 4: 0}
+    assert repo.get_category_sums(datetime(2023, 3, 2)) == {1: 40, 2: 20, 4: 0}
+    assert ColumnarExpenseRepository().get_category_sums() == {}
+
+
+def test_cents(summing):
+    repo = ColumnarExpenseRepository(cents=True)
+    repo.add_many(expense(10, 1 + i % 2) for i in range(10))
+    assert repo.get_by_pk(1).amount == 10
+    total = repo.get_period_sum(datetime(2023, 3, 1), datetime(2023, 3, 2))
+    assert total == 100 and isinstance(total, int)
+    sums = repo.get_category_sums()
+    assert sums == {1: 50, 2: 50}
+    assert all(isinstance(value, int) for value in sums.values())
+    with pytest.raises(TypeError):
+        repo.add(expense(0.5))
+    assert repo.count() == 10 and repo.add(expense(1)) == 11
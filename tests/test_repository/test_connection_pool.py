@@ -0,0 +1,126 @@
+"""
+Модуль тестирования пула соединений
+"""
+import sqlite3
+import threading
+
+import pytest
+
+from bookkeeper.repository.connection_pool import ConnectionPool
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.models.category import Category
+
+fields = ('pk', 'name', 'parent')
+types = ('INTEGER PRIMARY KEY', 'TEXT', 'INTEGER')
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / "pool_test.db")
+
+
+def test_same_connection_in_thread(db_file):
+    with ConnectionPool(db_file) as pool:
+        assert pool.connection() is pool.connection()
+
+
+def test_connection_per_thread(db_file):
+    with ConnectionPool(db_file) as pool:
+        main_con = pool.connection()
+        other = []
+        thread = threading.Thread(target=lambda: other.append(pool.connection()))
+        thread.start()
+        thread.join()
+        assert other[0] is not main_con
+
+
+def test_close(db_file):
+    pool = ConnectionPool(db_file)
+    con = pool.connection()
+    pool.close()
+    assert pool.closed
+    with pytest.raises(sqlite3.ProgrammingError):
+        con.execute("SELECT 1")
+    with pytest.raises(sqlite3.ProgrammingError):
+        pool.connection()
+
+
+def test_transaction_commit_and_rollback(db_file):
+    with ConnectionPool(db_file) as pool:
+        with pool.transaction() as con:
+            con.execute("CREATE TABLE t (x INTEGER)")
+        with pytest.raises(ZeroDivisionError):
+            with pool.transaction() as con:
+                con.execute("INSERT INTO t VALUES (1)")
+                raise ZeroDivisionError
+        assert pool.connection().execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+
+def test_nested_transaction(db_file):
+    with ConnectionPool(db_file) as pool:
+        with pool.transaction() as con:
+            con.execute("CREATE TABLE t (x INTEGER)")
+        with pool.transaction() as con:
+            with pool.transaction():
+                con.execute("INSERT INTO t VALUES (1)")
+            assert con.in_transaction
+        assert not pool.connection().in_transaction
+
+
+def test_after_commit(db_file):
+    with ConnectionPool(db_file) as pool:
+        calls = []
+        pool.after_commit(lambda: calls.append('now'))
+        with pool.transaction():
+            with pool.transaction():
+                pool.after_commit(lambda: calls.append('commit'))
+            assert calls == ['now']
+        assert calls == ['now', 'commit']
+        with pytest.raises(ZeroDivisionError):
+            with pool.transaction():
+                pool.after_commit(lambda: calls.append('rollback'))
+                raise ZeroDivisionError
+        with pool.transaction():
+            pass
+        assert calls == ['now', 'commit']
+
+
+def test_after_commit_dispatch(db_file):
+    queue = []
+    calls = []
+
+    def worker():
+        with pool.transaction():
+            pool.after_commit(lambda: calls.append('worker'))
+
+    with ConnectionPool(db_file, dispatch=queue.append) as pool:
+        pool.after_commit(lambda: calls.append('owner'))
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        assert calls == ['owner'] and len(queue) == 1
+        queue[0]()
+        assert calls == ['owner', 'worker']
+
+
+def test_repositories_share_pool(db_file):
+    with ConnectionPool(db_file) as pool:
+        repo_1 = SQLiteRepository(db_file, "table_1", fields, types, Category, pool=pool)
+        repo_2 = SQLiteRepository(db_file, "table_2", fields, types, Category, pool=pool)
+        repo_1.add(Category('a'))
+        repo_2.add(Category('b'))
+        repo_1.close()
+        assert not pool.closed
+        assert repo_2.get_by_pk(1).name == 'b'
+
+
+def test_repository_context_manager(db_file):
+    with SQLiteRepository(db_file, "table_1", fields, types, Category) as repo:
+        repo.add(Category('a'))
+    assert repo.pool.closed
+
+
+def test_pool_for_another_file(db_file):
+    with ConnectionPool(db_file) as pool:
+        with pytest.raises(ValueError):
+            SQLiteRepository("other.db", "table_1", fields, types, Category, pool=pool)
@@ -1,3 +1,8 @@
+from datetime import datetime
+from inspect import isgenerator
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
 from bookkeeper.repository.memory_repository import MemoryRepository
 
 import pytest
@@ -69,3 +74,253 @@ def test_get_all_with_condition(repo, custom_class):
         objects.append(o)
     assert repo.get_all({'name': '0'}) == [objects[0]]
     assert repo.get_all({'test': 'test'}) == objects
+
+
+def test_add_many(repo, custom_class):
+    objects = [custom_class() for i in range(5)]
+    pks = repo.add_many(objects)
+    assert pks == [o.pk for o in objects]
+    assert repo.get_all() == objects
+
+
+def test_cannot_add_many_with_pk(repo, custom_class):
+    objects = [custom_class() for i in range(3)]
+    objects[-1].pk = 10
+    with pytest.raises(ValueError):
+        repo.add_many(objects)
+    assert repo.get_all() == []
+
+
+def test_update_many(repo, custom_class):
+    pks = repo.add_many(custom_class() for i in range(3))
+    new_objects = []
+    for pk in pks:
+        o = custom_class()
+        o.pk = pk
+        new_objects.append(o)
+    repo.update_many(new_objects)
+    assert repo.get_all() == new_objects
+
+
+def test_delete_many(repo, custom_class):
+    pks = repo.add_many(custom_class() for i in range(5))
+    repo.delete_many(pks[:3])
+    assert [o.pk for o in repo.get_all()] == pks[3:]
+
+
+def test_cannot_delete_many_unexistent(repo, custom_class):
+    pk = repo.add(custom_class())
+    with pytest.raises(KeyError):
+        repo.delete_many([pk, pk + 1])
+    assert repo.get_by_pk(pk) is not None
+
+
+def test_iter_all(repo, custom_class):
+    objects = []
+    for i in range(5):
+        o = custom_class()
+        o.name = str(i % 2)
+        repo.add(o)
+        objects.append(o)
+    gen = repo.iter_all()
+    assert isgenerator(gen)
+    assert list(gen) == objects
+    assert list(repo.iter_all({'name': '1'})) == [objects[1], objects[3]]
+
+
+def test_get_all_paging(repo, custom_class):
+    objects = []
+    for i in range(5):
+        o = custom_class()
+        o.value = i % 3
+        repo.add(o)
+        objects.append(o)
+    assert repo.get_all(order_by=('value', 'pk')) == \
+        [objects[0], objects[3], objects[1], objects[4], objects[2]]
+    assert repo.get_all(order_by=('pk',), desc=True, limit=2) == [objects[4], objects[3]]
+    assert repo.get_all(limit=2, offset=2) == objects[2:4]
+    assert repo.get_all(offset=4) == objects[4:]
+
+
+def test_count(repo, custom_class):
+    for i in range(5):
+        o = custom_class()
+        o.value = i % 2
+        repo.add(o)
+    assert repo.count() == 5
+    assert repo.count({'value': 1}) == 2
+
+
+def test_update_field(repo, custom_class):
+    objects = []
+    for i, cat in enumerate([1, 2, 3, 2, 4]):
+        o = custom_class()
+        o.category = cat
+        o.value = i % 2
+        repo.add(o)
+        objects.append(o)
+    assert repo.update_field('category', [2, 3], 5) == 3
+    assert [o.category for o in repo.get_all()] == [1, 5, 5, 5, 4]
+    assert repo.update_field('category', [5], 6, where={'value': 1}) == 2
+    assert [o.category for o in repo.get_all()] == [1, 6, 5, 6, 4]
+    assert repo.update_field('category', [], 1) == 0
+
+
+def test_reassign_category(repo, custom_class):
+    for cat in [1, 2, 3, 2]:
+        o = custom_class()
+        o.category = cat
+        repo.add(o)
+    assert repo.reassign_category([2, 3], 1) == 3
+    assert [o.category for o in repo.get_all()] == [1, 1, 1, 1]
+
+
+def test_events(repo, custom_class):
+    events = []
+    repo.subscribe(events.append)
+    obj = custom_class()
+    pk = repo.add(obj)
+    new = custom_class()
+    new.pk = pk
+    repo.update_by_pk(new)
+    new.category = 1
+    repo.update_field('category', [1], 2)
+    repo.delete_by_pk(pk)
+    assert [(e.kind, e.pk) for e in events] == [
+        ('added', pk), ('updated', pk), ('updated', pk), ('deleted', pk)]
+    assert (events[0].old, events[0].new) == (None, obj)
+    assert (events[1].old, events[1].new) == (obj, new)
+    assert events[2].old.category == 1 and events[2].new.category == 2
+    assert (events[3].old, events[3].new) == (new, None)
+    events.clear()
+    pks = repo.add_many([custom_class() for _ in range(2)])
+    repo.delete_many(pks)
+    assert [(e.kind, e.pk) for e in events] == [
+        ('added', pks[0]), ('added', pks[1]), ('deleted', pks[0]), ('deleted', pks[1])]
+    repo.unsubscribe(events.append)
+    repo.add(custom_class())
+    assert len(events) == 4
+
+
+@pytest.fixture
+def indexed_repo(custom_class):
+    repo = MemoryRepository(indexed_fields=('category', 'name'))
+    for i, (cat, name) in enumerate([(1, 'a'), (2, 'b'), (1, 'c'), (3, 'a'), (1, 'a')]):
+        o = custom_class()
+        o.category, o.name, o.value = cat, name, i % 2
+        repo.add(o)
+    return repo
+
+
+def test_indexed_get_all(indexed_repo):
+    def pks(where):
+        return [o.pk for o in indexed_repo.get_all(where)]
+    assert pks({'category': 1}) == [1, 3, 5]
+    assert pks({'category': 1, 'name': 'a'}) == [1, 5]
+    assert pks({'name': 'a', 'value': 1}) == [4]
+    assert pks({'category': 4}) == []
+    assert pks({'category': [1]}) == []
+    assert [o.pk for o in indexed_repo.iter_all({'name': 'a'})] == [1, 4, 5]
+    assert indexed_repo.count({'category': 1}) == 3
+    assert indexed_repo.get_all({'category': 1}, order_by=('pk',), desc=True,
+                                limit=2)[1].pk == 3
+
+
+def test_indexes_follow_changes(indexed_repo, custom_class):
+    obj = custom_class()
+    obj.pk, obj.category, obj.name = 1, 2, 'a'
+    indexed_repo.update_by_pk(obj)
+    assert [o.pk for o in indexed_repo.get_all({'category': 2})] == [1, 2]
+    indexed_repo.delete_by_pk(2)
+    indexed_repo.delete_many([3])
+    assert [o.pk for o in indexed_repo.get_all({'category': 1})] == [5]
+    assert indexed_repo.update_field('category', [1, 2], 4) == 2
+    assert [o.pk for o in indexed_repo.get_all({'category': 4})] == [1, 5]
+    assert indexed_repo.get_all({'category': 1}) == []
+    bad = custom_class()
+    bad.category, bad.name = [1], 'x'
+    with pytest.raises(TypeError):
+        indexed_repo.add(bad)
+    assert bad.pk == 0 and indexed_repo.count() == 3
+
+
+def test_index_mutate_then_update():
+    repo = MemoryRepository(indexed_fields=('parent',))
+    repo.add_many([Category('food'), Category('meat')])
+    obj = repo.get_by_pk(2)
+    obj.parent = 1
+    assert repo.get_all({'parent': 1}) == []
+    repo.update_by_pk(obj)
+    assert repo.get_all({'parent': 1}) == [obj]
+    assert repo.get_all({'parent': None}) == [Category('food', pk=1)]
+    repo.delete_by_pk(2)
+    assert repo.get_all({'parent': None}) == [Category('food', pk=1)]
+    assert repo.get_all({'parent': 1}) == []
+    obj = repo.get_by_pk(1)
+    obj.parent = 3
+    repo.update_many([obj])
+    assert repo.get_all({'parent': None}) == []
+    assert repo.get_all({'parent': 3}) == [obj]
+
+
+def test_index_nbytes(indexed_repo):
+    sizes = indexed_repo.index_nbytes
+    assert sizes.keys() == {'category', 'name'}
+    assert all(size > 0 for size in sizes.values())
+    assert MemoryRepository().index_nbytes == {}
+
+
+def test_snapshot(tmp_path):
+    path = tmp_path / 'expenses.snapshot'
+    repo = MemoryRepository(indexed_fields=('category',))
+    objs = [Expense(i, i % 2, datetime(2023, 3, i + 1)) for i in range(4)]
+    repo.add_many(objs)
+    repo.delete_by_pk(4)
+    repo.snapshot(path)
+    restored = MemoryRepository(indexed_fields=('category',))
+    restored.restore(path)
+    assert restored.get_all() == objs[:3]
+    assert restored.get_all({'category': 0}) == [objs[0], objs[2]]
+    assert restored.add(Expense(10)) == 5
+    restored.restore(path)
+    assert restored.count() == 3
+    empty = MemoryRepository()
+    empty.restore(tmp_path / 'missing')
+    assert empty.get_all() == [] and empty.add(Expense()) == 1
+
+
+def test_snapshot_objects(tmp_path):
+    path = tmp_path / 'mixed.snapshot'
+    repo = MemoryRepository()
+    objs = [Category('food'), Expense(1)]
+    repo.add_many(objs)
+    repo.snapshot(path)
+    restored = MemoryRepository()
+    restored.restore(path)
+    assert restored.get_all() == objs
+
+
+def test_journal(tmp_path):
+    snapshot, journal = tmp_path / 'cats.snapshot', tmp_path / 'cats.journal'
+    with MemoryRepository(journal=journal) as repo:
+        repo.add_many([Category('food'), Category('books')])
+        repo.snapshot(snapshot)
+        assert journal.stat().st_size == 0
+        repo.add(Category('meat', 1))
+        repo.update_by_pk(Category('films', pk=2))
+        repo.update_field('parent', [1], 2)
+        repo.delete_by_pk(1)
+        expected = repo.get_all()
+    with journal.open('ab') as file:
+        file.write(b'\x80\x05torn')
+    with MemoryRepository(indexed_fields=('parent',), journal=journal) as repo:
+        repo.restore(snapshot)
+        assert repo.get_all() == expected == [Category('films', pk=2),
+                                              Category('meat', 2, 3)]
+        assert repo.get_all({'parent': 2}) == [Category('meat', 2, 3)]
+        repo.restore(snapshot)
+        assert repo.get_all() == expected
+        assert repo.add(Category('toys')) == 4
+    with MemoryRepository(journal=journal) as repo:
+        repo.restore(snapshot)
+        assert repo.count() == 3
@@ -0,0 +1,114 @@
+"""
+Модуль тестирования миграций схемы БД
+"""
+import pytest
+
+from bookkeeper.repository.connection_pool import ConnectionPool
+from bookkeeper.repository.migrations import migrate, get_version, table_exists
+from bookkeeper.repository.migrations import BOOKKEEPER_MIGRATIONS
+from bookkeeper.repository.migrations import check_money, column_types
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.models.category import Category
+from bookkeeper.models.budget import Budget
+from bookkeeper.money import Money
+
+
+@pytest.fixture
+def pool(tmp_path):
+    with ConnectionPool(str(tmp_path / "migrations.db")) as pool:
+        yield pool
+
+
+def test_new_db_version(pool):
+    assert get_version(pool.connection()) == 0
+
+
+def test_migrate(pool):
+    calls = []
+    migrations = (lambda con: calls.append(1), lambda con: calls.append(2))
+    assert migrate(pool, migrations[:1]) == 1
+    assert migrate(pool, migrations) == 2
+    assert migrate(pool, migrations) == 2
+    assert calls == [1, 2]
+    assert get_version(pool.connection()) == 2
+
+
+def test_failed_migration_rolled_back(pool):
+    def broken(con):
+        con.execute("CREATE TABLE t (x INTEGER)")
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        migrate(pool, (broken,))
+    assert get_version(pool.connection()) == 0
+    assert not table_exists(pool.connection(), 't')
+
+
+def test_newer_db(pool):
+    migrate(pool, (lambda con: None, lambda con: None))
+    with pytest.raises(ValueError):
+        migrate(pool, (lambda con: None,))
+
+
+def test_bookkeeper_migrations_convert_dates(pool):
+    with pool.transaction() as con:
+        con.execute("CREATE TABLE expense_table (pk INTEGER PRIMARY KEY, "
+                    "added_date TEXT, expense_date TEXT, category TEXT, amount REAL)")
+        con.execute("INSERT INTO expense_table VALUES "
+                    "(1, '30-08-2020 08:15', '31-08-2020 10:00', '1', 5)")
+    migrate(pool, BOOKKEEPER_MIGRATIONS)
+    assert pool.connection().execute("SELECT * FROM expense_table").fetchall() == \
+        [(1, '2020-08-30 08:15', '2020-08-31 10:00', '1', 5)]
+    assert pool.connection().execute("SELECT * FROM expense_table_daily").fetchall() \
+        == [('2020-08-31', '1', 5, 1, 1)]
+
+
+def test_bookkeeper_migrations_rebuild_summary(pool):
+    with pool.transaction() as con:
+        con.execute("CREATE TABLE expense_table (pk INTEGER PRIMARY KEY, "
+                    "added_date TEXT, expense_date TEXT, category TEXT, amount REAL)")
+        con.execute("INSERT INTO expense_table VALUES "
+                    "(1, '2020-08-30 08:15', '2020-08-31 10:00', '1', 5), "
+                    "(2, '2020-08-30 08:15', '2020-08-31 12:00', '1', NULL)")
+        # таблица итогов прежнего вида: без n_rows, count - число строк
+        con.execute("CREATE TABLE expense_table_daily (day TEXT, category, total, "
+                    "count INTEGER, PRIMARY KEY (day, category))")
+        con.execute("INSERT INTO expense_table_daily VALUES ('2020-08-31', '1', 5, 2)")
+        con.execute("CREATE TABLE categories_table "
+                    "(pk INTEGER PRIMARY KEY, name TEXT, parent INTEGER)")
+        con.execute("INSERT INTO categories_table VALUES (1, 'a', NULL), (2, 'b', 1)")
+        con.execute('PRAGMA user_version = 1')
+    migrate(pool, BOOKKEEPER_MIGRATIONS)
+    con = pool.connection()
+    assert con.execute("SELECT * FROM expense_table_daily").fetchall() == \
+        [('2020-08-31', '1', 5, 1, 2)]
+    assert sorted(con.execute("SELECT * FROM categories_table_closure")) == \
+        [(1, 1, 0), (1, 2, 1), (2, 2, 0)]
+    con.execute("DELETE FROM expense_table WHERE pk = 1")
+    assert con.execute("SELECT * FROM expense_table_daily").fetchall() == \
+        [('2020-08-31', '1', 0, 0, 1)]
+
+
+def test_bookkeeper_migrations_on_empty_db(pool):
+    assert migrate(pool, BOOKKEEPER_MIGRATIONS) == len(BOOKKEEPER_MIGRATIONS)
+
+
+def test_repository_declared_indexes(pool):
+    SQLiteRepository(pool.db_file, "categories_table", ('pk', 'name', 'parent'),
+                     ('INTEGER PRIMARY KEY', 'TEXT', 'INTEGER'), Category,
+                     pool=pool, indexes=(('parent',), ('name', 'parent')))
+    indexes = {row[0] for row in pool.connection().execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert indexes == {'categories_table_parent_idx', 'categories_table_name_parent_idx'}
+
+
+def test_check_money(pool):
+    columns = {'budget_table': ('budget', 'amount')}
+    # таблицы ещё нет: проверять нечего
+    check_money(pool, Money(cents=True), columns)
+    SQLiteRepository(pool.db_file, "budget_table", ('pk', 'period', 'budget', 'amount'),
+                     ('INTEGER PRIMARY KEY', 'TEXT', 'real', 'REAL'), Budget, pool=pool)
+    assert column_types(pool.connection(), 'budget_table')['budget'] == 'REAL'
+    check_money(pool, Money(), columns)
+    with pytest.raises(ValueError, match='budget_table.budget'):
+        check_money(pool, Money(cents=True), columns)
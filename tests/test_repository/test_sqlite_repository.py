@@ -2,8 +2,11 @@
 Модуль тестирования репозитория расходов
 """
 from bookkeeper.repository.sqlite_repository import SQLiteRepository, DataExpenseRow
+from bookkeeper.models.category import Category, CategoryTree
 from bookkeeper.models.expense import Expense
+from bookkeeper.utils import read_tree
 import datetime
+from inspect import isgenerator
 import pytest
 import os
 
@@ -220,5 +223,520 @@ def test_fail_delete_by_pk_wrong_pk_type_none(repo):
     assert repo.get_by_pk(None) is None
 
 
+'''Bulk Operations Tests'''
+
+
+@pytest.fixture()
+def tmp_repo(tmp_path):
+    fields = ('pk', 'added_date', 'expense_date', 'category', 'amount', 'comment')
+    types = ('INTEGER PRIMARY KEY', 'TIMESTAMP', 'TIMESTAMP', 'TEXT', 'REAL', 'TEXT')
+    with SQLiteRepository(str(tmp_path / "bulk.db"), "TestTable",
+                          fields, types, DataExpenseRow) as tmp_repo:
+        yield tmp_repo
+
+
+def test_add_many(tmp_repo):
+    rows = [DataExpenseRow(Expense(expense_date=date, category=1, amount=i))
+            for i in range(10)]
+    assert tmp_repo.add_many(rows) == list(range(1, 11))
+    assert [row.amount for row in tmp_repo.get_all()] == list(range(10))
+
+
+def test_update_many(tmp_repo):
+    pks = tmp_repo.add_many(
+        DataExpenseRow(Expense(expense_date=date, category=1, amount=1))
+        for _ in range(3))
+    tmp_repo.update_many(
+        DataExpenseRow(Expense(pk=pk, expense_date=date, category=2, amount=pk * 10))
+        for pk in pks
+    )
+    assert [(row.category, row.amount) for row in tmp_repo.get_all()] == \
+        [('2', 10), ('2', 20), ('2', 30)]
+
+
+def test_delete_many(tmp_repo):
+    pks = tmp_repo.add_many(
+        DataExpenseRow(Expense(expense_date=date, category=1, amount=1))
+        for _ in range(5))
+    tmp_repo.delete_many(pks[:4])
+    assert [row.pk for row in tmp_repo.get_all()] == pks[4:]
+
+
+def test_delete_many_wrong_pk(tmp_repo):
+    tmp_repo.add(DataExpenseRow(Expense(expense_date=date, category=1, amount=1)))
+    with pytest.raises(TypeError):
+        tmp_repo.delete_many([1, "pk"])
+    assert tmp_repo.get_by_pk(1) is not None
+
+
+def test_get_all_with_condition(tmp_repo):
+    tmp_repo.add_many(DataExpenseRow(Expense(expense_date=date, category=i % 3,
+                                             amount=i, comment=str(i % 2)))
+                      for i in range(10))
+    assert [row.amount for row in tmp_repo.get_all({'category': 1})] == [1, 4, 7]
+    assert [row.amount for row in tmp_repo.get_all({'category': 1, 'comment': '0'})] \
+        == [4]
+
+
+def test_iter_all(tmp_repo):
+    tmp_repo.add_many(DataExpenseRow(Expense(expense_date=date, category=i % 2, amount=i))
+                      for i in range(10))
+    gen = tmp_repo.iter_all(batch_size=3)
+    assert isgenerator(gen)
+    assert [row.amount for row in gen] == list(range(10))
+    assert [row.amount for row in tmp_repo.iter_all({'category': 1}, batch_size=2)] \
+        == [1, 3, 5, 7, 9]
+
+
+def test_iter_all_wrong_batch_size(tmp_repo):
+    with pytest.raises(ValueError):
+        next(tmp_repo.iter_all(batch_size=0))
+
+
+def test_get_all_paging(tmp_repo):
+    tmp_repo.add_many(DataExpenseRow(Expense(expense_date=date, category=i % 3, amount=i))
+                      for i in range(10))
+    page = tmp_repo.get_all(order_by=('category', 'pk'), desc=True, limit=4)
+    assert [row.amount for row in page] == [8, 5, 2, 7]
+    last = page[-1]
+    page = tmp_repo.get_all(order_by=('category', 'pk'), desc=True, limit=4,
+                            after=(last.category, last.pk))
+    assert [row.amount for row in page] == [4, 1, 9, 6]
+    assert [row.amount for row in tmp_repo.get_all(limit=3, offset=8)] == [8, 9]
+    assert [row.amount for row in tmp_repo.get_all({'category': 0}, offset=2)] == [6, 9]
+
+
+def test_get_all_wrong_after(tmp_repo):
+    with pytest.raises(ValueError):
+        tmp_repo.get_all(order_by=('pk',), after=(1, 2))
+
+
+def test_count(tmp_repo):
+    tmp_repo.add_many(DataExpenseRow(Expense(expense_date=date, category=i % 3, amount=i))
+                      for i in range(10))
+    assert tmp_repo.count() == 10
+    assert tmp_repo.count({'category': 1}) == 3
+
+
+'''Date Storage Tests'''
+
+
+def test_date_stored_sortable(tmp_repo):
+    tmp_repo.add(DataExpenseRow(Expense(expense_date=date, category=1, amount=1)))
+    assert tmp_repo.get_by_pk(1).expense_date == '2020-08-30 08:15'
+
+
+def test_convert_dates_to_iso(tmp_repo):
+    with tmp_repo.pool.transaction() as con:
+        con.execute("INSERT INTO TestTable (pk, added_date, expense_date) "
+                    "VALUES (1, '30-08-2020 08:15', '2020-08-31 10:00')")
+    assert tmp_repo.convert_dates_to_iso('added_date', 'expense_date') == 1
+    row = tmp_repo.get_by_pk(1)
+    assert row.added_date == '2020-08-30 08:15'
+    assert row.expense_date == '2020-08-31 10:00'
+    assert tmp_repo.convert_dates_to_iso('added_date', 'expense_date') == 0
+
+
+def test_create_index(tmp_repo):
+    tmp_repo.create_index('expense_date')
+    tmp_repo.create_index('expense_date')
+    plan = tmp_repo.pool.connection().execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM TestTable WHERE expense_date >= ?", ('2020',)
+    ).fetchall()
+    assert 'TestTable_expense_date_idx' in str(plan)
+
+
+def test_aggregate(tmp_repo):
+    base = datetime.datetime(2023, 3, 15, 12)  # среда
+    tmp_repo.add_many([
+        DataExpenseRow(Expense(expense_date=base, category=1, amount=10)),
+        DataExpenseRow(Expense(expense_date=base, category=2, amount=5)),
+        DataExpenseRow(Expense(expense_date=datetime.datetime(2023, 3, 13), category=1,
+                               amount=20)),
+        DataExpenseRow(Expense(expense_date=datetime.datetime(2023, 3, 12), category=1,
+                               amount=40)),
+        DataExpenseRow(Expense(expense_date=datetime.datetime(2022, 12, 31), category=2,
+                               amount=80)),
+    ])
+    assert tmp_repo.aggregate() == [(155,)]
+    assert tmp_repo.aggregate(('category',), funcs=('SUM', 'COUNT', 'avg')) == \
+        [('1', 70, 3, 70 / 3), ('2', 85, 2, 42.5)]
+    assert tmp_repo.aggregate(('category',), datetime.datetime(2023, 3, 13),
+                              datetime.datetime(2023, 3, 16)) == [('1', 30), ('2', 5)]
+    assert tmp_repo.aggregate(bucket='day', start=datetime.datetime(2023, 3, 13)) == \
+        [('2023-03-13', 20), ('2023-03-15', 15)]
+    assert tmp_repo.aggregate(bucket='week') == \
+        [('2022-12-26', 80), ('2023-03-06', 40), ('2023-03-13', 35)]
+    assert tmp_repo.aggregate(('category',), bucket='month') == \
+        [('2022-12', '2', 80), ('2023-03', '1', 70), ('2023-03', '2', 5)]
+    assert tmp_repo.aggregate(bucket='year', funcs=('MAX',)) == \
+        [('2022', 80), ('2023', 40)]
+
+
+def test_aggregate_wrong_arguments(tmp_repo):
+    with pytest.raises(ValueError):
+        tmp_repo.aggregate(('name',))
+    with pytest.raises(ValueError):
+        tmp_repo.aggregate(funcs=('DROP',))
+    with pytest.raises(ValueError):
+        tmp_repo.aggregate(bucket='decade')
+    with pytest.raises(ValueError):
+        tmp_repo.aggregate(field='amount) FROM sqlite_master --')
+    with pytest.raises(ValueError):
+        tmp_repo.aggregate(date_field='name')
+    start = datetime.datetime(2023, 3, 1)
+    with pytest.raises(ValueError):
+        tmp_repo.get_period_sum(start, start, field='1; DROP TABLE x')
+    with pytest.raises(ValueError):
+        tmp_repo.rollup('TestCat', date_field='added')
+
+
+def test_daily_summary(tmp_repo):
+    base = datetime.datetime(2023, 3, 15, 12)
+    rows = [DataExpenseRow(Expense(expense_date=base + datetime.timedelta(hours=7 * i),
+                                   category=i % 3, amount=i))
+            for i in range(30)]
+    tmp_repo.add_many(rows[:20])
+    tmp_repo.create_daily_summary()
+    tmp_repo.create_daily_summary()
+    tmp_repo.add_many(rows[20:])
+    tmp_repo.update_many([
+        DataExpenseRow(Expense(pk=1, expense_date=base, category=2, amount=100)),
+        DataExpenseRow(Expense(pk=25, expense_date=base - datetime.timedelta(days=30),
+                               category=1, amount=7)),
+    ])
+    tmp_repo.delete_many([3, 4, 28])
+    cases = [
+        dict(group_by=('category',), funcs=('SUM', 'COUNT', 'AVG')),
+        dict(bucket='day', funcs=('SUM', 'COUNT')),
+        dict(group_by=('category',), bucket='week'),
+        dict(start=datetime.datetime(2023, 3, 16), end=datetime.datetime(2023, 3, 19)),
+    ]
+    with_summary = [tmp_repo.aggregate(**case) for case in cases]
+    summary, tmp_repo.summary = tmp_repo.summary, None
+    assert with_summary == [tmp_repo.aggregate(**case) for case in cases]
+    con = tmp_repo.pool.connection()
+    assert con.execute("SELECT SUM(count) FROM TestTable_daily").fetchone()[0] == 27
+    tmp_repo.summary = summary
+    tmp_repo.delete_all()
+    assert con.execute("SELECT COUNT(*) FROM TestTable_daily").fetchone()[0] == 0
+
+
+def test_daily_summary_null_values(tmp_repo):
+    con = tmp_repo.pool.connection()
+    query = "INSERT INTO TestTable (expense_date, category, amount) VALUES (?, ?, ?)"
+    values = [('2023-03-15 10:00', 1, 4), ('2023-03-15 11:00', 1, None),
+              ('2023-03-16 10:00', 1, None), ('2023-03-16 10:00', 2, 3)]
+    con.executemany(query, values[:2])
+    tmp_repo.create_daily_summary()
+    con.executemany(query, values[2:])
+    case = dict(group_by=('category',), bucket='day', funcs=('SUM', 'COUNT', 'AVG'))
+    with_summary = tmp_repo.aggregate(**case)
+    tmp_repo.summary = None
+    assert with_summary == tmp_repo.aggregate(**case)
+    con.execute("DELETE FROM TestTable WHERE amount IS NOT NULL")
+    assert con.execute("SELECT day, category, count, n_rows FROM TestTable_daily "
+                       "ORDER BY day").fetchall() == \
+        [('2023-03-15', '1', 0, 1), ('2023-03-16', '1', 0, 1)]
+
+
+@pytest.mark.parametrize('summary', [False, True])
+def test_rollup(tmp_path, summary):
+    db_file = str(tmp_path / "rollup.db")
+    fields = ('pk', 'added_date', 'expense_date', 'category', 'amount', 'comment')
+    types = ('INTEGER PRIMARY KEY', 'TIMESTAMP', 'TIMESTAMP', 'TEXT', 'REAL', 'TEXT')
+    with SQLiteRepository(db_file, "categories_table", ('pk', 'name', 'parent'),
+                          ('INTEGER PRIMARY KEY', 'TEXT', 'INTEGER'),
+                          Category) as cat_repo:
+        exp_repo = SQLiteRepository(db_file, "expense_table", fields, types,
+                                    DataExpenseRow, pool=cat_repo.pool)
+        if summary:
+            exp_repo.create_daily_summary()
+        cats = Category.create_from_tree(read_tree("""
+            продукты
+                мясо
+                    сырое мясо
+                сладости
+            книги
+        """.splitlines()), cat_repo)
+        pks = {cat.name: cat.pk for cat in cats}
+        exp_repo.add_many(
+            DataExpenseRow(Expense(expense_date=date + datetime.timedelta(days=day),
+                                   category=pks[name], amount=amount))
+            for name, amount, day in [('сырое мясо', 10, 0), ('сладости', 5, 0),
+                                      ('продукты', 1, 0), ('книги', 100, 0),
+                                      ('мясо', 1000, 1)]
+        )
+        totals = {name: total for _, name, total in exp_repo.rollup("categories_table")}
+        assert totals == {'продукты': 1016, 'мясо': 1010, 'сырое мясо': 10,
+                          'сладости': 5, 'книги': 100}
+        cat_repo.create_closure()
+        totals = {name: total for _, name, total in exp_repo.rollup(
+            "categories_table", closure_table=cat_repo.closure_table)}
+        assert totals == {'продукты': 1016, 'мясо': 1010, 'сырое мясо': 10,
+                          'сладости': 5, 'книги': 100}
+        day_start = date.replace(hour=0, minute=0, second=0)
+        totals = {name: total for _, name, total in exp_repo.rollup(
+            "categories_table", day_start, day_start + datetime.timedelta(days=1))}
+        assert totals == {'продукты': 16, 'мясо': 10, 'сырое мясо': 10,
+                          'сладости': 5, 'книги': 100}
+
+
+@pytest.fixture
+def cat_repo(tmp_path):
+    with SQLiteRepository(str(tmp_path / "tree.db"), "categories_table",
+                          ('pk', 'name', 'parent'),
+                          ('INTEGER PRIMARY KEY', 'TEXT', 'INTEGER'), Category) as repo:
+        yield repo
+
+
+def closure_rows(repo):
+    con = repo.pool.connection()
+    return sorted(con.execute(f"SELECT * FROM {repo.closure_table}").fetchall())
+
+
+def names(rows):
+    return [row.name for row in rows]
+
+
+def expected_closure(repo):
+    tree = CategoryTree(repo.get_all())
+    return sorted((ancestor.pk, cat.pk, depth) for cat in tree
+                  for depth, ancestor in enumerate(
+                      tree.get_ancestors(cat.pk, include_self=True)))
+
+
+@pytest.mark.parametrize('closure', [False, True])
+def test_ancestors_descendants(cat_repo, closure):
+    if closure:
+        cat_repo.create_closure()
+    cats = {cat.name: cat for cat in Category.create_from_tree(read_tree("""
+        a
+            b
+                c
+                d
+            e
+        f
+    """.splitlines()), cat_repo)}
+    assert names(cat_repo.get_ancestors(cats['c'].pk)) == ['b', 'a']
+    assert names(cat_repo.get_ancestors(cats['c'].pk, include_self=True)) \
+        == ['c', 'b', 'a']
+    assert names(cat_repo.get_descendants(cats['a'].pk)) == ['b', 'e', 'c', 'd']
+    assert cat_repo.get_descendants(cats['f'].pk) == []
+    assert names(cats['d'].get_all_parents(cat_repo)) == ['b', 'a']
+    assert names(cats['b'].get_subcategories(cat_repo)) == ['c', 'd']
+
+
+def test_closure_maintenance(cat_repo):
+    Category.create_from_tree(read_tree("""
+        a
+            b
+                c
+    """.splitlines()), cat_repo)
+    cat_repo.create_closure()
+    assert closure_rows(cat_repo) == expected_closure(cat_repo)
+    d, e = Category('d', 3), Category('e')
+    cat_repo.add_many([d, e])
+    assert closure_rows(cat_repo) == expected_closure(cat_repo)
+    # перенос поддерева b под e
+    b = cat_repo.get_by_pk(2)
+    b.parent = e.pk
+    cat_repo.update_by_pk(b)
+    assert closure_rows(cat_repo) == expected_closure(cat_repo)
+    assert names(cat_repo.get_ancestors(d.pk)) == ['c', 'b', 'e']
+    b.parent = None
+    cat_repo.update_many([b])
+    assert closure_rows(cat_repo) == expected_closure(cat_repo)
+    cat_repo.delete_by_pk(b.pk)
+    assert closure_rows(cat_repo) == expected_closure(cat_repo)
+    assert names(cat_repo.get_ancestors(d.pk)) == ['c']
+    cat_repo.delete_all()
+    assert closure_rows(cat_repo) == []
+
+
+def test_get_in_subtree(cat_repo):
+    cat_repo.create_closure()
+    cat_repo.add_many([Category('a'), Category('b', 1), Category('c')])
+    fields = ('pk', 'added_date', 'expense_date', 'category', 'amount', 'comment')
+    types = ('INTEGER PRIMARY KEY', 'TIMESTAMP', 'TIMESTAMP', 'TEXT', 'REAL', 'TEXT')
+    exp_repo = SQLiteRepository(cat_repo.db_file, "expense_table", fields, types,
+                                DataExpenseRow, pool=cat_repo.pool,
+                                indexes=(('category',),))
+    exp_repo.add_many(DataExpenseRow(Expense(expense_date=date, category=cat, amount=i))
+                      for i, cat in enumerate([1, 2, 3, 2]))
+    assert [row.amount for row in exp_repo.get_in_subtree(cat_repo.closure_table, 1)] \
+        == [0, 1, 3]
+    assert [row.amount for row in exp_repo.get_in_subtree(cat_repo.closure_table, 2)] \
+        == [1, 3]
+    with pytest.raises(ValueError):
+        exp_repo.get_in_subtree(cat_repo.closure_table, 1, 'wrong')
+
+
+def test_update_field(tmp_repo):
+    tmp_repo.add_many(DataExpenseRow(Expense(expense_date=date, category=cat, amount=i))
+                      for i, cat in enumerate([1, 2, 3, 2, 4]))
+    assert tmp_repo.update_field('category', [2, 3], 5) == 3
+    assert [row.category for row in tmp_repo.get_all()] == ['1', '5', '5', '5', '4']
+    assert tmp_repo.update_field('category', [5], 6, where={'amount': 2}) == 1
+    assert [row.category for row in tmp_repo.get_all()] == ['1', '5', '6', '5', '4']
+    assert tmp_repo.update_field('category', [], 1) == 0
+    with pytest.raises(ValueError):
+        tmp_repo.update_field('category', [1], 2, where={'wrong': 1})
+    with pytest.raises(ValueError):
+        tmp_repo.update_field('wrong', [1], 2)
+
+
+def test_reassign_category(tmp_repo):
+    tmp_repo.add_many(DataExpenseRow(Expense(expense_date=date, category=cat, amount=i))
+                      for i, cat in enumerate([1, 2, 3, 2]))
+    assert tmp_repo.reassign_category([2, 3], 1) == 3
+    assert tmp_repo.reassign_category([1], 4, where={'amount': 3}) == 1
+    assert [row.category for row in tmp_repo.get_all()] == ['1', '1', '1', '4']
+
+
+def test_transaction(tmp_repo):
+    with pytest.raises(RuntimeError):
+        with tmp_repo.transaction():
+            tmp_repo.add(DataExpenseRow(Expense(expense_date=date, category=1)))
+            raise RuntimeError
+    assert tmp_repo.count() == 0
+
+
+def test_get_period_sum(tmp_repo):
+    tmp_repo.add_many(
+        DataExpenseRow(Expense(expense_date=date + datetime.timedelta(days=i),
+                               category=1, amount=i))
+        for i in range(5))
+    assert tmp_repo.get_period_sum(date, date + datetime.timedelta(days=2)) == 1
+    assert tmp_repo.get_period_sum(date + datetime.timedelta(days=10),
+                                   date + datetime.timedelta(days=20)) == 0
+
+
+def test_get_join_paging(tmp_path):
+    db_file = str(tmp_path / "join.db")
+    fields = ('pk', 'added_date', 'expense_date', 'category', 'amount', 'comment')
+    types = ('INTEGER PRIMARY KEY', 'TIMESTAMP', 'TIMESTAMP', 'TEXT', 'REAL', 'TEXT')
+    with SQLiteRepository(db_file, "categories_table", ('pk', 'name', 'parent'),
+                          ('INTEGER PRIMARY KEY', 'TEXT', 'INTEGER'),
+                          Category) as cat_repo:
+        exp_repo = SQLiteRepository(db_file, "expense_table", fields, types,
+                                    DataExpenseRow, pool=cat_repo.pool)
+        cat_repo.add_many([Category('a'), Category('b')])
+        exp_repo.add_many(
+            DataExpenseRow(Expense(expense_date=date + datetime.timedelta(days=i % 4),
+                                   category=1 + i % 2, amount=i))
+            for i in range(8)
+        )
+        join_args = ("expense_table", "categories_table",
+                     ('expense_table.pk', 'expense_date', 'amount', 'name'),
+                     'category', 'pk')
+        order_by = ('expense_date', 'expense_table.pk')
+        page = exp_repo.get_join(*join_args, order_by=order_by, desc=True, limit=3)
+        assert [(row[2], row[3]) for row in page] == [(7, 'b'), (3, 'b'), (6, 'a')]
+        page = exp_repo.get_join(*join_args, order_by=order_by, desc=True, limit=3,
+                                 after=(page[-1][1], page[-1][0]))
+        assert [row[2] for row in page] == [2, 5, 1]
+        assert exp_repo.count_join(*join_args[:2], *join_args[3:]) == 8
+
+
+def test_events(tmp_repo):
+    events = []
+    tmp_repo.subscribe(events.append)
+    pks = tmp_repo.add_many(
+        DataExpenseRow(Expense(expense_date=date, category=1, amount=i))
+        for i in range(3))
+    row = tmp_repo.get_by_pk(pks[0])
+    row.amount = 10
+    tmp_repo.update_by_pk(row)
+    tmp_repo.update_field('category', [1], 2, where={'amount': 1})
+    tmp_repo.update_field('category', [1], 2, where={'amount': 100})
+    tmp_repo.delete_many(pks[1:])
+    tmp_repo.delete_by_pk(pks[1])
+    assert [(e.kind, e.pk) for e in events] == [
+        ('added', 1), ('added', 2), ('added', 3), ('updated', 1),
+        ('reset', 0), ('deleted', 2), ('deleted', 3)]
+    assert events[3].old.amount == 0 and events[3].new.amount == 10
+    assert events[4].old is None and events[4].new is None
+    assert events[5].old.category == '2' and events[5].new is None
+    events.clear()
+    tmp_repo.delete_all()
+    tmp_repo.delete_all()
+    assert [(e.kind, e.pk) for e in events] == [('reset', 0)]
+    tmp_repo.unsubscribe(events.append)
+    tmp_repo.add(DataExpenseRow(Expense(expense_date=date, category=1)))
+    assert len(events) == 1
+
+
+def test_events_after_commit(tmp_repo):
+    events = []
+    tmp_repo.subscribe(events.append)
+    with tmp_repo.transaction():
+        tmp_repo.add(DataExpenseRow(Expense(expense_date=date, category=1)))
+        tmp_repo.add_many([DataExpenseRow(Expense(expense_date=date, category=1))])
+        assert events == []
+    assert [(e.kind, e.pk) for e in events] == [('added', 1), ('added', 2)]
+    events.clear()
+    with pytest.raises(ZeroDivisionError):
+        with tmp_repo.transaction():
+            tmp_repo.delete_by_pk(1)
+            1 / 0
+    assert events == [] and tmp_repo.get_by_pk(1) is not None
+
+
+def test_events_to_subscribers_at_change(tmp_repo):
+    first, second = [], []
+    tmp_repo.subscribe(first.append)
+    with tmp_repo.transaction():
+        tmp_repo.add(DataExpenseRow(Expense(expense_date=date, category=1)))
+        tmp_repo.subscribe(second.append)
+        tmp_repo.unsubscribe(first.append)
+    assert [(e.kind, e.pk) for e in first] == [('added', 1)]
+    assert second == []
+
+
+def test_ignored_add_not_notified(tmp_repo):
+    events = []
+    tmp_repo.subscribe(events.append)
+    tmp_repo.add(DataExpenseRow(Expense(expense_date=date, category=1)))
+    tmp_repo.next_id = 1
+    tmp_repo.add(DataExpenseRow(Expense(expense_date=date, category=2)))
+    tmp_repo.next_id = 1
+    tmp_repo.add_many(DataExpenseRow(Expense(expense_date=date, category=3))
+                      for _ in range(2))
+    assert [(e.kind, e.pk, e.new.category) for e in events] == [
+        ('added', 1, 1), ('added', 2, 3)]
+
+
+def test_row_timestamp(tmp_repo):
+    row = DataExpenseRow(Expense(expense_date=date, category=1))
+    assert row.timestamp == datetime.datetime(2020, 8, 30, 8, 15)
+    pk = tmp_repo.add(row)
+    loaded = tmp_repo.get_by_pk(pk)
+    assert loaded.timestamp == row.timestamp
+    assert loaded.timestamp is loaded.timestamp
+    loaded.expense_date = '2021-01-02 03:04'
+    assert loaded.timestamp == datetime.datetime(2021, 1, 2, 3, 4)
+
+
+def test_cents_aggregates(tmp_path):
+    fields = ('pk', 'added_date', 'expense_date', 'category', 'amount', 'comment')
+    types = ('INTEGER PRIMARY KEY', 'TIMESTAMP', 'TIMESTAMP', 'TEXT', 'INTEGER', 'TEXT')
+    with SQLiteRepository(str(tmp_path / "cents.db"), "TestTable",
+                          fields, types, DataExpenseRow) as repo:
+        # 0.1 рубля десять раз: в копейках сумма точная
+        repo.add_many(DataExpenseRow(Expense(expense_date=date, category=1, amount=10))
+                      for _ in range(10))
+        start, end = date.replace(hour=0, minute=0, second=0), date.replace(day=31)
+        total = repo.get_period_sum(start, end)
+        assert total == 100 and isinstance(total, int)
+        repo.create_daily_summary()
+        repo.add(DataExpenseRow(Expense(expense_date=date, category=2, amount=5)))
+        day = date.replace(hour=0, minute=0, second=0)
+        rows = repo.aggregate(('category',), day, day + datetime.timedelta(days=1),
+                              funcs=('SUM', 'AVG'))
+        assert rows == [('1', 100, 10.0), ('2', 5, 5.0)]
+        assert all(isinstance(row[1], int) for row in rows)
+
+
 def test_remove():
     os.remove("test_db.db")
@@ -1,9 +1,10 @@
 import tempfile
+from datetime import date, datetime
 from textwrap import dedent
 
 import pytest
 
-from bookkeeper.utils import read_tree
+from bookkeeper.utils import read_tree, period_bounds
 
 
 def test_create_tree():
@@ -71,3 +72,23 @@ def test_with_file():
             ('child2', 'parent1'),
             ('parent2', None)
         ]
+
+
+@pytest.mark.parametrize('period, start, end', [
+    ('day', datetime(2023, 2, 28), datetime(2023, 3, 1)),
+    ('week', datetime(2023, 2, 27), datetime(2023, 3, 6)),
+    ('month', datetime(2023, 2, 1), datetime(2023, 3, 1)),
+    ('year', datetime(2023, 1, 1), datetime(2024, 1, 1)),
+])
+def test_period_bounds(period, start, end):
+    assert period_bounds(period, date(2023, 2, 28)) == (start, end)
+
+
+def test_period_bounds_december():
+    assert period_bounds('month', date(2023, 12, 31)) == \
+        (datetime(2023, 12, 1), datetime(2024, 1, 1))
+
+
+def test_period_bounds_wrong_period():
+    with pytest.raises(ValueError):
+        period_bounds('decade')
@@ -0,0 +1,107 @@
+from bookkeeper.view.app_interface import ExpenseTableModel, _row_ranges
+
+import pytest
+
+
+def rows(*pks):
+    return [[str(pk), '', 0, '', ''] for pk in pks]
+
+
+@pytest.fixture
+def source():
+    """ Строки в репозитории, fetch отдаёт строки после last_row """
+    data = rows(*range(9, 0, -1))
+    calls = []
+
+    def rows_after(last_row, batch_size):
+        # строки по убыванию pk, как по ключу страниц (дата, pk)
+        start = 0 if last_row is None else \
+            sum(1 for x in data if int(x[0]) >= int(last_row[0]))
+        return [list(x) for x in data[start:start + batch_size]]
+
+    def fetch(last_row, batch_size, done):
+        calls.append(last_row)
+        done(rows_after(last_row, batch_size))
+    fetch.calls = calls
+    fetch.rows_after = rows_after
+    return data, fetch
+
+
+def test_row_ranges():
+    assert _row_ranges([]) == []
+    assert _row_ranges([3, 1, 2, 2, 7, 5, 6, 9]) == [(1, 3), (5, 7), (9, 9)]
+
+
+def test_insert_remove():
+    data = rows(5, 3, 1)
+    model = ExpenseTableModel(data)
+    model.insert_row(1, rows(4)[0])
+    model.insert_row(4, rows(0)[0])
+    assert [x[0] for x in data] == ['5', '4', '3', '1', '0']
+    model.remove_rows([0, 3, 4, 1])
+    assert [x[0] for x in data] == ['3'] and model.rowCount() == 1
+    model.replace_row(0, rows(2)[0])
+    assert model.data(model.index(0, 0)) == '2'
+
+
+def test_fetch(source):
+    repo, fetch = source
+    data = fetch.rows_after(None, 4)
+    model = ExpenseTableModel(data, fetch, batch_size=4)
+    assert model.canFetchMore()
+    model.fetchMore()
+    assert model.rowCount() == 8 and model.canFetchMore()
+    model.fetchMore()
+    assert data == repo and not model.canFetchMore()
+    model.fetchMore()
+    assert len(fetch.calls) == 2
+
+
+def test_fetch_after_removing_all(source):
+    repo, fetch = source
+    data = fetch.rows_after(None, 3)
+    model = ExpenseTableModel(data, fetch, batch_size=3)
+    model.remove_rows(range(3))
+    assert data == []
+    del repo[:3]
+    model.fetchMore()
+    # следующая порция идёт за последней загруженной строкой, хотя её уже нет
+    assert fetch.calls[-1][0] == '7'
+    assert [x[0] for x in data] == ['6', '5', '4']
+
+
+def test_fetch_after_moving_rows(source):
+    repo, fetch = source
+    data = fetch.rows_after(None, 3)
+    model = ExpenseTableModel(data, fetch, batch_size=3)
+    moved = data[2]
+    model.remove_rows([2])
+    model.insert_row(0, moved)
+    assert model.cursor[0] == '7'
+    model.fetchMore()
+    assert [x[0] for x in data] == ['7', '9', '8', '6', '5', '4']
+    assert model.cursor[0] == '4'
+
+
+def test_fetch_later(source):
+    repo, fetch = source
+    requests = []
+    data = fetch.rows_after(None, 3)
+    model = ExpenseTableModel(data, lambda *args: requests.append(args), batch_size=3)
+    model.fetchMore()
+    assert not model.canFetchMore() and len(requests) == 1
+    last_row, batch_size, done = requests.pop()
+    done(fetch.rows_after(last_row, batch_size))
+    assert model.rowCount() == 6 and model.canFetchMore()
+    model.fetchMore()
+    requests.pop()[2](None)
+    assert model.rowCount() == 6 and model.canFetchMore()
+    model.fetchMore()
+    model.insert_row(6, rows(0)[0])
+    assert model.canFetchMore()
+    requests.pop()[2](fetch.rows_after(data[5], 3))
+    assert model.rowCount() == 7
+    model.fetchMore()
+    model.discard_fetch()
+    requests.pop()[2](fetch.rows_after(data[5], 3))
+    assert model.rowCount() == 7 and not model.exhausted